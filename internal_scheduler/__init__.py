@@ -0,0 +1,5 @@
+# Pastikan aplikasi Celery selalu dimuat saat Django mulai,
+# sehingga decorator @shared_task menggunakan aplikasi ini.
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
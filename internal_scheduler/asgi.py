@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from decouple import config
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'internal_scheduler.settings')
+# Di bawah ASGI koneksi persisten tidak dipakai ulang antar request (setiap konteks
+# request async memegang koneksinya sendiri), jadi default-nya dimatikan untuk proses
+# web ini. Untuk PostgreSQL gunakan DB_POOL. Worker Celery tetap memakai default settings.
+# Nilai dari environment atau .env tetap dihormati (dibaca lewat decouple seperti settings).
+os.environ.setdefault('DB_CONN_MAX_AGE', config('DB_CONN_MAX_AGE', default='0'))
 
 application = get_asgi_application()
@@ -0,0 +1,14 @@
+import os
+
+from celery import Celery
+
+# Atur modul settings default Django untuk program 'celery'.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'internal_scheduler.settings')
+
+app = Celery('internal_scheduler')
+
+# Semua konfigurasi Celery dibaca dari settings Django dengan prefix CELERY_
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Muat modul tasks.py dari semua aplikasi Django yang terdaftar
+app.autodiscover_tasks()
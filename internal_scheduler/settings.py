@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
+import dj_database_url
 from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Paling luar agar durasi seluruh request (termasuk middleware lain) ikut terukur
+    'scheduler.instrumentation.request_timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,13 +81,37 @@ WSGI_APPLICATION = 'internal_scheduler.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Dikonfigurasi lewat DATABASE_URL, mis. postgres://user:pass@db:5432/sweethala_db.
+# Tanpa DATABASE_URL, SQLite lokal dipakai untuk development.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': dj_database_url.config(
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        # Koneksi persisten (detik) dengan health check sebelum dipakai ulang. Proses web
+        # ASGI memakai default 0 (lihat asgi.py); WSGI, Celery, dan command memakai 600
+        conn_max_age=config('DB_CONN_MAX_AGE', default=600, cast=int),
+        conn_health_checks=True,
+    )
+}
+
+# WAL + BEGIN IMMEDIATE mengurangi error "database is locked" saat ada beberapa writer
+SQLITE_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update(SQLITE_OPTIONS)
+elif config('DB_POOL', default=False, cast=bool):
+    # Connection pool bawaan Django untuk PostgreSQL (butuh psycopg 3 dan psycopg-pool).
+    # Koneksi persisten harus dimatikan saat pool dipakai.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,10 +165,60 @@ LOGOUT_REDIRECT_URL = 'scheduler:landing_page' # Mengarahkan ke landing page set
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Jumlah file upload yang ditulis ke storage secara paralel per request
+MEDIA_INGEST_CONCURRENCY = config('MEDIA_INGEST_CONCURRENCY', default=4, cast=int)
+# Direktori file upload besar yang di-spool Django. Jika satu filesystem dengan MEDIA_ROOT,
+# file dipindahkan ke storage blob dengan rename alih-alih disalin (default: temp sistem)
+FILE_UPLOAD_TEMP_DIR = config('FILE_UPLOAD_TEMP_DIR', default='') or None
+# Upload bertahap (resumable) untuk file besar: batas ukuran file, ukuran chunk, dan umur sesi
+UPLOAD_MAX_FILE_SIZE = config('UPLOAD_MAX_FILE_SIZE', default=2 * 1024 ** 3, cast=int)
+UPLOAD_CHUNK_MAX_SIZE = config('UPLOAD_CHUNK_MAX_SIZE', default=8 * 1024 ** 2, cast=int)
+UPLOAD_SESSION_TTL = config('UPLOAD_SESSION_TTL', default=24 * 60 * 60, cast=int)
+
+# Cache: gunakan Redis jika CACHE_URL diisi (mis. redis://redis:6379/1), jika tidak locmem
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Session disimpan di cache (Redis) agar request tidak membaca/menulis tabel django_session.
+# Tanpa Redis tetap memakai DB, karena cache locmem tidak dibagi antar worker.
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.cache' if CACHE_URL else 'django.contrib.sessions.backends.db',
+)
 
 # API Keys from Environment Variables
 UPLOAD_POST_API_KEY = config("UPLOAD_POST_API_KEY", default="YOUR_UPLOAD_POST_KEY")
+UPLOAD_POST_BASE_URL = config("UPLOAD_POST_BASE_URL", default="https://api.upload-post.com/api").rstrip('/')
+# HTTP client Upload Post: timeout (detik) dan ukuran connection pool per proses
+UPLOAD_POST_CONNECT_TIMEOUT = config("UPLOAD_POST_CONNECT_TIMEOUT", default=5, cast=float)
+UPLOAD_POST_READ_TIMEOUT = config("UPLOAD_POST_READ_TIMEOUT", default=120, cast=float)
+UPLOAD_POST_POOL_SIZE = config("UPLOAD_POST_POOL_SIZE", default=10, cast=int)
+# Client async (view ASGI) dapat menahan jauh lebih banyak permintaan bersamaan
+UPLOAD_POST_ASYNC_POOL_SIZE = config("UPLOAD_POST_ASYNC_POOL_SIZE", default=200, cast=int)
 OPENAI_API_KEY = config("OPENAI_API_KEY")
+# Kosong: endpoint resmi OpenAI. Isi untuk proxy atau server palsu (mis. http://localhost:8002/v1)
+OPENAI_BASE_URL = config("OPENAI_BASE_URL", default="")
+
+# Jumlah maksimum panggilan OpenAI paralel dalam satu tugas AI (mis. per carousel)
+AI_MAX_CONCURRENCY = config("AI_MAX_CONCURRENCY", default=4, cast=int)
+# Tugas AI yang QUEUED/RUNNING lebih lama dari ini (detik) dianggap macet dan boleh diantrekan ulang
+AI_TASK_STALE_AFTER = config("AI_TASK_STALE_AFTER", default=15 * 60, cast=int)
+
+# Cache hasil AI (edit & caption): masa berlaku (detik) dan jumlah entri maksimum
+AI_CACHE_TTL = config("AI_CACHE_TTL", default=30 * 24 * 3600, cast=int)
+AI_CACHE_MAX_ENTRIES = config("AI_CACHE_MAX_ENTRIES", default=5000, cast=int)
 
 # Celery Configuration
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://redis:6379/0')
@@ -149,3 +226,50 @@ CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://redis:6
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TASK_TRACK_STARTED = True
+# Jalankan task secara sinkron (tanpa worker) untuk development/test
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = config('CELERY_TASK_EAGER_PROPAGATES', default=False, cast=bool)
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Pengiriman ke Upload Post memakai queue terpisah agar concurrency-nya bisa dibatasi
+CELERY_TASK_ROUTES = {
+    'scheduler.tasks.dispatch_schedule_upload': {'queue': 'upload_post'},
+}
+
+# Retry pengiriman ke Upload Post (exponential backoff, dalam detik)
+UPLOAD_POST_MAX_RETRIES = config('UPLOAD_POST_MAX_RETRIES', default=5, cast=int)
+UPLOAD_POST_RETRY_BACKOFF = config('UPLOAD_POST_RETRY_BACKOFF', default=10, cast=int)
+UPLOAD_POST_RETRY_BACKOFF_MAX = config('UPLOAD_POST_RETRY_BACKOFF_MAX', default=600, cast=int)
+
+# Sinkronisasi jadwal dengan Upload Post di background (detik)
+UPLOAD_POST_SYNC_INTERVAL = config('UPLOAD_POST_SYNC_INTERVAL', default=300, cast=int)
+UPLOAD_POST_SYNC_MIN_INTERVAL = config('UPLOAD_POST_SYNC_MIN_INTERVAL', default=60, cast=int)
+# Umur (detik) snapshot daftar jadwal Upload Post di cache sebelum divalidasi ulang
+UPLOAD_POST_SNAPSHOT_TTL = config('UPLOAD_POST_SNAPSHOT_TTL', default=30, cast=int)
+
+# Rate limit sisi client (permintaan per menit per budget; 0 = tanpa batas). Dengan
+# CACHE_URL (Redis) budget dibagi semua worker web dan Celery. 429 dari upstream
+# dicoba ulang sampai RATE_LIMIT_MAX_RETRIES kali dengan jeda Retry-After + jitter.
+RATE_LIMITS = {
+    'openai:gpt-image-1': config('RATE_LIMIT_OPENAI_IMAGE_RPM', default=50, cast=int),
+    'openai:gpt-4.1': config('RATE_LIMIT_OPENAI_TEXT_RPM', default=500, cast=int),
+    'openai:files': config('RATE_LIMIT_OPENAI_FILES_RPM', default=500, cast=int),
+    'upload_post:upload': config('RATE_LIMIT_UPLOAD_POST_UPLOAD_RPM', default=60, cast=int),
+    'upload_post:schedule': config('RATE_LIMIT_UPLOAD_POST_SCHEDULE_RPM', default=300, cast=int),
+}
+RATE_LIMIT_MAX_RETRIES = config('RATE_LIMIT_MAX_RETRIES', default=4, cast=int)
+
+# Metrik latensi: interval (detik) flush histogram per proses ke cache, dan token
+# Bearer untuk scraper Prometheus di /internal/metrics (tanpa token: hanya staff)
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=10, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+CELERY_BEAT_SCHEDULE = {
+    'sync-upload-post-schedules': {
+        'task': 'scheduler.tasks.sync_remote_schedules_task',
+        'schedule': UPLOAD_POST_SYNC_INTERVAL,
+    },
+    'purge-stale-uploads': {
+        'task': 'scheduler.tasks.purge_stale_uploads_task',
+        'schedule': 60 * 60,
+    },
+}
@@ -7,6 +7,7 @@ from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('internal/', include('scheduler.internal_urls')),
     path('', include('scheduler.urls')), # Pastikan ini ada
 ]
 
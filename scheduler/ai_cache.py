@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .blob_storage import sha256_from_name, sha256_from_path, retain_blob, release_blob
+from .models import AICacheCounter, AIResultCache
+
+logger = logging.getLogger(__name__)
+
+HITS = 'hits'
+MISSES = 'misses'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Menghitung SHA-256 isi file secara streaming (langsung dari nama file untuk blob)."""
+    blob_hash = sha256_from_path(path)
+    if blob_hash:
+        return blob_hash
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def combine_hashes(media_hashes):
+    """Hash gabungan untuk sekumpulan media (urutan berpengaruh). Satu media memakai hash-nya sendiri."""
+    if len(media_hashes) == 1:
+        return media_hashes[0]
+    return hashlib.sha256("\n".join(media_hashes).encode('utf-8')).hexdigest()
+
+
+def make_key(kind, media_hash, model, prompt):
+    return hashlib.sha256(f"{kind}\0{model}\0{prompt}\0{media_hash}".encode('utf-8')).hexdigest()
+
+
+def _incr(name):
+    # UPDATE atomik dengan F(); baris penghitung dibuat saat pertama kali dipakai
+    if AICacheCounter.objects.filter(name=name).update(value=F('value') + 1):
+        return
+    try:
+        with transaction.atomic():
+            AICacheCounter.objects.create(name=name, value=1)
+    except IntegrityError:
+        # Dibuat bersamaan oleh proses lain
+        AICacheCounter.objects.filter(name=name).update(value=F('value') + 1)
+
+
+def lookup(kind, media_hash, model, prompt):
+    """
+    Mengambil hasil AI dari cache. Mengembalikan AIResultCache atau None.
+    Entri yang sudah kedaluwarsa atau file hasilnya sudah hilang dianggap miss.
+    """
+    entry = AIResultCache.objects.filter(
+        key=make_key(kind, media_hash, model, prompt),
+        expires_at__gt=timezone.now(),
+    ).first()
+    if entry and entry.result_file and not default_storage.exists(entry.result_file):
+        entry.delete()
+        entry = None
+
+    if entry is None:
+        _incr(MISSES)
+        return None
+
+    _incr(HITS)
+    AIResultCache.objects.filter(pk=entry.pk).update(
+        hit_count=F('hit_count') + 1,
+        last_used_at=timezone.now(),
+    )
+    logger.info(f"AI cache hit: {kind} untuk media {media_hash[:12]}")
+    return entry
+
+
+def store(kind, media_hash, model, prompt, caption='', result_file=''):
+    """
+    Menyimpan hasil AI ke cache lalu menjalankan eviction.
+    Entri cache memegang referensinya sendiri ke blob `result_file`.
+    """
+    now = timezone.now()
+    key = make_key(kind, media_hash, model, prompt)
+    with transaction.atomic():
+        previous_file = AIResultCache.objects.filter(key=key).values_list('result_file', flat=True).first()
+        if result_file:
+            retain_blob(result_file)
+        entry, _ = AIResultCache.objects.update_or_create(
+            key=key,
+            defaults={
+                'kind': kind,
+                'media_hash': media_hash,
+                'model': model,
+                'caption': caption or '',
+                'result_file': result_file or '',
+                'last_used_at': now,
+                'expires_at': now + timedelta(seconds=settings.AI_CACHE_TTL),
+            },
+        )
+        if previous_file and sha256_from_name(previous_file):
+            release_blob(previous_file)
+    evict()
+    return entry
+
+
+def evict():
+    """Hapus entri kedaluwarsa, lalu entri paling lama tidak dipakai jika melebihi batas."""
+    AIResultCache.objects.filter(expires_at__lte=timezone.now()).delete()
+    max_entries = settings.AI_CACHE_MAX_ENTRIES
+    overflow_ids = list(
+        AIResultCache.objects
+        .order_by('-last_used_at')
+        .values_list('pk', flat=True)[max_entries:]
+    )
+    if overflow_ids:
+        AIResultCache.objects.filter(pk__in=overflow_ids).delete()
+
+
+def stats():
+    """Statistik cache: jumlah hit, miss, hit ratio, dan jumlah entri."""
+    counters = dict(AICacheCounter.objects.values_list('name', 'value'))
+    hits = counters.get(HITS, 0)
+    misses = counters.get(MISSES, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+        'entries': AIResultCache.objects.count(),
+    }
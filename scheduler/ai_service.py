@@ -1,68 +1,222 @@
-import io
-from PIL import Image
 import base64
+import time
 import openai
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from pathlib import Path
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
 from .schemas import AIEditPayload, AIEditResponse, AICaptionPayload, AICaptionResponse
+from . import ai_cache, ratelimit, singleflight
+from .blob_storage import store_blob, retain_blob, release_blob, sha256_from_name
+from .instrumentation import timed_upstream
+from .image_processing import prepare_for_edit, prepare_for_caption
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger(__name__)
 
 
-openai_api_key = settings.OPENAI_API_KEY
+EDIT_MODEL = "gpt-image-1"
+CAPTION_MODEL = "gpt-4.1"
+CAPTION_PROMPT = "Buatkan caption media sosial yang kreatif dan menarik untuk gambar ini. Maksimal 200 karakter."
+CAROUSEL_CAPTION_PROMPT = "Buatkan satu caption media sosial yang kreatif dan menarik untuk carousel berisi gambar-gambar ini. Maksimal 200 karakter."
 
-def run_ai_tasks_for_schedule(schedule):
+# Masa berlaku file yang diupload ke OpenAI (3 hari). file_id disimpan di
+# registry (Django cache) sedikit lebih singkat agar tidak memakai file yang sudah kedaluwarsa.
+OPENAI_FILE_EXPIRY_SECONDS = 259200
+OPENAI_FILE_EXPIRY_MARGIN_SECONDS = 3600
+
+# Batas tunggu single-flight; lebih lama dari durasi terlama satu permintaan ke OpenAI
+AI_EDIT_LOCK_TIMEOUT = 300
+AI_CAPTION_LOCK_TIMEOUT = 180
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Mengembalikan client OpenAI bersama untuk seluruh proses.
+    Client (dan connection pool HTTP-nya) dibuat sekali lalu dipakai ulang
+    oleh semua thread, sehingga tidak ada handshake TLS baru di setiap panggilan.
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    base_url=settings.OPENAI_BASE_URL or None,
+                )
+    return _openai_client
+
+
+@receiver(setting_changed)
+def _reset_openai_client(setting, **kwargs):
+    # override_settings (test/benchmark) mengganti key atau URL: buat client baru
+    global _openai_client
+    if setting.startswith('OPENAI_'):
+        _openai_client = None
+
+
+def _openai_request(budget, operation, method, **kwargs):
+    """
+    Memanggil method client OpenAI lewat rate limiter bersama (per model/endpoint).
+    429 yang tersisa setelah retry bawaan SDK menjeda budget untuk semua proses
+    sesuai Retry-After lalu dicoba ulang; jika tetap gagal, RateLimitError diteruskan.
+    Setiap percobaan diukur sebagai panggilan upstream `operation` (tanpa waktu tunggu).
+    """
+    def attempt():
+        for value in kwargs.values():
+            # Stream gambar (nama, data, mimetype) harus dibaca dari awal di setiap percobaan
+            stream = value[1] if isinstance(value, tuple) else value
+            if hasattr(stream, 'seek'):
+                stream.seek(0)
+        try:
+            with timed_upstream('openai', operation):
+                return method(**kwargs)
+        except openai.RateLimitError as e:
+            headers = e.response.headers
+            retry_after = ratelimit.parse_retry_after(headers.get('retry-after'))
+            if headers.get('retry-after-ms'):
+                retry_after = float(headers['retry-after-ms']) / 1000
+            raise ratelimit.RateLimited(retry_after, result=e) from e
+
+    try:
+        return ratelimit.call(budget, attempt)
+    except ratelimit.RateLimited as e:
+        raise e.result
+
+def _file_registry_key(media_hash):
+    return f"openai_file:{media_hash}"
+
+
+def forget_uploaded_file(media_hash):
+    cache.delete(_file_registry_key(media_hash))
+
+
+def upload_file_for_vision(client, media_file_path, media_hash):
+    """
+    Upload gambar ke OpenAI Files dan mengembalikan file_id.
+    Jika gambar dengan hash yang sama sudah diupload dan belum kedaluwarsa,
+    file_id dari registry dipakai ulang tanpa upload.
+    """
+    registry_key = _file_registry_key(media_hash)
+    file_id = cache.get(registry_key)
+    if file_id:
+        logger.info(f"Memakai ulang file OpenAI {file_id} untuk media {media_hash[:12]}")
+        return file_id
+
+    byte_stream = prepare_for_caption(media_file_path)
+    sent_bytes = byte_stream.getbuffer().nbytes
+    started = time.monotonic()
+    result = _openai_request(
+        'openai:files',
+        'files.create',
+        client.files.create,
+        file=('image.jpg', byte_stream, 'image/jpeg'),
+        purpose="user_data",
+        expires_after={
+            "anchor": "created_at",
+            "seconds" : OPENAI_FILE_EXPIRY_SECONDS
+        }
+    )
+    logger.info(
+        f"Upload gambar caption: {sent_bytes} byte (asli {os.path.getsize(media_file_path)} byte) "
+        f"dalam {time.monotonic() - started:.2f} detik."
+    )
+    cache.set(registry_key, result.id, timeout=OPENAI_FILE_EXPIRY_SECONDS - OPENAI_FILE_EXPIRY_MARGIN_SECONDS)
+    return result.id
+
+def _media_path_from_url(media_url):
+    """Path file absolut dari URL media. Ini mengasumsikan MEDIA_ROOT terkonfigurasi dengan benar."""
+    relative_path = media_url.replace(settings.MEDIA_URL, '', 1)
+    return os.path.join(settings.MEDIA_ROOT, relative_path)
+
+def _ai_edit_in_thread(payload):
+    """ai_edit untuk dijalankan di thread pool; koneksi DB milik thread ditutup setelahnya."""
+    try:
+        return ai_edit(payload)
+    finally:
+        connections.close_all()
+
+def run_ai_edit_for_assets(assets, prompt, on_result=None):
+    """
+    Menjalankan AI Edit untuk setiap aset secara paralel dengan thread pool
+    berukuran AI_MAX_CONCURRENCY. Kegagalan satu gambar tidak menghentikan
+    gambar lain.
+
+    `on_result(asset, edited_media_url, error)` dipanggil di thread pemanggil
+    setiap kali satu aset selesai, sehingga progres bisa langsung disimpan.
+    Mengembalikan dict {asset.id: edited_media_url} untuk aset yang berhasil.
+    """
+    edited_urls = {}
+    if not assets:
+        return edited_urls
+
+    with ThreadPoolExecutor(max_workers=min(settings.AI_MAX_CONCURRENCY, len(assets))) as executor:
+        futures = {
+            executor.submit(_ai_edit_in_thread, AIEditPayload(media_file_path=asset.file.path, prompt=prompt)): asset
+            for asset in assets
+        }
+        for future in as_completed(futures):
+            asset = futures[future]
+            try:
+                edited_media_url = future.result().edited_media_file_path
+            except Exception as e:
+                logger.error(f"Gagal menjalankan AI Edit untuk MediaAsset ID: {asset.id}. Error: {e}")
+                if on_result:
+                    on_result(asset, None, e)
+                continue
+            edited_urls[asset.id] = edited_media_url
+            logger.info(f"Gambar AI berhasil diedit untuk MediaAsset ID: {asset.id}. URL: {edited_media_url}")
+            if on_result:
+                on_result(asset, edited_media_url, None)
+    return edited_urls
+
+def run_ai_tasks_for_schedule(schedule, on_edit_result=None):
     """
     Orchestrates AI tasks based on the schedule's needs.
-    If both edit and caption are needed, it edits first, then captions the edited image.
+    If both edit and caption are needed, it edits first, then captions the edited images.
+    Untuk carousel, semua gambar diedit secara paralel (lihat run_ai_edit_for_assets).
     """
     ai_generated_caption = None
-    edited_media_url = None
-    image_path_for_captioning = None # Path gambar yang akan digunakan untuk caption
+    edited_urls = {}
 
-    first_asset = schedule.media_assets.first()
-    if not first_asset or not first_asset.file:
+    assets = [asset for asset in schedule.media_assets.all() if asset.file]
+    if not assets:
         logger.warning(f"Tidak ada media asset ditemukan untuk Jadwal ID: {schedule.id}. Membatalkan tugas AI.")
-        return {'ai_generated_caption': None, 'edited_media_url': None}
+        return {'ai_generated_caption': None, 'edited_media_url': None, 'edited_media_urls': {}}
+    first_asset = assets[0]
 
-    # Langkah 1: Jalankan AI Edit jika diperlukan
-    if schedule.needs_ai_edit:
-        logger.info(f"Memulai tugas AI Edit untuk Jadwal ID: {schedule.id}")
-        if schedule.ai_edit_prompt:
-            try:
-                payload = AIEditPayload(
-                    media_file_path=first_asset.file.path,
-                    prompt=schedule.ai_edit_prompt
-                )
-                response = ai_edit(payload)
-                edited_media_url = response.edited_media_file_path
-                
-                # Dapatkan path file absolut dari URL media untuk digunakan oleh AI Caption
-                # Ini mengasumsikan MEDIA_ROOT terkonfigurasi dengan benar
-                relative_path = edited_media_url.replace(settings.MEDIA_URL, '')
-                image_path_for_captioning = os.path.join(settings.MEDIA_ROOT, relative_path)
-
-                logger.info(f"Gambar AI berhasil diedit untuk Jadwal ID: {schedule.id}. URL: {edited_media_url}")
-            except Exception as e:
-                logger.error(f"Gagal menjalankan AI Edit untuk Jadwal ID: {schedule.id}. Error: {e}")
-                # Jika edit gagal, kita tetap gunakan gambar asli untuk caption
-                image_path_for_captioning = first_asset.file.path
-        else:
-            # Jika needs_ai_edit dicentang tapi prompt kosong, gunakan gambar asli
-            image_path_for_captioning = first_asset.file.path
-    else:
-        # Jika tidak ada AI edit, gunakan gambar asli untuk caption
-        image_path_for_captioning = first_asset.file.path
+    # Langkah 1: Jalankan AI Edit jika diperlukan (hanya untuk gambar).
+    # Jika needs_ai_edit dicentang tapi prompt kosong, gunakan gambar asli.
+    if schedule.needs_ai_edit and schedule.ai_edit_prompt and schedule.media_type == 'IMAGE':
+        logger.info(f"Memulai tugas AI Edit untuk {len(assets)} gambar pada Jadwal ID: {schedule.id}")
+        edited_urls = run_ai_edit_for_assets(assets, schedule.ai_edit_prompt, on_result=on_edit_result)
 
-    # Langkah 2: Jalankan AI Caption jika diperlukan, menggunakan gambar yang sesuai
-    if schedule.needs_ai_caption and image_path_for_captioning:
-        logger.info(f"Memulai tugas AI Caption untuk Jadwal ID: {schedule.id} menggunakan gambar: {image_path_for_captioning}")
+    # Langkah 2: Jalankan AI Caption jika diperlukan (hanya untuk gambar; video tidak
+    # bisa diproses prepare_for_caption). Gambar yang berhasil diedit dipakai untuk
+    # caption; jika edit gagal, gunakan gambar asli. Untuk carousel, semua gambar
+    # ikut dianalisis secara paralel.
+    if schedule.needs_ai_caption and schedule.media_type != 'IMAGE':
+        logger.warning(f"AI Caption belum didukung untuk {schedule.media_type} (Jadwal ID: {schedule.id}); dilewati.")
+    elif schedule.needs_ai_caption:
+        caption_paths = [
+            _media_path_from_url(edited_urls[asset.id]) if asset.id in edited_urls else asset.file.path
+            for asset in assets
+        ]
+        logger.info(f"Memulai tugas AI Caption untuk Jadwal ID: {schedule.id} menggunakan {len(caption_paths)} gambar")
         try:
-            payload = AICaptionPayload(media_file_path=image_path_for_captioning)
+            payload = AICaptionPayload(
+                media_file_path=caption_paths[0],
+                additional_media_file_paths=caption_paths[1:]
+            )
             response = ai_caption(payload)
             ai_generated_caption = response.caption
             logger.info(f"Caption AI berhasil dihasilkan untuk Jadwal ID: {schedule.id}")
@@ -72,92 +226,152 @@ def run_ai_tasks_for_schedule(schedule):
     
     return {
         'ai_generated_caption': ai_generated_caption,
-        'edited_media_url': edited_media_url
+        'edited_media_url': edited_urls.get(first_asset.id),
+        'edited_media_urls': edited_urls,
     }
 
 def ai_edit(payload: AIEditPayload) -> AIEditResponse:
     """
     Runs AI editing tasks for a given image.
-    
+    Hasil untuk kombinasi gambar + prompt yang sama diambil dari cache, dan permintaan
+    identik yang berjalan bersamaan digabung menjadi satu panggilan OpenAI (single-flight).
+    Hasil disimpan sebagai blob; URL yang dikembalikan sudah memegang satu
+    referensi blob milik pemanggil (mis. MediaAsset.edited_file).
     """
-    client = openai.OpenAI(api_key=openai_api_key)
+    media_hash = ai_cache.file_sha256(payload.media_file_path)
+    path_in_storage = singleflight.do(
+        singleflight.make_key('ai.edit', media_hash, EDIT_MODEL, payload.prompt),
+        lambda: _edit_result_name(payload, media_hash),
+        lock_timeout=AI_EDIT_LOCK_TIMEOUT,
+    )
+    # Setiap pemanggil memegang referensinya sendiri; blob hasil dipakai bersama
+    retain_blob(path_in_storage)
+    return AIEditResponse(edited_media_file_path=default_storage.url(path_in_storage))
+
+def _edit_result_name(payload, media_hash):
+    """
+    Nama blob hasil edit dari cache, atau dari OpenAI jika belum ada.
+    Referensi blob dipegang oleh entri cache AI, bukan oleh pemanggil.
+    """
+    cached = ai_cache.lookup('EDIT', media_hash, EDIT_MODEL, payload.prompt)
+    if cached and sha256_from_name(cached.result_file):
+        return cached.result_file
+
+    if cached:
+        # Hasil lama (sebelum blob): pindahkan ke blob agar bisa dipakai bersama
+        with default_storage.open(cached.result_file, 'rb') as f:
+            path_in_storage = store_blob(f, cached.result_file)
+    else:
+        path_in_storage = store_blob(ContentFile(_request_edit(payload)), 'edited.png')
+        logger.info(f"Berhasil menyimpan gambar hasil editan ke {default_storage.url(path_in_storage)}")
+    ai_cache.store('EDIT', media_hash, EDIT_MODEL, payload.prompt, result_file=path_in_storage)
+    # Referensi dari store_blob dipindahkan ke entri cache
+    release_blob(path_in_storage)
+    return path_in_storage
+
+def _request_edit(payload):
+    """Meminta Image Edit ke OpenAI dan mengembalikan bytes gambar hasil."""
+    client = get_openai_client()
     
     try: # request an Image Edit to openai
         logger.info(f"Proses: Melakukan permintaan AI Edit untuk {payload.media_file_path} ke OpenAI.")
         
-        # Gambar harus dikonversi ke RGBA untuk DALL-E 2 edit
-        img = Image.open(payload.media_file_path).convert("RGBA")
-        
-        # Simpan gambar RGBA ke stream byte di memori
-        byte_stream = io.BytesIO()
-        img.save(byte_stream, format="PNG")
-        byte_stream.seek(0) # Kembali ke awal stream untuk dibaca
+        # Gambar diperkecil ke resolusi efektif model dan dikonversi ke PNG RGBA
+        byte_stream = prepare_for_edit(payload.media_file_path)
+        sent_bytes = byte_stream.getbuffer().nbytes
 
         # Berikan nama file dan data stream sebagai tuple untuk memastikan mimetype benar
         # Format: (nama_file, file_data, mimetype)
         image_data_tuple = ('image.png', byte_stream, 'image/png')
 
-        result = client.images.edit(
-            model="gpt-image-1", # Sesuai permintaan, model tidak diubah
+        started = time.monotonic()
+        result = _openai_request(
+            f"openai:{EDIT_MODEL}",
+            'images.edit',
+            client.images.edit,
+            model=EDIT_MODEL, # Sesuai permintaan, model tidak diubah
             image=image_data_tuple, # Berikan tuple yang berisi data lengkap
             prompt=payload.prompt,
             n=1,
             quality='low'
         )
+        logger.info(
+            f"AI Edit: mengirim {sent_bytes} byte (asli {os.path.getsize(payload.media_file_path)} byte), "
+            f"selesai dalam {time.monotonic() - started:.2f} detik."
+        )
         image_base64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_base64)
-
-        # Hasilkan nama file unik dan simpan menggunakan sistem penyimpanan Django
-        original_path = Path(payload.media_file_path)
-        edited_filename_stem = f"{original_path.stem}_edited_{os.urandom(4).hex()}"
-        edited_filename = f"edited/{edited_filename_stem}{original_path.suffix}" # Simpan di subfolder 'edited'
-        
-        path_in_storage = default_storage.save(edited_filename, ContentFile(image_bytes))
-        
-        edited_url = default_storage.url(path_in_storage)
-        logger.info(f"Berhasil menyimpan gambar hasil editan ke {edited_url}")
-        return AIEditResponse(edited_media_file_path=edited_url) # Kembalikan URL lengkap
+        return base64.b64decode(image_base64)
     except Exception as e:
         logger.error(f"Terjadi error saat melakukan permintaan AI Edit ke OpenAI. Error: {e}")
         raise e
 
+def _request_caption(client, file_ids, prompt):
+    content = [{"type": "input_text", "text": prompt}]
+    content += [{"type": "input_image", "file_id": file_id} for file_id in file_ids]
+    return _openai_request(
+        f"openai:{CAPTION_MODEL}",
+        'responses.create',
+        client.responses.create,
+        model=CAPTION_MODEL,
+        input=[{
+            "role": "user",
+            "content": content,
+        }],
+    )
+
 def ai_caption(payload: AICaptionPayload) -> AICaptionResponse:
     """
-    Runs AI captioning tasks for a given image.
+    Runs AI captioning tasks for a given image (atau semua gambar carousel).
+    Hash dan upload setiap gambar dijalankan paralel dengan thread pool terbatas,
+    lalu semua gambar dianalisis dalam satu permintaan caption.
+    Caption untuk gambar yang sama diambil dari cache tanpa upload ulang, dan permintaan
+    identik yang berjalan bersamaan digabung (single-flight).
     """
-    client = openai.OpenAI(api_key=openai_api_key)
-    
+    paths = [payload.media_file_path, *payload.additional_media_file_paths]
+    prompt = CAPTION_PROMPT if len(paths) == 1 else CAROUSEL_CAPTION_PROMPT
+
+    with ThreadPoolExecutor(max_workers=min(settings.AI_MAX_CONCURRENCY, len(paths))) as executor:
+        media_hashes = list(executor.map(ai_cache.file_sha256, paths))
+        caption_hash = ai_cache.combine_hashes(media_hashes)
+        caption = singleflight.do(
+            singleflight.make_key('ai.caption', caption_hash, CAPTION_MODEL, prompt),
+            lambda: _generate_caption(executor, paths, media_hashes, caption_hash, prompt),
+            lock_timeout=AI_CAPTION_LOCK_TIMEOUT,
+        )
+    return AICaptionResponse(caption=caption)
+
+def _generate_caption(executor, paths, media_hashes, caption_hash, prompt):
+    """Caption dari cache, atau dari OpenAI (upload gambar paralel lewat `executor`)."""
+    cached = ai_cache.lookup('CAPTION', caption_hash, CAPTION_MODEL, prompt)
+    if cached:
+        return cached.caption
+
+    client = get_openai_client()
+
+    def upload_all():
+        return list(executor.map(lambda path, media_hash: upload_file_for_vision(client, path, media_hash), paths, media_hashes))
+
     try:
-        logger.info(f"Proses: Melakukan permintaan AI Caption untuk {payload.media_file_path} ke OpenAI.")
-        result = client.files.create(
-                file=open(payload.media_file_path, "rb"),
-                purpose="user_data",
-                expires_after={
-                    "anchor": "created_at",
-                    "seconds" : 259200
-                  }
-                )
-        file_id = result.id
+        logger.info(f"Proses: Melakukan permintaan AI Caption untuk {len(paths)} gambar ke OpenAI.")
+        started = time.monotonic()
+        file_ids = upload_all()
+        logger.info(f"Upload {len(paths)} gambar caption selesai dalam {time.monotonic() - started:.2f} detik.")
     except Exception as e:
         logger.error(f"Terjadi error saat melakukan upload gambar ke OpenAI. Error: {e}")
         raise e
     try:
-        response = client.responses.create(
-            model="gpt-4.1",
-            input=[{
-                "role": "user",
-                "content": [
-                    {"type": "input_text", "text": "Buatkan caption media sosial yang kreatif dan menarik untuk gambar ini. Maksimal 200 karakter."},
-                    {
-                        "type": "input_image",
-                        "file_id": file_id,
-                    },
-                ],
-            }],
-        )
+        try:
+            response = _request_caption(client, file_ids, prompt)
+        except openai.NotFoundError:
+            # file_id di registry sudah dihapus di sisi OpenAI; upload ulang sekali
+            for media_hash in media_hashes:
+                forget_uploaded_file(media_hash)
+            file_ids = upload_all()
+            response = _request_caption(client, file_ids, prompt)
         logger.info(f"Berhasil melakukan caption generation.")
         caption = response.output_text
-        return AICaptionResponse(caption=caption)
+        ai_cache.store('CAPTION', caption_hash, CAPTION_MODEL, prompt, caption=caption)
+        return caption
     except Exception as e:
         logger.error(f"Terjadi error saat melakukan permintaan Caption Generation ke OpenAI. Error: {e}")
-        raise e
\ No newline at end of file
+        raise e
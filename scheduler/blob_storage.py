@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import re
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs/'
+BLOB_NAME_RE = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(\.[\w]+)?$')
+
+
+def blob_name(sha256, ext=''):
+    """Nama file di storage untuk sebuah hash: blobs/ab/cd/<sha256><ext>."""
+    return f"{BLOB_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}"
+
+
+def sha256_from_name(name):
+    """Hash isi file jika `name` adalah nama blob, selain itu None."""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group('sha256') if match else None
+
+
+def sha256_from_path(path):
+    """Seperti sha256_from_name, tetapi untuk path absolut di MEDIA_ROOT."""
+    try:
+        name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    except ValueError:
+        return None
+    return sha256_from_name(name)
+
+
+def _temp_path():
+    temp_dir = os.path.join(settings.MEDIA_ROOT, BLOB_PREFIX, '.tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    return os.path.join(temp_dir, uuid.uuid4().hex)
+
+
+def write_temp_blob(fileobj, chunk_size=1024 * 1024):
+    """
+    Menulis isi `fileobj` ke file sementara di MEDIA_ROOT sambil menghitung SHA-256,
+    sehingga data hanya dibaca dan ditulis sekali. Upload yang sudah di-spool ke disk
+    (TemporaryUploadedFile) dipindahkan dengan rename jika berada di filesystem yang
+    sama, lalu hanya dibaca untuk hash. Tidak menyentuh database (aman dipanggil
+    dari thread). Mengembalikan (temp_path, sha256, size).
+    """
+    temp_path = _temp_path()
+    if hasattr(fileobj, 'temporary_file_path'):
+        try:
+            os.replace(fileobj.temporary_file_path(), temp_path)
+        except OSError:
+            pass  # Beda filesystem (mis. /tmp): salin seperti file biasa
+        else:
+            try:
+                # File spool Django dibuat 0600; samakan dengan file yang disimpan lewat storage
+                os.chmod(temp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+                return (temp_path, *hash_file(temp_path, chunk_size))
+            except Exception:
+                discard_temp(temp_path)
+                raise
+
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    try:
+        with open(temp_path, 'wb') as out:
+            chunks = fileobj.chunks(chunk_size) if hasattr(fileobj, 'chunks') else iter(lambda: fileobj.read(chunk_size), b'')
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        discard_temp(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 dan ukuran file yang sudah ada di disk (mis. hasil upload bertahap)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest(), os.path.getsize(path)
+
+
+def discard_temp(temp_path):
+    if temp_path and os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+def commit_blobs(items):
+    """
+    Mendaftarkan banyak file sementara sebagai blob dengan jumlah query yang konstan.
+    `items` adalah list (temp_path, sha256, size, filename). Setiap item menambah satu
+    referensi; isi yang sudah tersimpan dipakai ulang dan file sementaranya dibuang,
+    selain itu file dipindahkan ke lokasi blob dengan rename atomik.
+    Mengembalikan list nama blob sesuai urutan `items`. File sudah berada di lokasi
+    akhir sebelum transaksi commit; panggil discard_orphan_blobs() jika transaksi
+    pemanggil di-rollback.
+    """
+    if not items:
+        return []
+    ref_counts = Counter(sha256 for _, sha256, _, _ in items)
+    with transaction.atomic():
+        blobs = {blob.sha256: blob for blob in MediaBlob.objects.select_for_update().filter(sha256__in=ref_counts)}
+        new_blobs = {}
+        for _, sha256, size, filename in items:
+            if sha256 not in blobs and sha256 not in new_blobs:
+                new_blobs[sha256] = MediaBlob(
+                    sha256=sha256, name=blob_name(sha256, os.path.splitext(filename)[1]),
+                    size=size, ref_count=ref_counts[sha256],
+                )
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.bulk_create(new_blobs.values())
+        except IntegrityError:
+            # Blob yang sama dibuat bersamaan oleh proses lain; daftarkan satu per satu
+            return [commit_blobs([item])[0] for item in items]
+
+        existing_by_count = {}
+        for sha256, blob in blobs.items():
+            existing_by_count.setdefault(ref_counts[sha256], []).append(blob.pk)
+        for count, pks in existing_by_count.items():
+            MediaBlob.objects.filter(pk__in=pks).update(ref_count=F('ref_count') + count)
+        blobs.update(new_blobs)
+
+        names = []
+        for temp_path, sha256, size, _ in items:
+            name = blobs[sha256].name
+            final_path = default_storage.path(name)
+            if os.path.exists(final_path):
+                discard_temp(temp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(temp_path, final_path)
+            names.append(name)
+    reused = sum(ref_counts.values()) - len(new_blobs)
+    if reused:
+        logger.info(f"{reused} file memakai ulang blob yang sudah ada")
+    return names
+
+
+def commit_blob(temp_path, sha256, size, filename):
+    """Seperti commit_blobs untuk satu file. Mengembalikan nama blob."""
+    return commit_blobs([(temp_path, sha256, size, filename)])[0]
+
+
+def store_blob(fileobj, filename):
+    """Menyimpan file sebagai blob (hash saat streaming) dengan satu referensi baru."""
+    temp_path, sha256, size = write_temp_blob(fileobj)
+    try:
+        return commit_blob(temp_path, sha256, size, filename)
+    finally:
+        discard_temp(temp_path)
+
+
+def retain_blob(name):
+    """Menambah satu referensi ke blob yang sudah ada. Nama non-blob diabaikan."""
+    if not sha256_from_name(name):
+        return
+    updated = MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+    if not updated:
+        raise MediaBlob.DoesNotExist(f"Blob {name} tidak ditemukan.")
+
+
+def release_blob(name):
+    """
+    Melepas satu referensi. File fisik baru dihapus (setelah commit) saat referensi terakhir dilepas.
+    Nama file lama (bukan blob) langsung dihapus seperti perilaku sebelumnya.
+    """
+    if not name:
+        return
+    if not sha256_from_name(name):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        return
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            return
+        blob.delete()
+        transaction.on_commit(lambda: discard_orphan_blobs([name]))
+
+
+def discard_orphan_blobs(names):
+    """
+    Menghapus file blob (beserta rendition-nya) yang tidak punya referensi.
+
+    Setiap file diperiksa ulang di bawah lock baris: baris MediaBlob untuk hash-nya
+    dikunci, atau dibuat sebagai penanda (ref_count 0) jika belum ada, dan baru
+    dihapus bersama filenya. commit_blobs yang bersamaan untuk hash yang sama
+    menunggu lock tersebut, sehingga tidak pernah memakai file yang sedang dihapus.
+    """
+    from .renditions import delete_renditions  # renditions.py bergantung pada modul ini
+    for name in names:
+        sha256 = sha256_from_name(name)
+        if not sha256:
+            continue
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'name': name, 'size': 0},
+            )
+            live = not created and blob.ref_count > 0
+            if live and blob.name == name:
+                continue
+            if default_storage.exists(name):
+                default_storage.delete(name)
+                logger.info(f"Menghapus file blob {name}")
+            if not live:
+                delete_renditions(sha256)
+                blob.delete()
@@ -0,0 +1,333 @@
+"""
+Server HTTP lokal palsu untuk benchmark dan pengujian tanpa memanggil API asli.
+"""
+import base64
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """
+    Dasar handler API palsu: membaca body per chunk lalu membuangnya, dan mensimulasikan
+    latensi, rate limit (429 + Retry-After), serta error acak (500).
+    Atribut kelas bisa di-override per server, mis. lewat FakeServerProcess(..., latency=0.2).
+    """
+
+    chunk_size = 64 * 1024
+    # HTTP/1.1 agar koneksi keep-alive dari client bisa dipakai ulang
+    protocol_version = 'HTTP/1.1'
+    # Header dan body dikirim terpisah; tanpa TCP_NODELAY, Nagle + delayed ACK menambah ~40 ms
+    disable_nagle_algorithm = True
+    # Latensi buatan per permintaan (detik), meniru waktu respons API asli
+    latency = 0
+    # Fraksi permintaan (0..1) yang dijawab 500
+    error_rate = 0
+    # Batas permintaan per detik untuk seluruh server (0 = tanpa batas); kelebihannya dijawab 429
+    rate_limit = 0
+
+    def log_message(self, format, *args):
+        # Jangan kotori output benchmark dengan access log
+        pass
+
+    def _drain_body(self):
+        received = 0
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().strip() or b'0', 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                remaining = size
+                while remaining:
+                    remaining -= len(self.rfile.read(min(self.chunk_size, remaining)))
+                self.rfile.readline()
+                received += size
+            return received
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining:
+            chunk = self.rfile.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            received += len(chunk)
+        return received
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {'success': False, 'message': message}, headers)
+
+    def _route(self):
+        """Segmen terakhir path tanpa query string, mis. '/api/upload_photos' -> 'upload_photos'."""
+        return self.path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+
+    def _inject_faults(self):
+        """Latensi, rate limit, dan error buatan. True jika respons error sudah dikirim."""
+        self.server.count_request(f"{self.command} {self._route()}")
+        time.sleep(self.latency)
+        if self.rate_limit:
+            retry_after = self.server.acquire_rate_limit(self.rate_limit)
+            if retry_after:
+                self._send_error(429, 'Rate limit exceeded.', {'Retry-After': str(retry_after)})
+                return True
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_error(500, 'Simulated server error.')
+            return True
+        return False
+
+
+class FakeUploadPostHandler(FakeAPIHandler):
+    """
+    Meniru endpoint Upload Post API: POST upload_photos/upload, GET uploadposts/schedule,
+    serta PATCH/DELETE schedule/<job_id>. Job yang dibuat lewat POST ikut muncul di daftar jadwal.
+    """
+
+    def do_POST(self):
+        received = self._drain_body()
+        self.server.bytes_received += received
+        if self._inject_faults():
+            return
+        job_id = uuid.uuid4().hex
+        if isinstance(self.server.schedules, list):
+            self.server.schedules.append({'job_id': job_id, 'status': 'scheduled'})
+        self._send_json(200, {'success': True, 'job_id': job_id, 'bytes_received': received})
+
+    def do_GET(self):
+        # Daftar jadwal dengan ETag; If-None-Match yang cocok dijawab 304 tanpa body
+        self.server.list_requests += 1
+        if self._inject_faults():
+            return
+        body = json.dumps(self.server.schedules).encode('utf-8')
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        self._drain_body()
+        if self._inject_faults():
+            return
+        if isinstance(self.server.schedules, list):
+            job_id = self._route()
+            self.server.schedules[:] = [item for item in self.server.schedules if item.get('job_id') != job_id]
+        self._send_json(200, {'success': True})
+
+    def do_PATCH(self):
+        self._drain_body()
+        if self._inject_faults():
+            return
+        self._send_json(200, {'success': True, 'job_id': self._route()})
+
+
+def _placeholder_png(size=(256, 256), color=(200, 120, 160, 255)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class FakeOpenAIHandler(FakeAPIHandler):
+    """
+    Meniru endpoint OpenAI yang dipakai ai_service: images.edit (POST /v1/images/edits),
+    files.create (POST /v1/files) dan responses.create (POST /v1/responses).
+    Gunakan base URL `<server>/v1` untuk OPENAI_BASE_URL.
+    """
+
+    caption = 'Caption palsu dari server benchmark.'
+    _edited_image_b64 = None
+
+    def _send_error(self, status, message, headers=None):
+        error_type = 'rate_limit_exceeded' if status == 429 else 'server_error'
+        self._send_json(status, {'error': {'message': message, 'type': error_type, 'param': None, 'code': error_type}}, headers)
+
+    @classmethod
+    def _edited_image(cls):
+        if cls._edited_image_b64 is None:
+            cls._edited_image_b64 = base64.b64encode(_placeholder_png()).decode('ascii')
+        return cls._edited_image_b64
+
+    def do_POST(self):
+        received = self._drain_body()
+        self.server.bytes_received += received
+        route = self._route()
+        if route not in ('edits', 'files', 'responses'):
+            self._send_error(404, f"Unknown endpoint {self.path}")
+            return
+        if self._inject_faults():
+            return
+
+        now = int(time.time())
+        if route == 'edits':
+            self._send_json(200, {'created': now, 'data': [{'b64_json': self._edited_image()}]})
+        elif route == 'files':
+            self._send_json(200, {
+                'id': f"file-{uuid.uuid4().hex[:24]}",
+                'object': 'file',
+                'bytes': received,
+                'created_at': now,
+                'expires_at': now + 259200,
+                'filename': 'image.jpg',
+                'purpose': 'user_data',
+                'status': 'processed',
+            })
+        else:
+            self._send_json(200, {
+                'id': f"resp_{uuid.uuid4().hex}",
+                'object': 'response',
+                'created_at': now,
+                'status': 'completed',
+                'model': 'gpt-4.1',
+                'output': [{
+                    'id': f"msg_{uuid.uuid4().hex}",
+                    'type': 'message',
+                    'status': 'completed',
+                    'role': 'assistant',
+                    'content': [{'type': 'output_text', 'text': self.caption, 'annotations': []}],
+                }],
+                'parallel_tool_calls': True,
+                'tool_choice': 'auto',
+                'tools': [],
+            })
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Antrean listen besar agar ratusan koneksi bersamaan tidak ditolak saat benchmark
+    request_queue_size = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bytes_received = 0
+        # Isi daftar jadwal untuk GET dan jumlah permintaan GET yang diterima
+        self.schedules = []
+        self.list_requests = 0
+        # Jumlah permintaan per "METHOD route"
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._window_started = time.monotonic()
+        self._window_count = 0
+
+    def count_request(self, name):
+        with self._lock:
+            self.request_counts[name] += 1
+
+    def acquire_rate_limit(self, limit):
+        """Jendela tetap satu detik. Mengembalikan 0 jika diizinkan, atau detik untuk Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_started >= 1:
+                self._window_started = now
+                self._window_count = 0
+            if self._window_count < limit:
+                self._window_count += 1
+                return 0
+            return max(1, math.ceil(1 - (now - self._window_started)))
+
+
+class FakeServer:
+    """
+    Menjalankan handler di thread terpisah pada port acak.
+    Gunakan sebagai context manager:
+
+        with FakeServer(FakeUploadPostHandler) as server:
+            requests.post(f"{server.base_url}/upload", ...)
+    """
+
+    def __init__(self, handler_class, host='127.0.0.1', port=0):
+        self.httpd = _FakeHTTPServer((host, port), handler_class)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def bytes_received(self):
+        return self.httpd.bytes_received
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _serve_forever(handler_class, handler_attrs, host, port_queue):
+    handler = type(handler_class.__name__, (handler_class,), handler_attrs)
+    httpd = _FakeHTTPServer((host, 0), handler)
+    port_queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+class FakeServerProcess:
+    """
+    Seperti FakeServer, tetapi berjalan di proses terpisah sehingga thread server
+    tidak berebut GIL dengan client yang sedang diukur (penting untuk benchmark
+    konkurensi). Atribut handler (mis. latency) diberikan sebagai keyword argument:
+
+        with FakeServerProcess(FakeUploadPostHandler, latency=0.2) as server:
+            ...
+    """
+
+    def __init__(self, handler_class, host='127.0.0.1', **handler_attrs):
+        self.host = host
+        self.port = None
+        port_queue = multiprocessing.Queue()
+        self._port_queue = port_queue
+        self.process = multiprocessing.Process(
+            target=_serve_forever, args=(handler_class, handler_attrs, host, port_queue), daemon=True,
+        )
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.process.start()
+        self.port = self._port_queue.get(timeout=10)
+        return self
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,5 +1,6 @@
+import uuid
 from django import forms
-from .models import Schedule
+from .models import Schedule, UploadSession
 
 PLATFORM_CHOICES_FOR_FORM = [
     ('instagram', 'Instagram'),
@@ -8,7 +9,9 @@ PLATFORM_CHOICES_FOR_FORM = [
 
 class ScheduleForm(forms.ModelForm):
     platform = forms.MultipleChoiceField(choices=PLATFORM_CHOICES_FOR_FORM, widget=forms.CheckboxSelectMultiple, required=True)
-    media_files = forms.FileField(required=True, label="Media File(s)")
+    media_files = forms.FileField(required=False, label="Media File(s)")
+    # ID sesi upload bertahap (dipisah koma) untuk file besar yang diunggah per chunk
+    upload_ids = forms.CharField(required=False, widget=forms.HiddenInput)
 
     class Meta:
         model = Schedule
@@ -22,8 +25,9 @@ class ScheduleForm(forms.ModelForm):
             'caption': forms.Textarea(attrs={'rows': 5}),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.user = user
         self.fields['ai_edit_prompt'].required = False
         self.fields['content_type'].required = False # Opsional, tergantung logika bisnis
         self.fields['caption'].required = False
@@ -42,11 +46,27 @@ class ScheduleForm(forms.ModelForm):
         # Jika tidak ada yang dipilih, validasi form akan gagal karena `required=True`
         return None
 
+    def clean_upload_ids(self):
+        """Mengubah daftar ID menjadi UploadSession milik user yang sudah selesai, sesuai urutan."""
+        raw_ids = [value.strip() for value in self.cleaned_data.get('upload_ids', '').split(',') if value.strip()]
+        if not raw_ids:
+            return []
+        try:
+            ids = [uuid.UUID(value) for value in raw_ids]
+        except ValueError:
+            raise forms.ValidationError('ID upload tidak valid.')
+        uploads = UploadSession.objects.filter(pk__in=ids, user=self.user, completed_at__isnull=False)
+        uploads_by_id = {upload.pk: upload for upload in uploads}
+        if len(uploads_by_id) != len(set(ids)):
+            raise forms.ValidationError('Sebagian upload belum selesai atau tidak ditemukan. Silakan unggah ulang.')
+        return [uploads_by_id[upload_id] for upload_id in dict.fromkeys(ids)]
+
     def clean(self):
         cleaned_data = super().clean()
         media_type = cleaned_data.get("media_type")
         # Akses file dari self.files karena tidak terikat ke model
-        media_files = self.files.getlist('media_files')
+        # Termasuk file besar yang sudah selesai diunggah per chunk
+        media_files = self.files.getlist('media_files') + cleaned_data.get('upload_ids', [])
 
         if not media_files:
             self.add_error('media_files', 'This field is required.')
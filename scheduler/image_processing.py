@@ -0,0 +1,76 @@
+import io
+import logging
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Resolusi efektif model: gpt-image-1 bekerja paling besar di 1536px,
+# sedangkan input vision (detail tinggi) diskalakan ke maksimal 2048px
+# dengan sisi terpendek 768px. Piksel di atas batas ini hanya membuang bandwidth.
+EDIT_MAX_SIDE = 1536
+CAPTION_MAX_SIDE = 2048
+CAPTION_MAX_SHORT_SIDE = 768
+CAPTION_JPEG_QUALITY = 85
+
+# Rendition untuk tampilan di aplikasi: (sisi terpanjang, kualitas WebP)
+RENDITION_SPECS = {
+    'thumbnail': (320, 70),
+    'preview': (1280, 80),
+}
+
+
+def _open_upright(path):
+    """Membuka gambar dan menerapkan orientasi EXIF (foto ponsel sering disimpan miring)."""
+    img = Image.open(path)
+    return ImageOps.exif_transpose(img)
+
+
+def _fit_within(img, max_side, max_short_side=None):
+    width, height = img.size
+    scale = min(1.0, max_side / max(width, height))
+    if max_short_side:
+        scale = min(scale, max_short_side / min(width, height))
+    if scale < 1.0:
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        img = img.resize(new_size, Image.LANCZOS)
+    return img
+
+
+def prepare_for_edit(path):
+    """
+    Menyiapkan gambar untuk images.edit: diperkecil ke resolusi efektif model,
+    dikonversi ke RGBA, dan disimpan sebagai PNG tanpa metadata.
+    Mengembalikan BytesIO yang siap dikirim.
+    """
+    img = _fit_within(_open_upright(path), EDIT_MAX_SIDE).convert("RGBA")
+    byte_stream = io.BytesIO()
+    img.save(byte_stream, format="PNG")
+    byte_stream.seek(0)
+    return byte_stream
+
+
+def prepare_for_caption(path):
+    """
+    Menyiapkan gambar untuk captioning: diperkecil ke resolusi yang benar-benar
+    dilihat model vision lalu di-encode sebagai JPEG.
+    Mengembalikan BytesIO yang siap dikirim.
+    """
+    img = _fit_within(_open_upright(path), CAPTION_MAX_SIDE, CAPTION_MAX_SHORT_SIDE).convert("RGB")
+    byte_stream = io.BytesIO()
+    img.save(byte_stream, format="JPEG", quality=CAPTION_JPEG_QUALITY, optimize=True)
+    byte_stream.seek(0)
+    return byte_stream
+
+
+def make_rendition(path, kind):
+    """
+    Membuat rendition WebP kecil (thumbnail/preview) untuk ditampilkan di halaman,
+    tanpa metadata. Mengembalikan BytesIO yang siap disimpan.
+    """
+    max_side, quality = RENDITION_SPECS[kind]
+    img = _fit_within(_open_upright(path), max_side)
+    img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+    byte_stream = io.BytesIO()
+    img.save(byte_stream, format="WEBP", quality=quality, method=4)
+    byte_stream.seek(0)
+    return byte_stream
@@ -0,0 +1,252 @@
+"""
+Instrumentasi latensi: durasi view, query database, dan panggilan ke layanan
+eksternal (OpenAI, Upload Post).
+
+- `timed(metric, **labels)` mengukur satu blok kode ke histogram `metric`.
+- Histogram dikumpulkan per proses lalu di-flush berkala ke Django cache sehingga
+  `/internal/metrics` memuat data dari semua worker web dan Celery (jika cache-nya Redis).
+- Selama request berjalan, durasi juga dijumlahkan per komponen untuk header
+  `Server-Timing` (lihat request_timing_middleware).
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+REQUEST_METRIC = 'scheduler_http_request_duration_seconds'
+DB_METRIC = 'scheduler_db_query_duration_seconds'
+UPSTREAM_METRIC = 'scheduler_upstream_request_duration_seconds'
+
+METRIC_HELP = {
+    REQUEST_METRIC: 'Durasi request HTTP per view.',
+    DB_METRIC: 'Durasi satu query (atau satu batch executemany) database.',
+    UPSTREAM_METRIC: 'Durasi panggilan ke layanan eksternal per upstream dan operasi.',
+}
+
+# Batas bucket (detik): dari query database cepat sampai upload media besar
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Index seri (id -> nama metrik + label); setiap proses melengkapinya saat flush
+SERIES_INDEX_KEY = 'metrics:series'
+
+_lock = threading.Lock()
+_pending = defaultdict(int)
+_series = {}
+_last_flush = time.monotonic()
+
+# Durasi per komponen untuk request yang sedang berjalan (dict komponen -> [detik, jumlah])
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def _series_id(metric, labels):
+    return hashlib.sha1(repr((metric, labels)).encode('utf-8')).hexdigest()[:16]
+
+
+def observe(metric, seconds, **labels):
+    """Mencatat satu durasi ke histogram `metric` dengan label `labels`."""
+    labels = tuple(sorted((key, str(value)) for key, value in labels.items()))
+    sid = _series_id(metric, labels)
+    bucket = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+    with _lock:
+        _series.setdefault(sid, (metric, labels))
+        _pending[f"metrics:{sid}:{bucket}"] += 1
+        _pending[f"metrics:{sid}:sum"] += int(seconds * 1_000_000)
+        due = time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def _incr(key, delta):
+    # Sama seperti penghitung ai_cache: add() membuat key hanya jika belum ada
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def flush():
+    """Menulis histogram proses ini ke cache. Error cache tidak mengganggu request."""
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        series = dict(_series)
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    try:
+        # Dicek setiap flush: seri yang hilang (update balapan, cache di-restart) didaftarkan ulang
+        index = cache.get(SERIES_INDEX_KEY) or {}
+        if not series.keys() <= index.keys():
+            cache.set(SERIES_INDEX_KEY, {**index, **series}, timeout=None)
+        for key, delta in pending.items():
+            _incr(key, delta)
+    except Exception as e:
+        logger.warning(f"Gagal menyimpan metrik ke cache. Error: {e}")
+
+
+def _format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_metrics():
+    """Semua histogram dalam format teks Prometheus."""
+    flush()
+    index = cache.get(SERIES_INDEX_KEY) or {}
+    keys = [
+        f"metrics:{sid}:{suffix}"
+        for sid in index
+        for suffix in [*range(len(BUCKETS) + 1), 'sum']
+    ]
+    values = cache.get_many(keys)
+
+    by_metric = defaultdict(list)
+    for sid, (metric, labels) in index.items():
+        by_metric[metric].append((sid, labels))
+
+    lines = []
+    for metric in sorted(by_metric):
+        lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for sid, labels in sorted(by_metric[metric], key=lambda item: item[1]):
+            cumulative = 0
+            for i, bound in enumerate([*BUCKETS, '+Inf']):
+                cumulative += values.get(f"metrics:{sid}:{i}", 0)
+                lines.append(f"{metric}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+            total = values.get(f"metrics:{sid}:sum", 0) / 1_000_000
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def _add_request_timing(component, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(component, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def timed(metric, server_timing=None, log=False, **labels):
+    """
+    Mengukur durasi blok `with` ke histogram `metric`. Label `outcome` diisi
+    'ok' atau 'error' (exception) kecuali pemanggil mengisinya sendiri lewat dict
+    yang di-yield. `server_timing` menjumlahkan durasi ke komponen Server-Timing
+    request; `log=True` juga menulis log terstruktur.
+
+        with timed(UPSTREAM_METRIC, server_timing='openai', upstream='openai', operation='images.edit'):
+            ...
+    """
+    started = time.perf_counter()
+    labels = dict(labels)
+    try:
+        yield labels
+    except BaseException:
+        labels.setdefault('outcome', 'error')
+        raise
+    finally:
+        labels.setdefault('outcome', 'ok')
+        elapsed = time.perf_counter() - started
+        observe(metric, elapsed, **labels)
+        if server_timing:
+            _add_request_timing(server_timing, elapsed)
+        if log:
+            fields = ' '.join(f"{key}={value}" for key, value in labels.items())
+            logger.info(
+                f"timing metric={metric} {fields} duration_ms={elapsed * 1000:.1f}",
+                extra={'timing': {'metric': metric, **labels, 'duration_ms': round(elapsed * 1000, 1)}},
+            )
+
+
+def timed_upstream(upstream, operation):
+    """timed() untuk panggilan ke layanan eksternal (histogram, Server-Timing, dan log)."""
+    return timed(UPSTREAM_METRIC, server_timing=upstream, log=True, upstream=upstream, operation=operation)
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Execute wrapper database (lihat connection.execute_wrapper); dipasang di setiap
+    koneksi baru oleh scheduler.signals. Satu executemany dihitung sebagai satu batch.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        observe(DB_METRIC, elapsed, alias=context['connection'].alias)
+        _add_request_timing('db', elapsed)
+
+
+def _server_timing_header(total, timings):
+    parts = [f"app;dur={total * 1000:.1f}"]
+    for component, (seconds, count) in sorted(timings.items()):
+        unit = 'queries' if component == 'db' else 'calls'
+        parts.append(f'{component};dur={seconds * 1000:.1f};desc="{count} {unit}"')
+    return ', '.join(parts)
+
+
+def _finish_request(request, response, started, timings):
+    elapsed = time.perf_counter() - started
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else 'unresolved'
+    observe(REQUEST_METRIC, elapsed, view=view, method=request.method, status=f"{response.status_code // 100}xx")
+    response['Server-Timing'] = _server_timing_header(elapsed, timings)
+
+    db_seconds, db_queries = timings.get('db', (0.0, 0))
+    logger.info(
+        f"request method={request.method} view={view} status={response.status_code} "
+        f"duration_ms={elapsed * 1000:.1f} db_ms={db_seconds * 1000:.1f} db_queries={db_queries}",
+        extra={'timing': {
+            'method': request.method,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            **{f"{component}_ms": round(seconds * 1000, 1) for component, (seconds, _) in timings.items()},
+        }},
+    )
+    return response
+
+
+@sync_and_async_middleware
+def request_timing_middleware(get_response):
+    """
+    Mengukur setiap request: histogram per view, log terstruktur, dan header
+    Server-Timing (app, db, serta upstream yang dipanggil selama request).
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = {}
+            token = _request_timings.set(timings)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _request_timings.reset(token)
+            return _finish_request(request, response, started, timings)
+    else:
+        def middleware(request):
+            timings = {}
+            token = _request_timings.set(timings)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _request_timings.reset(token)
+            return _finish_request(request, response, started, timings)
+    return middleware
@@ -0,0 +1,90 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from scheduler.fake_servers import FakeServerProcess, FakeUploadPostHandler
+from scheduler.upload_post_service import AsyncUploadPostClient, UploadPostClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Membandingkan jalur WSGI (client requests yang memblokir thread, dibatasi jumlah "
+        "worker x thread) dengan jalur ASGI (httpx async dalam satu event loop) untuk "
+        "permintaan ke server Upload Post palsu yang lambat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Jumlah total permintaan.')
+        parser.add_argument('--latency-ms', type=int, default=200, help='Latensi buatan API per permintaan.')
+        parser.add_argument(
+            '--wsgi-threads', type=int, default=8,
+            help='Jumlah permintaan bersamaan jalur WSGI (mis. 4 worker gunicorn x 2 thread).',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='Jumlah permintaan bersamaan jalur ASGI dalam satu proses.',
+        )
+
+    def handle(self, *args, **options):
+        # Server palsu di proses terpisah agar tidak berebut GIL dengan client yang diukur
+        with FakeServerProcess(FakeUploadPostHandler, latency=options['latency_ms'] / 1000) as server:
+            results = [
+                (f"WSGI ({options['wsgi_threads']} thread)", self._run_sync(server.base_url, options)),
+                (f"ASGI ({options['concurrency']} in-flight)", asyncio.run(self._run_async(server.base_url, options))),
+            ]
+
+        self.stdout.write(
+            f"{options['requests']} permintaan DELETE, latensi API {options['latency_ms']} ms"
+        )
+        for label, (latencies, elapsed, errors) in results:
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+            self.stdout.write(
+                f"{label:<28} throughput: {len(latencies) / elapsed:8.1f} req/detik   "
+                f"p50: {statistics.median(latencies or [0]) * 1000:7.1f} ms   p95: {p95 * 1000:7.1f} ms   "
+                f"total: {elapsed:6.2f} s   error: {errors}"
+            )
+
+    def _run_sync(self, base_url, options):
+        client = UploadPostClient(base_url=base_url, pool_size=options['wsgi_threads'])
+
+        def call(i):
+            started = time.perf_counter()
+            response = client.delete_schedule(f"bench-{i}")
+            response.raise_for_status()
+            return time.perf_counter() - started
+
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as executor:
+            futures = [executor.submit(call, i) for i in range(options['requests'])]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    errors += 1
+        return latencies, time.perf_counter() - started, errors
+
+    async def _run_async(self, base_url, options):
+        client = AsyncUploadPostClient(base_url=base_url, pool_size=options['concurrency'])
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def call(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.delete_schedule(f"bench-{i}")
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            outcomes = await asyncio.gather(
+                *(call(i) for i in range(options['requests'])), return_exceptions=True,
+            )
+        finally:
+            await client.aclose()
+        latencies = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+        return latencies, time.perf_counter() - started, len(outcomes) - len(latencies)
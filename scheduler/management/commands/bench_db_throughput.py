@@ -0,0 +1,111 @@
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+import dj_database_url
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from scheduler.models import Schedule, MediaAsset
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test alur create + confirm jadwal secara konkuren langsung ke database. "
+        "Berikan beberapa --url untuk membandingkan, mis. SQLite vs PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', action='append', dest='urls',
+            help='DATABASE_URL yang diuji (bisa berulang). Default: database "default".',
+        )
+        parser.add_argument('--workers', type=int, default=16, help='Jumlah thread konkuren.')
+        parser.add_argument('--iterations', type=int, default=50, help='Jumlah create+confirm per thread.')
+        parser.add_argument('--assets', type=int, default=3, help='Jumlah MediaAsset per jadwal.')
+
+    def handle(self, *args, **options):
+        aliases = ['default']
+        if options['urls']:
+            aliases = []
+            for i, url in enumerate(options['urls']):
+                alias = f"bench_{i}"
+                database = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+                if database['ENGINE'] == 'django.db.backends.sqlite3':
+                    database.setdefault('OPTIONS', {}).update(settings.SQLITE_OPTIONS)
+                # configure_settings melengkapi key default (TIME_ZONE, AUTOCOMMIT, TEST, ...)
+                connections.settings[alias] = connections.configure_settings({
+                    'default': connections.settings['default'],
+                    alias: database,
+                })[alias]
+                call_command('migrate', database=alias, verbosity=0)
+                aliases.append(alias)
+
+        for alias in aliases:
+            self._run(alias, options)
+
+    def _run(self, alias, options):
+        user, _ = User.objects.using(alias).get_or_create(username='bench_db_user')
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(options['iterations']):
+                    started = time.perf_counter()
+                    try:
+                        self._create_and_confirm(alias, user, options['assets'])
+                    except Exception as e:
+                        with lock:
+                            errors.append(str(e))
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        Schedule.objects.using(alias).filter(user=user).delete()
+
+        vendor = connections[alias].vendor
+        self.stdout.write(f"[{alias}] {vendor} - {options['workers']} worker x {options['iterations']} iterasi")
+        if latencies:
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            self.stdout.write(
+                f"  throughput: {len(latencies) / elapsed:8.1f} create+confirm/detik   "
+                f"p50: {statistics.median(latencies) * 1000:7.1f} ms   p95: {p95 * 1000:7.1f} ms"
+            )
+        if errors:
+            self.stdout.write(self.style.WARNING(f"  {len(errors)} error, contoh: {errors[0]}"))
+
+    def _create_and_confirm(self, alias, user, asset_count):
+        # Sama seperti alur aplikasi: buat jadwal + aset, lalu konfirmasi
+        with transaction.atomic(using=alias):
+            schedule = Schedule.objects.using(alias).create(
+                user=user,
+                platform='instagram',
+                media_type='IMAGE',
+                content_type='FEEDS',
+                schedule_time=timezone.now() + timedelta(days=1),
+                caption='benchmark',
+            )
+            MediaAsset.objects.using(alias).bulk_create([
+                MediaAsset(schedule=schedule, file=f"media/bench_{schedule.id}_{i}.jpg", order=i)
+                for i in range(asset_count)
+            ])
+        with transaction.atomic(using=alias):
+            Schedule.objects.using(alias).filter(id=schedule.id).update(status='CONFIRMED')
@@ -0,0 +1,217 @@
+import io
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from internal_scheduler.celery import app as celery_app
+from scheduler.fake_servers import FakeOpenAIHandler, FakeServerProcess, FakeUploadPostHandler
+from scheduler.models import Schedule
+
+STEPS = ('create', 'run_ai', 'confirm', 'list', 'flow')
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank; cukup untuk laporan benchmark
+    if not sorted_values:
+        return 0
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def _jpeg(seed, size=(1080, 1080)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, ((seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark end-to-end alur create -> run-ai -> confirm -> list dengan N user bersamaan, "
+        "terhadap server Upload Post dan OpenAI palsu. Melaporkan p50/p95/p99 dan throughput per langkah. "
+        "Task Celery dijalankan eager di proses ini."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8, help='Jumlah user bersamaan (thread).')
+        parser.add_argument('--iterations', type=int, default=5, help='Jumlah alur per user.')
+        parser.add_argument('--images', type=int, default=1, help='Jumlah gambar per jadwal (>1 = carousel).')
+        parser.add_argument('--no-ai', action='store_true', help='Lewati AI edit dan caption.')
+        parser.add_argument('--upload-post-latency-ms', type=int, default=300)
+        parser.add_argument('--openai-latency-ms', type=int, default=2000)
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraksi permintaan API palsu yang gagal (500).')
+        parser.add_argument('--rate-limit', type=int, default=0, help='Permintaan per detik per server palsu (0 = tanpa batas).')
+        parser.add_argument(
+            '--upload-post-url', default='',
+            help='Pakai server yang sudah berjalan (mis. dari run_fake_servers) alih-alih menjalankan sendiri.',
+        )
+        parser.add_argument('--openai-url', default='', help='Seperti --upload-post-url, untuk OpenAI (sertakan /v1).')
+
+    def handle(self, *args, **options):
+        faults = {'error_rate': options['error_rate'], 'rate_limit': options['rate_limit']}
+        with ExitStack() as stack:
+            upload_post_url = options['upload_post_url']
+            if not upload_post_url:
+                upload_post_url = stack.enter_context(FakeServerProcess(
+                    FakeUploadPostHandler, latency=options['upload_post_latency_ms'] / 1000, **faults,
+                )).base_url + '/api'
+            openai_url = options['openai_url']
+            if not openai_url:
+                openai_url = stack.enter_context(FakeServerProcess(
+                    FakeOpenAIHandler, latency=options['openai_latency_ms'] / 1000, **faults,
+                )).base_url + '/v1'
+
+            stack.enter_context(override_settings(
+                UPLOAD_POST_BASE_URL=upload_post_url,
+                OPENAI_BASE_URL=openai_url,
+                OPENAI_API_KEY='bench',
+                # Host bawaan django.test.Client
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ))
+            # Konfigurasi Celery memakai namespace CELERY_; key tanpa prefix tidak berpengaruh
+            eager = celery_app.conf.CELERY_TASK_ALWAYS_EAGER
+            celery_app.conf.CELERY_TASK_ALWAYS_EAGER = True
+            stack.callback(setattr, celery_app.conf, 'CELERY_TASK_ALWAYS_EAGER', eager)
+
+            users = [User.objects.get_or_create(username=f"bench_e2e_{i}")[0] for i in range(options['users'])]
+            try:
+                latencies, errors, elapsed = self._run(users, options)
+            finally:
+                # Hapus jadwal benchmark; blob media ikut dilepas lewat signal
+                Schedule.objects.filter(user__in=users).delete()
+
+        flows = len(latencies['flow'])
+        self.stdout.write(
+            f"{options['users']} user x {options['iterations']} alur, {options['images']} gambar/jadwal, "
+            f"AI {'nonaktif' if options['no_ai'] else 'aktif'}; {flows} alur selesai dalam {elapsed:.2f} s "
+            f"({flows / elapsed:.2f} alur/detik)"
+        )
+        self.stdout.write(f"{'langkah':<10}{'n':>6}{'error':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/detik':>11}")
+        for step in STEPS:
+            values = sorted(latencies[step])
+            if not values and not errors[step]:
+                continue
+            self.stdout.write(
+                f"{step:<10}{len(values):>6}{errors[step]:>7}"
+                f"{_percentile(values, 50) * 1000:>10.1f}{_percentile(values, 95) * 1000:>10.1f}"
+                f"{_percentile(values, 99) * 1000:>10.1f}{len(values) / elapsed:>11.2f}"
+            )
+
+    def _run(self, users, options):
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def measure(step, func, expected_status, check=None):
+            # `check` memeriksa hasil langkah di database (mis. status jadwal) setelah
+            # response diterima; kode HTTP saja tidak menunjukkan task eager berhasil
+            started = time.perf_counter()
+            try:
+                response = func()
+            except Exception as e:
+                self.stderr.write(f"{step}: {e}")
+                response = None
+            elapsed = time.perf_counter() - started
+            if response is not None and response.status_code != expected_status:
+                self.stderr.write(f"{step}: HTTP {response.status_code}")
+                response = None
+            if response is not None and check is not None:
+                problem = check()
+                if problem:
+                    self.stderr.write(f"{step}: {problem}")
+                    response = None
+            with lock:
+                if response is None:
+                    errors[step] += 1
+                else:
+                    latencies[step].append(elapsed)
+            return response
+
+        def flow(client, user_index, iteration):
+            run_ai = not options['no_ai']
+            schedule_time = timezone.localtime(timezone.now() + timedelta(days=1, minutes=iteration))
+            data = {
+                'platform': ['instagram'],
+                'media_type': 'IMAGE',
+                'content_type': 'FEEDS',
+                'schedule_time': schedule_time.strftime('%Y-%m-%dT%H:%M'),
+                'caption': 'Caption benchmark',
+                'media_files': [
+                    SimpleUploadedFile(f"bench_{user_index}_{iteration}_{i}.jpg", _jpeg(user_index * 1000 + iteration * 10 + i), 'image/jpeg')
+                    for i in range(options['images'])
+                ],
+            }
+            if run_ai:
+                data.update(needs_ai_edit='on', needs_ai_caption='on', ai_edit_prompt='Buat lebih cerah')
+
+            response = measure('create', lambda: client.post(reverse('scheduler:create_schedule'), data), 302)
+            match = response and re.search(r'/(\d+)/$', response['Location'])
+            if not match:
+                return False
+            schedule_id = int(match.group(1))
+
+            def check_ai():
+                # Task AI tetap DONE walaupun sebagian gambar atau caption gagal, jadi
+                # hasil per aset dan caption ikut diperiksa
+                schedule = Schedule.objects.get(id=schedule_id)
+                if schedule.ai_status != 'DONE':
+                    return f"jadwal {schedule_id} ai_status={schedule.ai_status}"
+                failed = schedule.media_assets.filter(ai_edit_status='FAILED').count()
+                if failed:
+                    return f"jadwal {schedule_id}: {failed} gambar gagal diedit"
+                if not schedule.ai_generated_caption or schedule.ai_generated_caption.startswith('Error:'):
+                    return f"jadwal {schedule_id}: caption AI gagal"
+                return None
+
+            def check_scheduled():
+                # Pengiriman ke Upload Post juga eager, jadi jadwal harus sudah SCHEDULED
+                status = Schedule.objects.filter(id=schedule_id).values_list('status', flat=True).first()
+                return None if status == 'SCHEDULED' else f"jadwal {schedule_id} status={status}"
+
+            # Task AI berjalan eager di dalam request, jadi durasinya ikut terukur di langkah ini
+            if run_ai and not measure(
+                'run_ai', lambda: client.get(reverse('scheduler:run_ai_and_confirm', args=[schedule_id])), 200,
+                check=check_ai,
+            ):
+                return False
+            if not measure('confirm', lambda: client.post(
+                reverse('scheduler:process_confirmation', args=[schedule_id]),
+                {'confirm': '1', 'final_caption': 'Caption final benchmark'},
+            ), 302, check=check_scheduled):
+                return False
+            return bool(measure('list', lambda: client.get(reverse('scheduler:schedule_list')), 200))
+
+        def worker(user_index, user):
+            client = Client()
+            client.force_login(user)
+            try:
+                for iteration in range(options['iterations']):
+                    started = time.perf_counter()
+                    if flow(client, user_index, iteration):
+                        with lock:
+                            latencies['flow'].append(time.perf_counter() - started)
+                    else:
+                        with lock:
+                            errors['flow'] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i, user)) for i, user in enumerate(users)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors, time.perf_counter() - started
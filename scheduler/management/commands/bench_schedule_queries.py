@@ -0,0 +1,127 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from scheduler.models import Schedule
+
+BENCH_USER_PREFIX = 'bench_user_'
+
+# Penanda penggunaan index pada output EXPLAIN per database
+INDEX_MARKERS = {
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY'),
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mengisi tabel Schedule dengan data dummy (default 1 juta baris) lalu memeriksa "
+        "dengan EXPLAIN bahwa query daftar jadwal dan sinkronisasi memakai index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Jumlah jadwal dummy.')
+        parser.add_argument('--users', type=int, default=50, help='Jumlah user dummy.')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--skip-seed', action='store_true', help='Pakai data dummy yang sudah ada.')
+        parser.add_argument('--cleanup', action='store_true', help='Hapus data dummy setelah selesai.')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in INDEX_MARKERS:
+            raise CommandError(f"Database '{vendor}' tidak didukung oleh benchmark ini.")
+
+        if not options['skip_seed']:
+            self._seed(options['rows'], options['users'], options['batch_size'])
+
+        user = User.objects.filter(username__startswith=BENCH_USER_PREFIX).order_by('id').first()
+        if user is None:
+            raise CommandError("Tidak ada data dummy. Jalankan tanpa --skip-seed.")
+
+        # ANALYZE agar planner memiliki statistik terbaru
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        now = timezone.now()
+        queries = {
+            'schedule_list': (
+                Schedule.objects
+                .filter(user=user, schedule_time__gte=now)
+                .order_by('-schedule_time')
+            ),
+            'schedule_list_by_platform': (
+                Schedule.objects
+                .filter(user=user, platform='instagram', schedule_time__gte=now)
+                .order_by('-schedule_time', '-id')
+            ),
+            'user_schedules_with_job': (
+                Schedule.objects.filter(user=user, upload_job_id__gt='')
+            ),
+            'user_pending_schedules': (
+                Schedule.objects
+                .filter(user=user, status__in=['PENDING_APPROVAL', 'CONFIRMED'])
+                .order_by('schedule_time')
+            ),
+            'sync_past_schedules': Schedule.objects.filter(schedule_time__lt=now),
+            'sync_job_lookup': Schedule.objects.filter(upload_job_id__in=['job-1', 'job-2', 'job-3']),
+            'sync_schedules_with_job': Schedule.objects.filter(upload_job_id__gt='', updated_at__lt=now),
+        }
+
+        failures = []
+        markers = INDEX_MARKERS[vendor]
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            started = time.perf_counter()
+            list(queryset.values_list('id', flat=True)[:50])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            uses_index = any(marker in plan for marker in markers)
+            status = 'INDEX' if uses_index else 'NO INDEX'
+            self.stdout.write(f"{name:<26} {status:<9} {elapsed_ms:8.2f} ms")
+            self.stdout.write(f"    {plan.replace(chr(10), chr(10) + '    ')}")
+            if not uses_index:
+                failures.append(name)
+
+        if options['cleanup']:
+            self.stdout.write("Menghapus data dummy...")
+            User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+
+        if failures:
+            raise CommandError(f"Query tanpa index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f"Semua query memakai index ({vendor})."))
+
+    def _seed(self, rows, user_count, batch_size):
+        users = [
+            User.objects.get_or_create(username=f"{BENCH_USER_PREFIX}{i}")[0]
+            for i in range(user_count)
+        ]
+        existing = Schedule.objects.filter(user__in=users).count()
+        if existing >= rows:
+            self.stdout.write(f"Data dummy sudah ada ({existing} baris).")
+            return
+
+        self.stdout.write(f"Mengisi {rows - existing} jadwal dummy...")
+        now = timezone.now()
+        statuses = ['PENDING_APPROVAL', 'CONFIRMED', 'SCHEDULED', 'SCHEDULED', 'SCHEDULED']
+        created = existing
+        while created < rows:
+            batch = []
+            for i in range(min(batch_size, rows - created)):
+                status = random.choice(statuses)
+                batch.append(Schedule(
+                    user=random.choice(users),
+                    platform=random.choice(['instagram', 'tiktok', 'BOTH']),
+                    media_type=random.choice(['IMAGE', 'VIDEO']),
+                    content_type=random.choice(['STORIES', 'REELS', 'FEEDS']),
+                    schedule_time=now + timedelta(minutes=random.randint(-525_600, 525_600)),
+                    status=status,
+                    upload_job_id=f"job-{created + i}" if status == 'SCHEDULED' else None,
+                    is_uploaded=status == 'SCHEDULED',
+                ))
+            Schedule.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+            self.stdout.write(f"  {created}/{rows}")
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+import requests
+from django.core.management.base import BaseCommand
+
+from scheduler.fake_servers import FakeServer, FakeUploadPostHandler
+from scheduler.multipart import StreamingMultipartEncoder
+
+
+class Command(BaseCommand):
+    help = (
+        "Membandingkan puncak memori upload multipart lama (f.read()) dengan "
+        "upload streaming ke server Upload Post palsu lokal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=10, help='Jumlah file (mis. carousel 10 gambar).')
+        parser.add_argument('--size-mb', type=int, default=20, help='Ukuran setiap file dalam MB.')
+
+    def handle(self, *args, **options):
+        file_count = options['files']
+        size_bytes = options['size_mb'] * 1024 * 1024
+
+        with tempfile.TemporaryDirectory() as tmp_dir, FakeServer(FakeUploadPostHandler) as server:
+            paths = []
+            for i in range(file_count):
+                path = os.path.join(tmp_dir, f"media_{i}.bin")
+                with open(path, 'wb') as f:
+                    for _ in range(size_bytes // (1024 * 1024)):
+                        f.write(os.urandom(1024 * 1024))
+                paths.append(path)
+
+            url = f"{server.base_url}/upload_photos"
+            data = {'user': 'karenbot', 'platform[]': ['IG'], 'title': 'benchmark'}
+
+            results = [
+                ('buffered (f.read())', self._measure(self._buffered_upload, url, data, paths)),
+                ('streaming', self._measure(self._streaming_upload, url, data, paths)),
+            ]
+
+        total_mb = file_count * size_bytes / (1024 * 1024)
+        self.stdout.write(f"Payload: {file_count} file x {options['size_mb']} MB = {total_mb:.0f} MB")
+        for label, (peak, elapsed) in results:
+            self.stdout.write(f"{label:<22} peak memory: {peak / (1024 * 1024):8.1f} MB   waktu: {elapsed:6.2f} s")
+
+    def _measure(self, upload_func, url, data, paths):
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            response = upload_func(url, data, paths)
+            response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, elapsed
+
+    def _buffered_upload(self, url, data, paths):
+        files_payload = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                files_payload.append(('photos[]', (os.path.basename(path), f.read(), 'image/jpeg')))
+        return requests.post(url, data=data, files=files_payload)
+
+    def _streaming_upload(self, url, data, paths):
+        with ExitStack() as stack:
+            files_payload = [
+                ('photos[]', os.path.basename(path), stack.enter_context(open(path, 'rb')), 'image/jpeg')
+                for path in paths
+            ]
+            body = StreamingMultipartEncoder(list(data.items()), files_payload)
+            return requests.post(url, data=body, headers={'Content-Type': body.content_type})
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheduler.fake_servers import FakeOpenAIHandler, FakeServer, FakeUploadPostHandler
+
+
+class Command(BaseCommand):
+    help = (
+        "Menjalankan server Upload Post dan OpenAI palsu (latensi, error, dan rate limit buatan) "
+        "agar aplikasi bisa dijalankan dan di-benchmark tanpa memanggil API asli."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--upload-post-port', type=int, default=8001)
+        parser.add_argument('--openai-port', type=int, default=8002)
+        parser.add_argument('--upload-post-latency-ms', type=int, default=300, help='Latensi buatan Upload Post.')
+        parser.add_argument('--openai-latency-ms', type=int, default=2000, help='Latensi buatan OpenAI.')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraksi permintaan yang dijawab 500 (0..1).')
+        parser.add_argument(
+            '--rate-limit', type=int, default=0,
+            help='Permintaan per detik per server sebelum dijawab 429 (0 = tanpa batas).',
+        )
+
+    def handle(self, *args, **options):
+        faults = {'error_rate': options['error_rate'], 'rate_limit': options['rate_limit']}
+        upload_post = FakeServer(
+            type('UploadPostHandler', (FakeUploadPostHandler,), {'latency': options['upload_post_latency_ms'] / 1000, **faults}),
+            host=options['host'], port=options['upload_post_port'],
+        )
+        openai_server = FakeServer(
+            type('OpenAIHandler', (FakeOpenAIHandler,), {'latency': options['openai_latency_ms'] / 1000, **faults}),
+            host=options['host'], port=options['openai_port'],
+        )
+        with upload_post, openai_server:
+            self.stdout.write("Server palsu berjalan. Jalankan aplikasi dengan environment berikut:")
+            self.stdout.write(f"  UPLOAD_POST_BASE_URL={upload_post.base_url}/api")
+            self.stdout.write(f"  OPENAI_BASE_URL={openai_server.base_url}/v1")
+            self.stdout.write("Tekan Ctrl+C untuk berhenti.")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+            self.stdout.write(f"Upload Post: {dict(upload_post.httpd.request_counts)}")
+            self.stdout.write(f"OpenAI: {dict(openai_server.httpd.request_counts)}")
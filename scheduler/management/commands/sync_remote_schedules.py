@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheduler.sync_service import sync_remote_schedules
+
+
+class Command(BaseCommand):
+    help = "Sinkronisasi jadwal lokal dengan Upload Post API (sekali atau terus-menerus dengan --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Jalankan terus-menerus.')
+        parser.add_argument('--interval', type=int, default=300, help='Jeda antar sinkronisasi dalam detik (dengan --loop).')
+
+    def handle(self, *args, **options):
+        while True:
+            state = sync_remote_schedules()
+            if state:
+                self.stdout.write(
+                    f"Sinkronisasi selesai pada {state.last_synced_at}: "
+                    f"{state.last_remote_count} job remote, {state.last_deleted_count} jadwal dihapus."
+                )
+            else:
+                self.stderr.write("Sinkronisasi gagal atau dilewati.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
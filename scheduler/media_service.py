@@ -0,0 +1,221 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .blob_storage import (
+    blob_name, write_temp_blob, hash_file, commit_blob, commit_blobs, discard_temp, release_blob, discard_orphan_blobs,
+)
+from .models import MediaAsset, UploadSession
+
+logger = logging.getLogger(__name__)
+
+
+def write_media_files(files):
+    """
+    Menulis file upload ke file sementara di MEDIA_ROOT secara paralel (thread pool
+    berukuran MEDIA_INGEST_CONCURRENCY) sambil menghitung SHA-256 masing-masing.
+    Thread hanya menyentuh disk; pendaftaran blob ke database dilakukan pemanggil.
+    Jika satu file gagal, semua file sementara dihapus lalu error dilempar ulang.
+    Mengembalikan list (temp_path, sha256, size, filename) sesuai urutan `files`.
+    """
+    if not files:
+        return []
+
+    def write(uploaded_file):
+        return (*write_temp_blob(uploaded_file), uploaded_file.name)
+
+    with ThreadPoolExecutor(max_workers=min(settings.MEDIA_INGEST_CONCURRENCY, len(files))) as executor:
+        futures = [executor.submit(write, f) for f in files]
+
+    written = []
+    errors = []
+    for future in futures:
+        try:
+            written.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        for temp_path, *_ in written:
+            discard_temp(temp_path)
+        raise errors[0]
+    return written
+
+
+class UploadSessionUnavailable(Exception):
+    """Sesi upload sudah dipakai jadwal lain atau dihapus sebelum jadwal disimpan."""
+
+
+def _lock_upload_sessions(uploads):
+    """
+    Mengunci baris UploadSession yang sudah selesai dan mengembalikan nama blob-nya
+    sesuai urutan `uploads`. Harus dipanggil di dalam transaksi.
+    """
+    if not uploads:
+        return []
+    files = dict(
+        UploadSession.objects.select_for_update()
+        .filter(pk__in=[upload.pk for upload in uploads], completed_at__isnull=False)
+        .values_list('pk', 'file')
+    )
+    if len(files) != len({upload.pk for upload in uploads}):
+        raise UploadSessionUnavailable('Sebagian upload sudah dipakai atau tidak ditemukan. Silakan unggah ulang.')
+    return [files[upload.pk] for upload in uploads]
+
+
+def create_schedule_with_media(schedule, files, uploads=()):
+    """
+    Menyimpan jadwal beserta semua aset medianya. File ditulis ke disk (dan di-hash)
+    secara paralel sebelum transaksi dibuka, sehingga I/O besar tidak menahan lock
+    tulis database. Di dalam satu transaksi hanya blob didaftarkan (file dengan isi
+    yang sama dipakai ulang) dan semua MediaAsset dibuat dengan satu bulk INSERT.
+    Jika ada langkah yang gagal, transaksi di-rollback dan file sementara serta file
+    blob baru yang tidak lagi direferensikan dihapus sehingga tidak ada file yatim.
+
+    `uploads` adalah UploadSession yang sudah selesai; referensi blob-nya
+    dipindahkan ke MediaAsset, lalu sesinya dihapus. Sesi dikunci (select_for_update)
+    di dalam transaksi; jika salah satunya sudah dipakai request lain (mis. form
+    dikirim dua kali), UploadSessionUnavailable dilempar dan tidak ada yang disimpan.
+    """
+    written = write_media_files(files)
+    try:
+        with transaction.atomic():
+            upload_names = _lock_upload_sessions(uploads)
+            schedule.save()
+            names = commit_blobs(written) + upload_names
+            MediaAsset.objects.bulk_create([
+                MediaAsset(schedule=schedule, file=name, order=i)
+                for i, name in enumerate(names)
+            ])
+            UploadSession.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()
+    except Exception:
+        for temp_path, *_ in written:
+            discard_temp(temp_path)
+        # Blob baru yang sudah dipindahkan tetapi barisnya ikut di-rollback
+        discard_orphan_blobs([
+            blob_name(sha256, os.path.splitext(filename)[1]) for _, sha256, _, filename in written
+        ])
+        raise
+    return schedule
+
+
+# --- Upload bertahap (chunked/resumable) ---
+
+class UploadOffsetMismatch(Exception):
+    """Offset chunk dari klien tidak sama dengan offset yang sudah diterima server."""
+
+    def __init__(self, expected):
+        super().__init__(f"Offset yang diharapkan: {expected}")
+        self.expected = expected
+
+
+def partial_upload_path(upload):
+    """Lokasi file parsial; berada di MEDIA_ROOT agar rename akhir tetap satu filesystem."""
+    return os.path.join(settings.MEDIA_ROOT, 'media', '.partial', str(upload.pk))
+
+
+def create_upload_session(user, filename, size, content_type=''):
+    """Membuat sesi upload baru beserta file parsial kosongnya."""
+    upload = UploadSession.objects.create(
+        user=user, filename=os.path.basename(filename)[:255], size=size, content_type=content_type[:100],
+    )
+    path = partial_upload_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return upload
+
+
+def append_upload_chunk(upload, offset, stream, length, chunk_size=64 * 1024):
+    """
+    Menulis satu chunk dari `stream` ke file parsial mulai dari `offset`.
+    Data dibaca per `chunk_size` byte sehingga memori per request tetap kecil.
+    Byte yang sempat diterima tetap dicatat walaupun koneksi terputus di tengah,
+    sehingga klien bisa melanjutkan dari offset terakhir.
+
+    Tidak ada transaksi yang terbuka selama chunk dibaca dan ditulis. Offset baru
+    disimpan dengan UPDATE bersyarat (WHERE offset = `offset`): dari PATCH paralel
+    untuk offset yang sama hanya satu yang berhasil, yang lain mendapat
+    UploadOffsetMismatch. `upload` diperbarui dengan offset terbaru dari database.
+    """
+    current = UploadSession.objects.filter(pk=upload.pk).values('offset', 'completed_at').get()
+    upload.offset, upload.completed_at = current['offset'], current['completed_at']
+    if offset != upload.offset or upload.completed_at:
+        raise UploadOffsetMismatch(upload.offset)
+    length = min(length, upload.size - offset)
+    path = partial_upload_path(upload)
+    written = 0
+    try:
+        # File tidak dipotong: offset di database yang menentukan byte mana yang sah,
+        # dan panjang chunk dibatasi sampai `size` sehingga file tidak pernah lebih panjang
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                data = stream.read(min(chunk_size, length - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+    finally:
+        claimed = UploadSession.objects.filter(pk=upload.pk, offset=offset, completed_at__isnull=True).update(
+            offset=offset + written, updated_at=timezone.now(),
+        )
+        if claimed:
+            upload.offset = offset + written
+            if written:
+                logger.info(f"Upload {upload.pk}: chunk {written} byte, progres {upload.offset}/{upload.size}")
+    if not claimed:
+        # Request lain sudah memajukan offset lebih dulu
+        upload.refresh_from_db(fields=['offset', 'completed_at'])
+        raise UploadOffsetMismatch(upload.offset)
+
+    if upload.offset >= upload.size:
+        finalize_upload(upload)
+    return upload
+
+
+def finalize_upload(upload):
+    """
+    Mendaftarkan file parsial sebagai blob: di-hash (dibaca sekali, di luar transaksi)
+    lalu dipindahkan ke lokasi akhir dengan satu rename atomik. Sesi upload memegang
+    satu referensi blob; jika sesi sudah diselesaikan request lain, referensi ini dilepas.
+    """
+    path = partial_upload_path(upload)
+    sha256, size = hash_file(path)
+    name = commit_blob(path, sha256, size, upload.filename)
+    completed_at = timezone.now()
+    updated = UploadSession.objects.filter(pk=upload.pk, completed_at__isnull=True).update(
+        file=name, completed_at=completed_at, updated_at=completed_at,
+    )
+    if not updated:
+        release_blob(name)
+        upload.refresh_from_db()
+        return upload
+    upload.file.name = name
+    upload.completed_at = completed_at
+    logger.info(f"Upload {upload.pk} selesai: {upload.file.name} ({upload.size} byte)")
+    return upload
+
+
+def discard_upload(upload):
+    """Menghapus sesi upload beserta file parsialnya dan melepas referensi blob-nya."""
+    path = partial_upload_path(upload)
+    if os.path.isfile(path):
+        os.remove(path)
+    with transaction.atomic():
+        if upload.file:
+            release_blob(upload.file.name)
+        upload.delete()
+
+
+def purge_stale_uploads(max_age=None):
+    """Menghapus sesi upload yang tidak pernah dipakai/selesai dalam UPLOAD_SESSION_TTL detik."""
+    max_age = settings.UPLOAD_SESSION_TTL if max_age is None else max_age
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for upload in stale:
+        discard_upload(upload)
+    if stale:
+        logger.info(f"Menghapus {len(stale)} sesi upload kedaluwarsa.")
+    return len(stale)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0013_alter_schedule_platform'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='ai_status',
+            field=models.CharField(choices=[('NOT_REQUESTED', 'Not Requested'), ('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='NOT_REQUESTED', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='ai_task_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
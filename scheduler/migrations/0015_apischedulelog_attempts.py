@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0014_schedule_ai_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apischedulelog',
+            name='attempt',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='apischedulelog',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='apischedulelog',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='apischedulelog',
+            name='response_code',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='apischedulelog',
+            name='job_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='apischedulelog',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SUCCESS', 'Success'), ('RETRYING', 'Retrying'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='schedule',
+            name='status',
+            field=models.CharField(choices=[('PENDING_APPROVAL', 'Pending Preview'), ('CONFIRMED', 'Confirmed & Processing'), ('SCHEDULED', 'Scheduled'), ('FAILED', 'Upload Failed')], default='PENDING_APPROVAL', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0017_airesultcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='ai_edit_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='mediaasset',
+            name='ai_edit_status',
+            field=models.CharField(choices=[('NOT_REQUESTED', 'Not Requested'), ('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='NOT_REQUESTED', max_length=20),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0018_mediaasset_ai_edit_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['user', 'schedule_time'], name='schedule_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['user', 'upload_job_id'], name='schedule_user_job_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['schedule_time'], name='schedule_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(condition=models.Q(('upload_job_id__gt', '')), fields=['upload_job_id'], name='schedule_job_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(condition=models.Q(('status__in', ['PENDING_APPROVAL', 'CONFIRMED'])), fields=['user', 'schedule_time'], name='schedule_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0019_schedule_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['user', 'platform', 'schedule_time', 'id'], name='schedule_user_platform_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['user', 'status', 'schedule_time', 'id'], name='schedule_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['user', 'content_type', 'schedule_time', 'id'], name='schedule_user_ctype_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0022_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='preview',
+            field=models.FileField(blank=True, upload_to='renditions/'),
+        ),
+        migrations.AddField(
+            model_name='mediaasset',
+            name='renditions_source',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='mediaasset',
+            name='thumbnail',
+            field=models.FileField(blank=True, upload_to='renditions/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0024_aicachecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='ai_status_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,10 @@
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import os
+import uuid
 
 class Schedule(models.Model):
     PLATFORM_CHOICES = [
@@ -17,6 +21,13 @@ class Schedule(models.Model):
         ('REELS', 'Reels'),
         ('FEEDS', 'Feeds'), # Menggantikan 'IMAGES' untuk post gambar (single/carousel)
     ]
+    AI_STATUS_CHOICES = [
+        ('NOT_REQUESTED', 'Not Requested'),
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     platform = models.CharField(max_length=10, choices=PLATFORM_CHOICES)
@@ -34,12 +45,56 @@ class Schedule(models.Model):
         ('PENDING_APPROVAL', 'Pending Preview'), # Mengganti label agar lebih jelas
         ('CONFIRMED', 'Confirmed & Processing'),
         ('SCHEDULED', 'Scheduled'),
+        ('FAILED', 'Upload Failed'),
     ], default='PENDING_APPROVAL')
     upload_job_id = models.CharField(max_length=255, blank=True, null=True)
     is_uploaded = models.BooleanField(default=False)
 
+    # Status pemrosesan AI di background (Celery)
+    ai_status = models.CharField(max_length=20, choices=AI_STATUS_CHOICES, default='NOT_REQUESTED')
+    ai_task_id = models.CharField(max_length=255, blank=True, null=True)
+    # Diisi setiap kali ai_status berubah (.update() tidak memperbarui updated_at)
+    ai_status_updated_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Daftar jadwal per user, diurutkan berdasarkan waktu
+            models.Index(fields=['user', 'schedule_time'], name='schedule_user_time_idx'),
+            # Jadwal per user yang sudah memiliki job ID di Upload Post
+            models.Index(fields=['user', 'upload_job_id'], name='schedule_user_job_idx'),
+            # Pembersihan jadwal lewat waktu oleh sinkronisasi background
+            models.Index(fields=['schedule_time'], name='schedule_time_idx'),
+            # Rekonsiliasi job ID dengan Upload Post (hanya baris yang punya job ID)
+            models.Index(fields=['upload_job_id'], name='schedule_job_idx', condition=models.Q(upload_job_id__gt='')),
+            # Filter daftar jadwal per platform/status/content type dengan keyset pagination
+            models.Index(fields=['user', 'platform', 'schedule_time', 'id'], name='schedule_user_platform_idx'),
+            models.Index(fields=['user', 'status', 'schedule_time', 'id'], name='schedule_user_status_idx'),
+            models.Index(fields=['user', 'content_type', 'schedule_time', 'id'], name='schedule_user_ctype_idx'),
+            # Jadwal yang masih menunggu (preview atau sedang dikirim)
+            models.Index(
+                fields=['user', 'schedule_time'],
+                name='schedule_pending_idx',
+                condition=models.Q(status__in=['PENDING_APPROVAL', 'CONFIRMED']),
+            ),
+        ]
+
+    @staticmethod
+    def ai_stale_cutoff():
+        """Status QUEUED/RUNNING yang tidak berubah sejak waktu ini dianggap macet (broker/worker mati)."""
+        return timezone.now() - timedelta(seconds=settings.AI_TASK_STALE_AFTER)
+
+    @property
+    def ai_in_progress(self):
+        if self.ai_status not in ('QUEUED', 'RUNNING'):
+            return False
+        return self.ai_status_updated_at is not None and self.ai_status_updated_at >= self.ai_stale_cutoff()
+
     def get_primary_media_asset(self):
         """Mengambil aset media pertama, berguna untuk thumbnail atau single post."""
+        # Gunakan hasil prefetch `primary_media_assets` (lihat views._schedule_list_queryset) jika tersedia
+        if hasattr(self, 'primary_media_assets'):
+            return self.primary_media_assets[0] if self.primary_media_assets else None
         return self.media_assets.first()
 
     def __str__(self):
@@ -53,28 +108,170 @@ class MediaAsset(models.Model):
     edited_file = models.FileField(upload_to='media/edited/', blank=True, null=True) # Untuk menyimpan hasil AI edit
     order = models.PositiveIntegerField(default=0)
 
+    # Progres AI edit per aset (dijalankan paralel untuk semua gambar carousel)
+    AI_EDIT_STATUS_CHOICES = [
+        ('NOT_REQUESTED', 'Not Requested'),
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    ai_edit_status = models.CharField(max_length=20, choices=AI_EDIT_STATUS_CHOICES, default='NOT_REQUESTED')
+    ai_edit_error = models.TextField(blank=True)
+
+    # Rendition WebP untuk tampilan (lihat renditions.py); renditions_source adalah nama file
+    # sumbernya, sehingga rendition dianggap basi saat edited_file berubah
+    thumbnail = models.FileField(upload_to='renditions/', blank=True)
+    preview = models.FileField(upload_to='renditions/', blank=True)
+    renditions_source = models.CharField(max_length=255, blank=True)
+
     class Meta:
         ordering = ['order']
 
     def __str__(self):
         return f"Media for Schedule ID: {self.schedule.id} - {os.path.basename(self.file.name)}"
 
-    def delete(self, *args, **kwargs):
-        # Hapus file fisik saat objek MediaAsset dihapus
-        if self.file and os.path.isfile(self.file.path):
-            os.remove(self.file.path)
-        if self.edited_file and os.path.isfile(self.edited_file.path):
-            os.remove(self.edited_file.path)
-        super().delete(*args, **kwargs)
+    @property
+    def display_file(self):
+        """File yang ditampilkan dan dikirim: hasil edit AI jika ada, selain itu file asli."""
+        return self.edited_file if self.edited_file else self.file
+
+    def _rendition_url(self, field_name):
+        rendition = getattr(self, field_name)
+        if rendition and self.renditions_source == self.display_file.name:
+            return rendition.url
+        # Rendition belum dibuat atau basi: gunakan file penuh
+        return self.display_file.url
+
+    @property
+    def thumbnail_url(self):
+        return self._rendition_url('thumbnail')
+
+    @property
+    def preview_url(self):
+        return self._rendition_url('preview')
+
+    @property
+    def original_preview_url(self):
+        """Preview gambar asli (untuk perbandingan dengan hasil edit), atau file asli jika belum ada."""
+        from .renditions import original_preview_name  # renditions.py mengimpor modul ini
+        if not self.edited_file:
+            return self.preview_url
+        name = original_preview_name(self)
+        return self.file.storage.url(name) if name else self.file.url
+
+    # File fisik dilepas lewat sinyal post_delete (lihat signals.py) agar juga berlaku
+    # saat MediaAsset terhapus karena cascade atau queryset.delete().
+
+
+class MediaBlob(models.Model):
+    """
+    File media yang disimpan berdasarkan hash isi (content-addressed) di blobs/ab/cd/<sha256>.<ext>.
+    Satu file fisik dipakai bersama oleh semua referensi (MediaAsset, hasil AI, sesi upload)
+    dan baru dihapus saat ref_count mencapai nol.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} ref)"
 
 
 class ApiScheduleLog(models.Model):
+    """Catatan setiap percobaan pengiriman jadwal ke Upload Post API."""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SUCCESS', 'Success'),
+        ('RETRYING', 'Retrying'),
+        ('FAILED', 'Failed'),
+    ]
+
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='api_logs')
-    job_id = models.CharField(max_length=255)
+    job_id = models.CharField(max_length=255, blank=True)
     schedule_time = models.DateTimeField()
     platform = models.CharField(max_length=10)
-    status = models.CharField(max_length=20, default='PENDING')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempt = models.PositiveIntegerField(default=1)
+    latency_ms = models.PositiveIntegerField(blank=True, null=True)
+    response_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Log for Job ID: {self.job_id}"
+
+
+class UploadSession(models.Model):
+    """
+    Sesi upload bertahap (chunked/resumable) untuk file besar seperti video.
+    Potongan file ditulis langsung ke file parsial di MEDIA_ROOT, lalu di-rename
+    secara atomik ke lokasi akhir saat semua byte sudah diterima.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Nama file di storage setelah upload selesai
+    file = models.FileField(upload_to='media/', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.offset}/{self.size})"
+
+
+class SyncState(models.Model):
+    """Watermark sinkronisasi background dengan layanan eksternal (mis. Upload Post)."""
+    name = models.CharField(max_length=50, unique=True)
+    last_synced_at = models.DateTimeField(blank=True, null=True)
+    last_remote_count = models.PositiveIntegerField(default=0)
+    last_deleted_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sync {self.name} at {self.last_synced_at}"
+
+
+class AIResultCache(models.Model):
+    """
+    Cache hasil AI (gambar editan atau caption) berdasarkan hash isi media,
+    prompt, dan model. Dipakai ulang saat gambar dan prompt yang sama diproses lagi.
+    """
+    KIND_CHOICES = [
+        ('EDIT', 'AI Edit'),
+        ('CAPTION', 'AI Caption'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    media_hash = models.CharField(max_length=64, db_index=True)
+    model = models.CharField(max_length=50)
+    caption = models.TextField(blank=True)
+    result_file = models.CharField(max_length=255, blank=True) # Nama file di storage untuk hasil edit
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} cache {self.media_hash[:12]} ({self.model})"
+
+
+class AICacheCounter(models.Model):
+    """
+    Penghitung hit/miss cache hasil AI. Disimpan di database (bukan cache Django)
+    agar lookup dari worker Celery terlihat di endpoint statistik pada proses web.
+    """
+    name = models.CharField(max_length=20, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,79 @@
+import os
+import uuid
+
+
+class StreamingMultipartEncoder:
+    """
+    Body multipart/form-data yang dibaca secara bertahap (streaming).
+
+    File tidak pernah dibaca seluruhnya ke memori: isi file dikirim per chunk
+    langsung dari file handle. Karena panjang body dihitung di depan (__len__),
+    `requests` akan mengirim header Content-Length dan menggunakan objek ini
+    sebagai iterator body, sehingga pemakaian memori tetap konstan berapapun
+    ukuran media.
+
+    `fields` adalah list (nama, nilai); nilai berupa list akan dikirim berulang
+    dengan nama yang sama (mis. 'platform[]').
+    `files` adalah list (nama_field, nama_file, file_handle, content_type).
+    """
+
+    def __init__(self, fields, files, chunk_size=64 * 1024):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.fields = []
+        for name, value in fields:
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for v in values:
+                self.fields.append((name, str(v)))
+        self.files = files
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _field_part(self, name, value):
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        ).encode('utf-8')
+
+    def _file_header(self, name, filename, content_type):
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{os.path.basename(filename)}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8')
+
+    def _closing(self):
+        return f"--{self.boundary}--\r\n".encode('utf-8')
+
+    @staticmethod
+    def _file_size(fileobj):
+        size = getattr(fileobj, 'size', None)
+        if size is not None:
+            return size
+        return os.fstat(fileobj.fileno()).st_size
+
+    def __len__(self):
+        length = sum(len(self._field_part(name, value)) for name, value in self.fields)
+        for name, filename, fileobj, content_type in self.files:
+            length += len(self._file_header(name, filename, content_type))
+            length += self._file_size(fileobj) + len(b"\r\n")
+        return length + len(self._closing())
+
+    def __iter__(self):
+        for name, value in self.fields:
+            yield self._field_part(name, value)
+        for name, filename, fileobj, content_type in self.files:
+            yield self._file_header(name, filename, content_type)
+            fileobj.seek(0)
+            while True:
+                chunk = fileobj.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            yield b"\r\n"
+        yield self._closing()
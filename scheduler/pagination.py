@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(schedule):
+    """Cursor berisi posisi (schedule_time, id) baris terakhir di halaman."""
+    raw = json.dumps([schedule.schedule_time.isoformat(), schedule.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Mengembalikan (schedule_time, id) dari cursor. Melempar ValueError jika tidak valid."""
+    try:
+        schedule_time, schedule_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(schedule_time), int(schedule_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Cursor tidak valid: {cursor}") from e
+
+
+def parse_page_size(value):
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Pagination keyset (cursor) dengan urutan (-schedule_time, -id).
+
+    Berbeda dengan OFFSET, setiap halaman dimulai langsung dari posisi cursor
+    di index, sehingga waktu per halaman tetap konstan berapa pun ukuran tabel.
+    Mengembalikan (list baris, cursor halaman berikutnya atau None).
+    """
+    queryset = queryset.order_by('-schedule_time', '-id')
+    if cursor:
+        schedule_time, schedule_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(schedule_time__lt=schedule_time) | Q(schedule_time=schedule_time, id__lt=schedule_id)
+        )
+
+    # Ambil satu baris ekstra untuk mengetahui apakah masih ada halaman berikutnya
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
@@ -0,0 +1,201 @@
+"""
+Rate limiter sisi client (token bucket) untuk panggilan ke OpenAI dan Upload Post.
+
+Setiap budget (mis. 'openai:gpt-image-1', 'upload_post:upload') punya laju
+permintaan per menit dari settings.RATE_LIMITS. Jika CACHE_URL menunjuk ke Redis,
+bucket disimpan di Redis dan diperbarui atomik dengan skrip Lua sehingga semua
+worker web dan Celery berbagi budget yang sama; tanpa Redis, bucket per proses.
+
+Pemanggil memesan token lalu menunggu giliran (reservasi), sehingga permintaan
+tersebar merata alih-alih berebut dan ditolak upstream. Jika upstream tetap
+menjawab 429, bucket dikosongkan selama Retry-After untuk semua proses, lalu
+permintaan dicoba ulang dengan jitter.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Kapasitas bucket = laju x BURST_SECONDS: berapa banyak permintaan boleh dikirim sekaligus
+BURST_SECONDS = 6
+# Backoff jika 429 tanpa Retry-After: BASE * 2^(percobaan-1), dibatasi MAX
+RETRY_BACKOFF_BASE = 1
+RETRY_BACKOFF_MAX = 60
+KEY_PREFIX = 'ratelimit'
+
+# Isi bucket diisi ulang sesuai waktu yang berlalu, dikurangi `cost`; boleh negatif
+# (reservasi). `pause` > 0 mengosongkan bucket selama `pause` detik (Retry-After).
+# Mengembalikan lama menunggu (detik) sebagai string agar pecahan tidak terpotong.
+_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local pause = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+if pause > 0 then
+    tokens = math.min(tokens, -pause * rate)
+end
+tokens = tokens - cost
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 60)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+
+class RateLimited(Exception):
+    """
+    Upstream menjawab 429. `retry_after` (detik, bisa None) diambil dari header
+    Retry-After; `result` menyimpan respons terakhir untuk pemanggil yang tidak
+    memakai exception (mis. UploadPostClient.request).
+    """
+
+    def __init__(self, retry_after=None, result=None):
+        super().__init__(f"Rate limit upstream (Retry-After: {retry_after})")
+        self.retry_after = retry_after
+        self.result = result
+
+
+def parse_retry_after(value):
+    """Nilai header Retry-After (detik atau HTTP-date) dalam detik, atau None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class _LocalBuckets:
+    """Bucket per proses (fallback tanpa Redis), algoritma sama dengan skrip Lua."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def reserve(self, key, rate, capacity, cost, pause):
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+            if pause > 0:
+                tokens = min(tokens, -pause * rate)
+            tokens -= cost
+            self._buckets[key] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+
+_local = _LocalBuckets()
+_redis_script = None
+_redis_lock = threading.Lock()
+
+
+def _get_redis_script():
+    global _redis_script
+    if _redis_script is None and settings.CACHE_URL:
+        with _redis_lock:
+            if _redis_script is None:
+                import redis
+                _redis_script = redis.Redis.from_url(settings.CACHE_URL).register_script(_RESERVE_SCRIPT)
+    return _redis_script
+
+
+@receiver(setting_changed)
+def _reset_redis(setting, **kwargs):
+    global _redis_script
+    if setting == 'CACHE_URL':
+        _redis_script = None
+
+
+def _reserve(budget, cost=1, pause=0.0):
+    """Memesan `cost` token dari budget dan mengembalikan lama menunggu (detik)."""
+    per_minute = settings.RATE_LIMITS.get(budget)
+    if not per_minute:
+        return 0.0
+    rate = per_minute / 60
+    capacity = max(1.0, rate * BURST_SECONDS)
+    key = f"{KEY_PREFIX}:{budget}"
+    script = _get_redis_script()
+    if script is not None:
+        try:
+            return float(script(keys=[key], args=[rate, capacity, cost, pause]))
+        except Exception as e:
+            logger.warning(f"Rate limiter Redis tidak tersedia, memakai bucket lokal. Error: {e}")
+    return _local.reserve(key, rate, capacity, cost, pause)
+
+
+def acquire(budget):
+    """Menunggu sampai budget mengizinkan satu permintaan."""
+    wait = _reserve(budget)
+    if wait > 0:
+        logger.info(f"Rate limit {budget}: menunggu {wait:.2f} detik")
+        time.sleep(wait)
+
+
+async def aacquire(budget):
+    """Versi async acquire; menunggu tanpa memblokir event loop."""
+    wait = _reserve(budget)
+    if wait > 0:
+        logger.info(f"Rate limit {budget}: menunggu {wait:.2f} detik")
+        await asyncio.sleep(wait)
+
+
+def _backoff(budget, error, attempt):
+    """Mengosongkan bucket selama Retry-After (untuk semua proses) dan mengembalikan jitter."""
+    delay = error.retry_after
+    if delay is None:
+        delay = min(RETRY_BACKOFF_BASE * 2 ** (attempt - 1), RETRY_BACKOFF_MAX)
+    _reserve(budget, cost=0, pause=delay)
+    logger.warning(f"Upstream {budget} menjawab 429 (percobaan {attempt}); jeda {delay:.1f} detik")
+    # Jitter agar pemanggil yang tertahan bersamaan tidak kembali serentak
+    return random.uniform(0, max(delay, RETRY_BACKOFF_BASE) / 2)
+
+
+def call(budget, func, max_attempts=None):
+    """
+    Menjalankan `func()` dalam budget. `func` melempar RateLimited untuk 429;
+    permintaan dicoba ulang sampai `max_attempts` (default RATE_LIMIT_MAX_RETRIES + 1)
+    lalu RateLimited terakhir diteruskan ke pemanggil.
+    """
+    max_attempts = max_attempts or settings.RATE_LIMIT_MAX_RETRIES + 1
+    for attempt in range(1, max_attempts + 1):
+        acquire(budget)
+        try:
+            return func()
+        except RateLimited as e:
+            if attempt == max_attempts:
+                raise
+            time.sleep(_backoff(budget, e, attempt))
+
+
+async def acall(budget, func, max_attempts=None):
+    """Versi async call; `func` mengembalikan awaitable."""
+    max_attempts = max_attempts or settings.RATE_LIMIT_MAX_RETRIES + 1
+    for attempt in range(1, max_attempts + 1):
+        await aacquire(budget)
+        try:
+            return await func()
+        except RateLimited as e:
+            if attempt == max_attempts:
+                raise
+            await asyncio.sleep(_backoff(budget, e, attempt))
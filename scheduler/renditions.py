@@ -0,0 +1,79 @@
+import glob
+import logging
+import os
+import uuid
+from django.core.files.storage import default_storage
+from .blob_storage import sha256_from_name
+from .image_processing import RENDITION_SPECS, make_rendition
+from .models import MediaAsset
+from . import ai_cache
+
+logger = logging.getLogger(__name__)
+
+RENDITION_PREFIX = 'renditions/'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff', '.heic'}
+
+
+def is_image(name):
+    return os.path.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+
+def rendition_name(source_hash, kind):
+    """Rendition dikunci dengan hash isi sumber, sehingga dipakai bersama oleh file yang identik."""
+    return f"{RENDITION_PREFIX}{source_hash[:2]}/{source_hash}_{kind}.webp"
+
+
+def ensure_rendition(source_name, kind):
+    """Membuat rendition untuk file sumber jika belum ada. Mengembalikan nama rendition."""
+    source_hash = sha256_from_name(source_name) or ai_cache.file_sha256(default_storage.path(source_name))
+    name = rendition_name(source_hash, kind)
+    final_path = default_storage.path(name)
+    if os.path.exists(final_path):
+        return name
+
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    # Tulis ke file sementara lalu rename, agar halaman tidak pernah membaca file setengah jadi
+    temp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(make_rendition(default_storage.path(source_name), kind).getbuffer())
+    os.replace(temp_path, final_path)
+    logger.info(f"Rendition {kind} dibuat: {name} ({os.path.getsize(final_path)} byte)")
+    return name
+
+
+def generate_renditions(asset):
+    """
+    Membuat thumbnail dan preview WebP untuk file yang ditampilkan aset (hasil edit jika ada,
+    selain itu file asli) lalu menyimpannya di MediaAsset. `renditions_source` mencatat file
+    sumbernya, sehingga rendition otomatis dianggap basi saat edited_file berubah.
+    Mengembalikan False untuk media yang bukan gambar.
+    """
+    source = asset.display_file
+    if not source or not is_image(source.name):
+        return False
+    names = {kind: ensure_rendition(source.name, kind) for kind in RENDITION_SPECS}
+    if asset.edited_file and is_image(asset.file.name):
+        # Preview gambar asli untuk perbandingan sebelum/sesudah edit
+        ensure_rendition(asset.file.name, 'preview')
+    MediaAsset.objects.filter(pk=asset.pk).update(
+        thumbnail=names['thumbnail'],
+        preview=names['preview'],
+        renditions_source=source.name,
+    )
+    return True
+
+
+def original_preview_name(asset):
+    """Nama preview gambar asli jika sudah dibuat (hanya untuk file blob), selain itu None."""
+    source_hash = sha256_from_name(asset.file.name)
+    if not source_hash:
+        return None
+    name = rendition_name(source_hash, 'preview')
+    return name if default_storage.exists(name) else None
+
+
+def delete_renditions(source_hash):
+    """Menghapus semua rendition milik sebuah hash (dipanggil saat blob sumbernya dihapus)."""
+    pattern = default_storage.path(rendition_name(source_hash, '*'))
+    for path in glob.glob(pattern):
+        os.remove(path)
@@ -21,6 +21,8 @@ class AIEditResponse(BaseModel):
 
 class AICaptionPayload(BaseModel):
     media_file_path: str
+    # Gambar lain dalam carousel yang ikut dianalisis untuk satu caption
+    additional_media_file_paths: list[str] = []
 
 class AICaptionResponse(BaseModel):
     caption: str
@@ -0,0 +1,34 @@
+from celery.signals import task_postrun
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from . import instrumentation
+from .blob_storage import release_blob, sha256_from_name
+from .models import MediaAsset, AIResultCache
+
+
+@receiver(post_delete, sender=MediaAsset)
+def release_media_asset_files(sender, instance, **kwargs):
+    # Berlaku juga untuk cascade dari Schedule, yang tidak memanggil MediaAsset.delete()
+    release_blob(instance.file.name)
+    release_blob(instance.edited_file.name if instance.edited_file else '')
+
+
+@receiver(post_delete, sender=AIResultCache)
+def release_ai_result_file(sender, instance, **kwargs):
+    # Entri cache lama (sebelum blob) menunjuk file milik MediaAsset; jangan dihapus
+    if sha256_from_name(instance.result_file):
+        release_blob(instance.result_file)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Berlaku untuk semua query koneksi ini, termasuk yang dijalankan di thread sync_to_async
+    if instrumentation.query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(instrumentation.query_timer)
+
+
+@task_postrun.connect
+def flush_task_metrics(**kwargs):
+    # Worker Celery bisa lama menganggur; kirim metrik setiap task selesai
+    instrumentation.flush()
@@ -0,0 +1,141 @@
+"""
+Single-flight: panggilan identik yang berjalan bersamaan (antar thread, proses, atau
+worker jika cache-nya Redis) digabung menjadi satu panggilan ke layanan eksternal.
+Pemanggil pertama memegang lock di cache dan menjalankan fungsi; pemanggil lain
+menunggu lalu memakai hasil (atau exception) yang sama.
+"""
+import functools
+import hashlib
+import logging
+import pickle
+import time
+import uuid
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'singleflight'
+DEFAULT_LOCK_TIMEOUT = 60
+# Hasil disimpan sebentar, cukup untuk dibaca pemanggil yang sedang menunggu
+RESULT_TTL = 60
+WAIT_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+class SingleFlightTimeout(Exception):
+    """Pemanggil yang menunggu tidak menerima hasil sebelum batas waktu."""
+
+
+class SingleFlightError(Exception):
+    """Panggilan pemimpin gagal dengan exception yang tidak bisa dibagikan lewat cache."""
+
+
+def make_key(operation, *parts):
+    """Key untuk operasi + argumennya; argumen di-hash agar panjang key tetap."""
+    digest = hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+    return f"{operation}:{digest}"
+
+
+def _lock_key(key):
+    return f"{KEY_PREFIX}:{key}:lock"
+
+
+def _result_key(key, token):
+    return f"{KEY_PREFIX}:{key}:result:{token}"
+
+
+def in_flight(key):
+    """True jika ada pemanggil yang sedang menjalankan operasi dengan key ini."""
+    return cache.get(_lock_key(key)) is not None
+
+
+def _lead(key, token, func):
+    lock_key = _lock_key(key)
+    try:
+        value = func()
+    except Exception as e:
+        _publish(key, token, (False, _shareable_error(e)))
+        raise
+    else:
+        _publish(key, token, (True, value))
+        return value
+    finally:
+        # Hapus lock hanya jika masih milik kita (bisa kedaluwarsa lalu diambil pemanggil lain)
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _shareable_error(error):
+    # Sebagian exception (mis. error client HTTP) tidak bisa dibuat ulang dari pickle
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return SingleFlightError(f"{type(error).__name__}: {error}")
+    return error
+
+
+def _publish(key, token, outcome):
+    try:
+        cache.set(_result_key(key, token), outcome, timeout=RESULT_TTL)
+    except Exception as e:
+        # Hasil tidak bisa di-pickle: pemanggil lain akan menjalankan operasinya sendiri
+        logger.warning(f"Single-flight {key}: hasil tidak bisa dibagikan. Error: {e}")
+
+
+def _wait_for(key, leader_token, deadline):
+    lock_key = _lock_key(key)
+    result_key = _result_key(key, leader_token)
+    while time.monotonic() < deadline:
+        outcome = cache.get(result_key, _MISSING)
+        if outcome is not _MISSING:
+            return outcome
+        if cache.get(lock_key) != leader_token:
+            # Pemimpin selesai; hasil ditulis sebelum lock dilepas
+            return cache.get(result_key, _MISSING)
+        time.sleep(WAIT_INTERVAL)
+    return _MISSING
+
+
+def do(key, func, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+    """
+    Menjalankan `func()` sekali untuk semua pemanggil bersamaan dengan `key` yang sama.
+    `lock_timeout` (detik) sebaiknya lebih lama dari durasi terlama `func`; pemanggil
+    yang menunggu lebih lama dari itu mendapat SingleFlightTimeout.
+    Jika pemimpin berhenti tanpa hasil, salah satu pemanggil yang menunggu mengambil alih.
+    """
+    deadline = time.monotonic() + lock_timeout
+    token = uuid.uuid4().hex
+    while True:
+        if cache.add(_lock_key(key), token, timeout=lock_timeout):
+            return _lead(key, token, func)
+
+        leader_token = cache.get(_lock_key(key))
+        if leader_token is None:
+            continue
+        outcome = _wait_for(key, leader_token, deadline)
+        if outcome is not _MISSING:
+            logger.info(f"Single-flight {key}: memakai hasil panggilan yang sedang berjalan")
+            ok, value = outcome
+            if ok:
+                return value
+            raise value
+        if time.monotonic() >= deadline:
+            raise SingleFlightTimeout(f"Menunggu hasil {key} lebih dari {lock_timeout} detik.")
+
+
+def shared(operation, key=None, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+    """
+    Decorator single-flight. `key(*args, **kwargs)` menentukan bagian argumen yang
+    membedakan panggilan (default: semua argumen).
+
+        @shared('upload_post.submit', key=lambda schedule: schedule.id)
+        def submit_schedule_upload(schedule): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = key(*args, **kwargs) if key else (args, sorted(kwargs.items()))
+            return do(make_key(operation, parts), lambda: func(*args, **kwargs), lock_timeout=lock_timeout)
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Schedule, SyncState
+from .upload_post_service import get_remote_snapshot
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_POST_SYNC = 'upload_post'
+
+
+def sync_remote_schedules(min_interval=None):
+    """
+    Rekonsiliasi jadwal lokal dengan Upload Post API, dijalankan di background.
+
+    1. Hapus jadwal lokal yang sudah lewat waktunya.
+    2. Hapus jadwal lokal yang job_id-nya tidak lagi ada di API eksternal.
+
+    Waktu mulai sinkronisasi disimpan sebagai watermark di SyncState. Hanya
+    baris yang terakhir diubah sebelum watermark yang boleh dihapus pada
+    langkah 2, sehingga jadwal yang baru dikirim saat sinkronisasi berjalan
+    tidak ikut terhapus. Jika `min_interval` (detik) diberikan dan
+    sinkronisasi terakhir lebih baru dari itu, sinkronisasi dilewati.
+
+    Mengembalikan SyncState terbaru, atau None jika dilewati/gagal.
+    """
+    state, _ = SyncState.objects.get_or_create(name=UPLOAD_POST_SYNC)
+    started = timezone.now()
+    if min_interval and state.last_synced_at and started - state.last_synced_at < timedelta(seconds=min_interval):
+        logger.info(f"Sinkronisasi dilewati, terakhir dijalankan pada {state.last_synced_at}.")
+        return None
+
+    # Langkah 1: Hapus jadwal lokal yang sudah lewat tanggalnya
+    _, deleted = Schedule.objects.filter(schedule_time__lt=started).delete()
+    deleted_past = deleted.get('scheduler.Schedule', 0)
+
+    # Langkah 2: Sinkronisasi dengan data dari API eksternal (divalidasi ulang, kondisional via ETag)
+    snapshot = get_remote_snapshot(max_age=0)
+    if snapshot is None:
+        # Jangan menghapus apa pun jika data remote tidak tersedia; watermark tidak dimajukan
+        logger.warning("Sinkronisasi Upload Post gagal: data jadwal remote tidak tersedia.")
+        return None
+    remote_job_ids = snapshot.job_ids
+    if snapshot.items and not remote_job_ids:
+        # Daftar tidak kosong tetapi tidak ada job_id yang terbaca: kemungkinan format
+        # response berubah. Lebih aman tidak menghapus daripada menghapus semua jadwal.
+        logger.warning(f"Sinkronisasi Upload Post dibatalkan: {len(snapshot.items)} jadwal remote tanpa job_id.")
+        return None
+    # Jadwal yang berubah setelah snapshot diambil belum tentu terlihat di snapshot
+    cutoff = min(started, snapshot.fetched_at)
+
+    with transaction.atomic():
+        # Hapus jadwal lokal yang job_id-nya tidak lagi ditemukan di API eksternal
+        schedules_to_delete = (
+            Schedule.objects
+            .filter(upload_job_id__gt='', updated_at__lt=cutoff)
+            .exclude(upload_job_id__in=remote_job_ids)
+        )
+        _, deleted = schedules_to_delete.delete()
+        deleted_stale = deleted.get('scheduler.Schedule', 0)
+
+        state.last_synced_at = started
+        state.last_remote_count = len(remote_job_ids)
+        state.last_deleted_count = deleted_past + deleted_stale
+        state.save()
+
+    logger.info(
+        f"Sinkronisasi Upload Post selesai. Remote: {len(remote_job_ids)} job, "
+        f"dihapus: {deleted_past} lewat waktu, {deleted_stale} tidak ada di remote."
+    )
+    return state
+
+
+def get_last_sync():
+    """Mengembalikan waktu sinkronisasi terakhir yang berhasil (atau None)."""
+    return (
+        SyncState.objects
+        .filter(name=UPLOAD_POST_SYNC)
+        .values_list('last_synced_at', flat=True)
+        .first()
+    )
@@ -0,0 +1,190 @@
+import logging
+import random
+import time
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from .models import Schedule, MediaAsset, ApiScheduleLog
+from .ai_service import run_ai_tasks_for_schedule
+from .upload_post_service import submit_schedule_upload, UploadPostError
+from .sync_service import sync_remote_schedules
+from .media_service import purge_stale_uploads
+from .blob_storage import release_blob
+from .renditions import generate_renditions
+
+logger = logging.getLogger(__name__)
+
+
+def _storage_name_from_url(url):
+    """Mengubah URL media (mis. /media/edited/x.png) menjadi nama file di storage."""
+    if url and url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):]
+    return url
+
+
+@shared_task(bind=True)
+def run_ai_for_schedule(self, schedule_id):
+    """
+    Menjalankan tugas AI (edit dan/atau caption) di worker Celery dan
+    menyimpan hasilnya langsung ke baris Schedule dan MediaAsset.
+    """
+    try:
+        schedule = Schedule.objects.get(id=schedule_id)
+    except Schedule.DoesNotExist:
+        logger.warning(f"Jadwal ID: {schedule_id} tidak ditemukan. Tugas AI dibatalkan.")
+        return None
+
+    Schedule.objects.filter(id=schedule_id).update(ai_status='RUNNING', ai_status_updated_at=timezone.now())
+    if schedule.needs_ai_edit and schedule.ai_edit_prompt and schedule.media_type == 'IMAGE':
+        schedule.media_assets.update(ai_edit_status='PENDING', ai_edit_error='')
+
+    def save_edit_result(asset, edited_media_url, error):
+        # Dipanggil setiap kali satu gambar selesai, agar progres terlihat saat polling.
+        # Waktu status ikut diperbarui agar carousel panjang tidak dianggap macet.
+        Schedule.objects.filter(id=schedule_id, ai_status='RUNNING').update(ai_status_updated_at=timezone.now())
+        # Baris aset bisa sudah terhapus (jadwal dihapus/dibatalkan saat task berjalan),
+        # jadi disimpan dengan UPDATE yang jumlah barisnya diperiksa, bukan save()
+        assets = MediaAsset.objects.filter(pk=asset.pk)
+        if error is not None:
+            if not assets.update(ai_edit_status='FAILED', ai_edit_error=str(error)):
+                logger.warning(f"MediaAsset ID: {asset.id} sudah dihapus saat AI Edit berjalan.")
+            return
+        # Referensi blob hasil edit sudah dipegang untuk aset ini; lepas hasil edit sebelumnya
+        previous_file = asset.edited_file.name if asset.edited_file else ''
+        edited_file = _storage_name_from_url(edited_media_url)
+        if not assets.update(edited_file=edited_file, ai_edit_status='DONE'):
+            # edited_file lama sudah dilepas sinyal post_delete; lepas juga hasil edit baru ini
+            logger.warning(f"MediaAsset ID: {asset.id} sudah dihapus saat AI Edit berjalan; hasil edit dibuang.")
+            release_blob(edited_file)
+            return
+        asset.edited_file.name = edited_file
+        asset.ai_edit_status = 'DONE'
+        if previous_file:
+            release_blob(previous_file)
+        # Rendition lama basi karena sumbernya berubah; buat ulang di background
+        generate_renditions_task.delay([asset.id])
+
+    try:
+        ai_results = run_ai_tasks_for_schedule(schedule, on_edit_result=save_edit_result)
+    except Exception as e:
+        logger.error(f"Tugas AI gagal untuk Jadwal ID: {schedule_id}. Error: {e}")
+        Schedule.objects.filter(id=schedule_id).update(ai_status='FAILED', ai_status_updated_at=timezone.now())
+        raise
+
+    Schedule.objects.filter(id=schedule_id).update(
+        ai_generated_caption=ai_results.get('ai_generated_caption'),
+        ai_status='DONE',
+        ai_status_updated_at=timezone.now(),
+    )
+    logger.info(f"Tugas AI selesai untuk Jadwal ID: {schedule_id}")
+    return ai_results
+
+
+def _retry_countdown(retries):
+    """Exponential backoff dengan jitter: base * 2^retries, dibatasi maksimum."""
+    delay = min(settings.UPLOAD_POST_RETRY_BACKOFF * (2 ** retries), settings.UPLOAD_POST_RETRY_BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 2)
+
+
+@shared_task(bind=True, acks_late=True, max_retries=settings.UPLOAD_POST_MAX_RETRIES)
+def dispatch_schedule_upload(self, schedule_id):
+    """
+    Mengirim jadwal yang sudah dikonfirmasi ke Upload Post API.
+    Task ini dirutekan ke queue 'upload_post' sehingga jumlah pengiriman
+    paralel dibatasi oleh concurrency worker queue tersebut. Setiap percobaan
+    dicatat di ApiScheduleLog.
+
+    Log PENDING dibuat sebelum POST dan menjadi penanda pengiriman yang sedang
+    berjalan. Jika worker mati di tengah POST, broker mengirim ulang task ini
+    (acks_late); penanda yang masih PENDING berarti hasil POST sebelumnya tidak
+    diketahui, sehingga jadwal ditandai FAILED alih-alih dikirim ulang.
+    """
+    try:
+        schedule = Schedule.objects.get(id=schedule_id)
+    except Schedule.DoesNotExist:
+        logger.warning(f"Jadwal ID: {schedule_id} tidak ditemukan. Pengiriman dibatalkan.")
+        return None
+
+    # Idempoten: jangan kirim ulang jadwal yang sudah punya job ID
+    if schedule.upload_job_id:
+        logger.info(f"Jadwal ID: {schedule_id} sudah terkirim (Job ID: {schedule.upload_job_id}).")
+        return schedule.upload_job_id
+
+    in_flight = schedule.api_logs.filter(status='PENDING').first()
+    if in_flight is not None:
+        error = 'Worker berhenti saat mengirim; hasil di Upload Post tidak diketahui, tidak dikirim ulang.'
+        logger.error(f"Jadwal ID: {schedule_id} percobaan {in_flight.attempt} terputus. {error}")
+        in_flight.status = 'FAILED'
+        in_flight.error = error
+        in_flight.save(update_fields=['status', 'error'])
+        Schedule.objects.filter(id=schedule_id).update(status='FAILED')
+        return None
+
+    attempt = self.request.retries + 1
+    started = time.monotonic()
+    log = ApiScheduleLog.objects.create(
+        schedule=schedule,
+        schedule_time=schedule.schedule_time,
+        platform=schedule.platform,
+        status='PENDING',
+        attempt=attempt,
+    )
+
+    def log_attempt(status, **fields):
+        log.status = status
+        log.latency_ms = int((time.monotonic() - started) * 1000)
+        for field, value in fields.items():
+            setattr(log, field, value)
+        log.save(update_fields=['status', 'latency_ms', *fields])
+        return log
+
+    try:
+        response_data = submit_schedule_upload(schedule)
+    except UploadPostError as e:
+        will_retry = e.retryable and self.request.retries < self.max_retries
+        log_attempt('RETRYING' if will_retry else 'FAILED', response_code=e.status_code, error=str(e))
+        if will_retry:
+            countdown = _retry_countdown(self.request.retries)
+            logger.warning(f"Percobaan {attempt} gagal untuk Jadwal ID: {schedule_id}. Coba lagi dalam {countdown:.0f} detik. Error: {e}")
+            raise self.retry(exc=e, countdown=countdown)
+        logger.error(f"Gagal mengirim Jadwal ID: {schedule_id} setelah {attempt} percobaan. Error: {e}")
+        Schedule.objects.filter(id=schedule_id).update(status='FAILED')
+        return None
+    except Exception as e:
+        # Error tak terduga (mis. file media hilang, error database): catat dan tandai
+        # FAILED agar jadwal tidak tertahan di CONFIRMED, lalu teruskan ke Celery
+        logger.exception(f"Error tak terduga saat mengirim Jadwal ID: {schedule_id}. Error: {e}")
+        log_attempt('FAILED', error=f"{type(e).__name__}: {e}")
+        Schedule.objects.filter(id=schedule_id).update(status='FAILED')
+        raise
+
+    job_id = response_data.get('job_id') # Assuming the key is 'job_id'
+    log_attempt('SUCCESS', job_id=job_id or '')
+    Schedule.objects.filter(id=schedule_id).update(upload_job_id=job_id, status='SCHEDULED', is_uploaded=True)
+    logger.info(f"Jadwal ID: {schedule_id} berhasil dikirim dalam {log.latency_ms} ms (percobaan {attempt}).")
+    return job_id
+
+
+@shared_task
+def sync_remote_schedules_task():
+    """Task periodik (Celery beat) untuk sinkronisasi jadwal dengan Upload Post."""
+    state = sync_remote_schedules(min_interval=settings.UPLOAD_POST_SYNC_MIN_INTERVAL)
+    return state.last_synced_at.isoformat() if state else None
+
+
+@shared_task
+def purge_stale_uploads_task():
+    """Task periodik (Celery beat) untuk membersihkan sesi upload bertahap yang terbengkalai."""
+    return purge_stale_uploads()
+
+
+@shared_task
+def generate_renditions_task(asset_ids):
+    """Membuat thumbnail dan preview WebP untuk MediaAsset (saat upload dan setelah AI edit)."""
+    generated = 0
+    for asset in MediaAsset.objects.filter(id__in=asset_ids):
+        try:
+            generated += generate_renditions(asset)
+        except Exception as e:
+            logger.error(f"Gagal membuat rendition untuk MediaAsset ID: {asset.id}. Error: {e}")
+    return generated
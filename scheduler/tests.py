@@ -1,3 +1,1219 @@
-from django.test import TestCase
+import importlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.db import connection
+from django.http.multipartparser import MultiPartParser
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+import decouple
+import httpx
+import openai
+import requests
+import urllib3
+
+from .models import AIResultCache, ApiScheduleLog, Schedule, MediaAsset, MediaBlob, UploadSession
+from .blob_storage import discard_orphan_blobs, store_blob
+from .fake_servers import FakeOpenAIHandler, FakeServer, FakeUploadPostHandler
+from .sync_service import sync_remote_schedules
+from . import ai_cache, ai_service, instrumentation, ratelimit, singleflight, upload_post_service
+from .image_processing import prepare_for_caption, prepare_for_edit
+from .media_service import (
+    create_schedule_with_media, write_media_files, append_upload_chunk, partial_upload_path,
+    UploadOffsetMismatch, UploadSessionUnavailable,
+)
+from .multipart import StreamingMultipartEncoder
+from .schemas import AICaptionPayload, AIEditResponse
+from .tasks import _retry_countdown, dispatch_schedule_upload, generate_renditions_task, run_ai_for_schedule
+
+
+class SchedulerTestCase(TestCase):
+    """
+    Fixture bersama: MEDIA_ROOT sementara per class (dihapus setelah class selesai),
+    user `ops` (login jika `login = True`), dan pembuat jadwal dengan nilai default.
+    """
+    login = False
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        cls.addClassCleanup(media_override.disable)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ops', password='secret')
+        if self.login:
+            self.client.login(username='ops', password='secret')
+
+    def make_schedule(self, save=True, **fields):
+        fields = {
+            'user': self.user,
+            'platform': 'instagram',
+            'media_type': 'IMAGE',
+            'schedule_time': timezone.now() + timedelta(days=1),
+            **fields,
+        }
+        return Schedule.objects.create(**fields) if save else Schedule(**fields)
+
+    def make_image(self, color='red', name='photo.jpg', size=(2400, 1600), format='JPEG'):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, format)
+        return ContentFile(buffer.getvalue(), name=name)
+
+
+class ScheduleListQueryCountTests(SchedulerTestCase):
+    """Halaman daftar jadwal harus memakai jumlah query yang konstan, berapa pun jumlah barisnya."""
+
+    # session, user, jadwal (+ user via select_related), aset utama (prefetch), SyncState
+    EXPECTED_QUERIES = 5
+    login = True
+
+    def _create_schedules(self, count):
+        for i in range(count):
+            schedule = self.make_schedule(
+                schedule_time=timezone.now() + timedelta(days=1, minutes=i),
+                upload_job_id=f'job-{i}',
+            )
+            for order in range(2):
+                MediaAsset.objects.create(
+                    schedule=schedule,
+                    file=ContentFile(b'image', name=f'media_{i}_{order}.jpg'),
+                    order=order,
+                )
+
+    def test_query_count_is_constant(self):
+        self._create_schedules(1)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('scheduler:schedule_list'))
+        self.assertEqual(response.status_code, 200)
+
+        self._create_schedules(20)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('scheduler:schedule_list'))
+        self.assertEqual(len(response.context['schedules']), 21)
+
+    def test_primary_asset_comes_from_prefetch(self):
+        self._create_schedules(3)
+        response = self.client.get(reverse('scheduler:schedule_list'))
+        with self.assertNumQueries(0):
+            for schedule in response.context['schedules']:
+                self.assertEqual(schedule.get_primary_media_asset().order, 0)
+                str(schedule)
+
+
+class ScheduleListApiTests(SchedulerTestCase):
+    """Endpoint JSON daftar jadwal dengan keyset pagination."""
+
+    login = True
+
+    def setUp(self):
+        super().setUp()
+        same_time = timezone.now() + timedelta(days=2)
+        for i in range(7):
+            self.make_schedule(
+                platform='instagram' if i % 2 else 'tiktok',
+                # Beberapa jadwal memiliki waktu yang sama untuk menguji tie-breaker id
+                schedule_time=same_time if i < 3 else same_time + timedelta(hours=i),
+            )
+
+    def _fetch_all(self, **params):
+        ids = []
+        url = reverse('scheduler:schedule_list_api')
+        response = self.client.get(url, {'limit': 2, **params})
+        while True:
+            data = response.json()
+            ids.extend(item['id'] for item in data['results'])
+            if not data['next']:
+                return ids
+            response = self.client.get(data['next'])
+
+    def test_pages_cover_all_rows_in_order(self):
+        ids = self._fetch_all()
+        expected = list(
+            Schedule.objects.order_by('-schedule_time', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_filter_by_platform(self):
+        ids = self._fetch_all(platform='instagram')
+        self.assertEqual(set(ids), set(Schedule.objects.filter(platform='instagram').values_list('id', flat=True)))
+
+    def test_invalid_filter_and_cursor(self):
+        url = reverse('scheduler:schedule_list_api')
+        self.assertEqual(self.client.get(url, {'status': 'NOPE'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+
+
+class MediaIngestionTests(SchedulerTestCase):
+    """Jadwal dan asetnya disimpan dalam satu transaksi tanpa meninggalkan file yatim."""
+
+    def _schedule(self):
+        return self.make_schedule(save=False)
+
+    def _files(self, count, prefix=b'img'):
+        return [ContentFile(prefix + str(i).encode(), name=f'img{i}.jpg') for i in range(count)]
+
+    def _stored_files(self):
+        stored = set()
+        for root, dirs, files in os.walk(os.path.join(settings.MEDIA_ROOT, 'blobs')):
+            stored.update(os.path.join(root, name) for name in files)
+        return stored
+
+    def test_assets_created_in_order_with_constant_queries(self):
+        with CaptureQueriesContext(connection) as single:
+            create_schedule_with_media(self._schedule(), self._files(1, prefix=b'single'))
+        schedule = self._schedule()
+        with self.assertNumQueries(len(single.captured_queries)):
+            create_schedule_with_media(schedule, self._files(5))
+        assets = list(schedule.media_assets.order_by('order'))
+        self.assertEqual([a.order for a in assets], list(range(5)))
+        self.assertTrue(all(a.file.storage.exists(a.file.name) for a in assets))
+
+    def test_failure_rolls_back_and_removes_files(self):
+        before = self._stored_files()
+        with mock.patch.object(MediaAsset.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                create_schedule_with_media(self._schedule(), self._files(3, prefix=b'rollback'))
+        self.assertFalse(Schedule.objects.exists())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self._stored_files(), before)
+
+    def test_files_are_written_before_the_transaction_opens(self):
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        def record_depth(files):
+            depths.append(len(connection.atomic_blocks))
+            return write_media_files(files)
+
+        with mock.patch('scheduler.media_service.write_media_files', side_effect=record_depth):
+            create_schedule_with_media(self._schedule(), self._files(2, prefix=b'outside'))
+        self.assertEqual(depths, [depth])
+
+    def test_spooled_upload_is_moved_not_copied(self):
+        temp_dir = os.path.join(settings.MEDIA_ROOT, 'uploads-tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        with override_settings(FILE_UPLOAD_TEMP_DIR=temp_dir):
+            upload = TemporaryUploadedFile('big.mp4', 'video/mp4', 11, None)
+        upload.write(b'video-bytes')
+        upload.flush()
+        spooled_path = upload.temporary_file_path()
+        inode = os.stat(spooled_path).st_ino
+
+        self.assertEqual(os.stat(spooled_path).st_mode & 0o777, 0o600)
+
+        with override_settings(FILE_UPLOAD_PERMISSIONS=0o640):
+            schedule = create_schedule_with_media(self._schedule(), [upload])
+        blob_path = schedule.media_assets.get().file.path
+        self.assertFalse(os.path.exists(spooled_path))
+        self.assertEqual(os.stat(blob_path).st_ino, inode)
+        self.assertEqual(os.stat(blob_path).st_mode & 0o777, 0o640)
+        with open(blob_path, 'rb') as f:
+            self.assertEqual(f.read(), b'video-bytes')
+        upload.close()
+
+    def test_identical_uploads_share_one_blob_until_last_reference(self):
+        first = create_schedule_with_media(self._schedule(), self._files(1, prefix=b'same'))
+        second = create_schedule_with_media(self._schedule(), self._files(1, prefix=b'same'))
+        name = first.media_assets.get().file.name
+        self.assertEqual(second.media_assets.get().file.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+
+    def test_pending_delete_spares_blob_recreated_before_it_runs(self):
+        first = create_schedule_with_media(self._schedule(), self._files(1, prefix=b'race'))
+        name = first.media_assets.get().file.name
+        # Referensi terakhir dilepas; penghapusan file masih menunggu on_commit
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+        # Upload baru dengan isi sama membuat baris baru dan memakai file yang masih ada
+        second = create_schedule_with_media(self._schedule(), self._files(1, prefix=b'race'))
+        self.assertEqual(second.media_assets.get().file.name, name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_orphan_file_is_deleted_under_a_placeholder_row(self):
+        schedule = create_schedule_with_media(self._schedule(), self._files(1, prefix=b'orphan'))
+        name = schedule.media_assets.get().file.name
+        sha256 = MediaBlob.objects.get(name=name).sha256
+        MediaBlob.objects.filter(name=name).delete()
+        rows_during_delete = []
+        delete = default_storage.delete
+
+        def recording_delete(path):
+            # Baris penanda menahan INSERT commit_blobs lain untuk hash yang sama
+            rows_during_delete.append(list(MediaBlob.objects.filter(sha256=sha256).values_list('ref_count', flat=True)))
+            delete(path)
+
+        with mock.patch.object(default_storage, 'delete', side_effect=recording_delete):
+            discard_orphan_blobs([name])
+        self.assertEqual(rows_during_delete, [[0]])
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+@override_settings(UPLOAD_CHUNK_MAX_SIZE=4)
+class ResumableUploadTests(SchedulerTestCase):
+    """Upload bertahap: chunk ditulis ke file parsial lalu di-rename ke lokasi akhir."""
+
+    login = True
+
+    def _patch(self, upload_id, offset, data):
+        return self.client.generic(
+            'PATCH', reverse('scheduler:upload_detail', args=[upload_id]), data,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def _upload(self, content, filename='reel.mp4'):
+        response = self.client.post(reverse('scheduler:upload_create'), {'filename': filename, 'size': len(content)})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()['id']
+        for offset in range(0, len(content), 4):
+            self.assertEqual(self._patch(upload_id, offset, content[offset:offset + 4]).status_code, 200)
+        return UploadSession.objects.get(pk=upload_id)
+
+    def test_chunks_are_assembled_and_renamed_into_place(self):
+        upload = self._upload(b'0123456789')
+        self.assertTrue(upload.is_complete)
+        with upload.file.open('rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+        self.assertTrue(upload.file.name.startswith('blobs/'))
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'media', '.partial', str(upload.pk))))
+
+    def test_wrong_offset_and_oversized_chunk_are_rejected(self):
+        upload_id = self.client.post(reverse('scheduler:upload_create'), {'filename': 'a.mp4', 'size': 8}).json()['id']
+        self.assertEqual(self._patch(upload_id, 0, b'abcd').status_code, 200)
+        response = self._patch(upload_id, 0, b'abcd')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '4')
+        self.assertEqual(self._patch(upload_id, 4, b'abcdefgh').status_code, 413)
+        status = self.client.head(reverse('scheduler:upload_detail', args=[upload_id]))
+        self.assertEqual(status['Upload-Offset'], '4')
+
+    def test_stale_session_loses_race_without_touching_file(self):
+        upload_id = self.client.post(reverse('scheduler:upload_create'), {'filename': 'a.mp4', 'size': 8}).json()['id']
+        stale = UploadSession.objects.get(pk=upload_id)
+        self.assertEqual(self._patch(upload_id, 0, b'abcd').status_code, 200)
+
+        with self.assertRaises(UploadOffsetMismatch) as ctx:
+            append_upload_chunk(stale, 0, io.BytesIO(b'wxyz'), 4)
+        self.assertEqual(ctx.exception.expected, 4)
+        self.assertEqual(stale.offset, 4)
+        with open(partial_upload_path(stale), 'rb') as f:
+            self.assertEqual(f.read(), b'abcd')
+
+    def test_concurrent_writer_wins_and_no_transaction_is_held_while_writing(self):
+        upload_id = self.client.post(reverse('scheduler:upload_create'), {'filename': 'a.mp4', 'size': 8}).json()['id']
+        upload = UploadSession.objects.get(pk=upload_id)
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        class RacingStream(io.BytesIO):
+            def read(self, size=-1):
+                depths.append(len(connection.atomic_blocks))
+                # Request lain menyelesaikan chunk yang sama saat chunk ini masih dibaca
+                UploadSession.objects.filter(pk=upload_id).update(offset=4)
+                return super().read(size)
+
+        with self.assertRaises(UploadOffsetMismatch) as ctx:
+            append_upload_chunk(upload, 0, RacingStream(b'abcd'), 4)
+        self.assertEqual(ctx.exception.expected, 4)
+        self.assertEqual(upload.offset, 4)
+        self.assertEqual(set(depths), {depth})
+
+    def test_completed_session_is_not_finalized_twice(self):
+        upload_id = self.client.post(reverse('scheduler:upload_create'), {'filename': 'a.mp4', 'size': 4}).json()['id']
+        stale = UploadSession.objects.get(pk=upload_id)
+        self.assertEqual(self._patch(upload_id, 0, b'abcd').status_code, 200)
+        name = UploadSession.objects.get(pk=upload_id).file.name
+
+        stale.offset = 4
+        with self.assertRaises(UploadOffsetMismatch):
+            append_upload_chunk(stale, 4, io.BytesIO(b''), 0)
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).file.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+    def test_upload_session_is_consumed_only_once(self):
+        upload = self._upload(b'video-bytes')
+        stale = [UploadSession.objects.get(pk=upload.pk)]
+        create_schedule_with_media(self.make_schedule(save=False), [], uploads=[upload])
+
+        # Submit kedua dengan sesi yang sudah divalidasi form sebelum submit pertama selesai
+        with self.assertRaises(UploadSessionUnavailable):
+            create_schedule_with_media(self.make_schedule(save=False), [], uploads=stale)
+        self.assertEqual(Schedule.objects.count(), 1)
+        self.assertEqual(MediaBlob.objects.get(name=upload.file.name).ref_count, 1)
+
+    def test_completed_upload_becomes_media_asset(self):
+        upload = self._upload(b'video-bytes')
+        response = self.client.post(reverse('scheduler:create_schedule'), {
+            'platform': ['instagram'],
+            'media_type': 'VIDEO',
+            'content_type': 'REELS',
+            'schedule_time': (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M'),
+            'caption': 'halo',
+            'upload_ids': str(upload.pk),
+        })
+        self.assertEqual(response.status_code, 302)
+        asset = MediaAsset.objects.get()
+        self.assertEqual(asset.file.name, upload.file.name)
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class RenditionTests(SchedulerTestCase):
+    """Thumbnail/preview WebP dibuat dari file yang ditampilkan dan basi saat edited_file berubah."""
+
+    def test_renditions_generated_and_invalidated_on_edit(self):
+        schedule = create_schedule_with_media(self.make_schedule(save=False), [self.make_image('red')])
+        asset = schedule.media_assets.get()
+        self.assertEqual(asset.thumbnail_url, asset.file.url)
+
+        generate_renditions_task([asset.id])
+        asset.refresh_from_db()
+        self.assertNotEqual(asset.thumbnail_url, asset.file.url)
+        with Image.open(asset.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.format, 'WEBP')
+            self.assertLessEqual(max(thumbnail.size), 320)
+
+        asset.edited_file.name = store_blob(self.make_image('blue', 'edited.png'), 'edited.png')
+        asset.save(update_fields=['edited_file'])
+        self.assertEqual(asset.preview_url, asset.edited_file.url)
+
+        generate_renditions_task([asset.id])
+        asset.refresh_from_db()
+        self.assertEqual(asset.renditions_source, asset.edited_file.name)
+        self.assertNotEqual(asset.preview_url, asset.edited_file.url)
+        self.assertNotEqual(asset.original_preview_url, asset.file.url)
+
+
+@override_settings(UPLOAD_POST_API_KEY='test-key')
+class AsyncDeleteScheduleTests(SchedulerTestCase):
+    """View async delete_schedule membatalkan jadwal di Upload Post lewat client httpx async."""
+
+    login = True
+
+    def test_delete_cancels_remote_job_and_removes_row(self):
+        schedule = self.make_schedule(upload_job_id='job-123')
+        with FakeServer(FakeUploadPostHandler) as server, override_settings(UPLOAD_POST_BASE_URL=server.base_url):
+            with self.assertLogs('scheduler.upload_post_service', 'INFO') as logs:
+                response = self.client.post(reverse('scheduler:delete_schedule', args=[schedule.id]))
+        self.assertRedirects(response, reverse('scheduler:schedule_list'), fetch_redirect_response=False)
+        self.assertFalse(Schedule.objects.filter(id=schedule.id).exists())
+        self.assertTrue(any('job-123' in line for line in logs.output))
+
+
+class ProcessConfirmationTests(SchedulerTestCase):
+    """Konfirmasi memakai hasil AI yang tersimpan di baris, bukan dari session."""
+
+    login = True
+
+    def test_confirm_keeps_persisted_ai_results_and_queues_upload(self):
+        schedule = self.make_schedule(ai_generated_caption='caption dari AI', ai_status='DONE')
+        with mock.patch('scheduler.views.dispatch_schedule_upload.delay') as delay:
+            response = self.client.post(
+                reverse('scheduler:process_confirmation', args=[schedule.id]),
+                {'confirm': '1', 'final_caption': 'caption final'},
+            )
+        self.assertRedirects(response, reverse('scheduler:schedule_list'), fetch_redirect_response=False)
+        delay.assert_called_once_with(schedule.id)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.status, 'CONFIRMED')
+        self.assertEqual(schedule.caption, 'caption final')
+        self.assertEqual(schedule.ai_generated_caption, 'caption dari AI')
+
+    def _confirm(self, schedule, stale=None):
+        url = reverse('scheduler:process_confirmation', args=[schedule.id])
+        if stale is None:
+            return self.client.post(url, {'confirm': '1', 'final_caption': 'caption final'})
+        # Request lain sudah mengonfirmasi baris setelah jadwal ini dibaca
+        with mock.patch('scheduler.views.get_object_or_404', return_value=stale):
+            return self.client.post(url, {'confirm': '1', 'final_caption': 'caption kedua'})
+
+    def test_duplicate_confirm_queues_upload_once(self):
+        schedule = self.make_schedule(ai_status='DONE')
+        stale = Schedule.objects.get(id=schedule.id)
+        with mock.patch('scheduler.views.dispatch_schedule_upload.delay') as delay:
+            self._confirm(schedule)
+            self._confirm(schedule, stale=stale)
+            self._confirm(schedule)
+        delay.assert_called_once_with(schedule.id)
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.status, schedule.caption), ('CONFIRMED', 'caption final'))
+
+    def test_enqueue_failure_marks_schedule_failed(self):
+        schedule = self.make_schedule(ai_status='DONE')
+        with mock.patch('scheduler.views.dispatch_schedule_upload.delay', side_effect=ConnectionError('broker down')):
+            with self.assertLogs('scheduler.views', 'ERROR'):
+                self._confirm(schedule)
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.status, 'FAILED')
+
+
+class AITaskTests(SchedulerTestCase):
+    """Tugas AI di Celery: satu antrean per jadwal, hasil disimpan ke baris, status bisa di-poll."""
+
+    login = True
+
+    def setUp(self):
+        super().setUp()
+        self.schedule = self.make_schedule(needs_ai_edit=True, ai_edit_prompt='lebih cerah', needs_ai_caption=True)
+        self.asset = MediaAsset.objects.create(
+            schedule=self.schedule, file=store_blob(self.make_image(), 'photo.jpg'), order=0,
+        )
+
+    def _run_ai(self, schedule=None):
+        with mock.patch('scheduler.views.run_ai_for_schedule.delay', return_value=mock.Mock(id='task-1')) as delay:
+            if schedule is None:
+                response = self.client.get(reverse('scheduler:run_ai_and_confirm', args=[self.schedule.id]))
+            else:
+                # Request lain sudah mengklaim baris setelah jadwal ini dibaca
+                with mock.patch('scheduler.views.aget_object_or_404', mock.AsyncMock(return_value=schedule)):
+                    response = self.client.get(reverse('scheduler:run_ai_and_confirm', args=[self.schedule.id]))
+        self.assertEqual(response.status_code, 200)
+        return delay
+
+    def test_task_is_queued_once(self):
+        self._run_ai().assert_called_once_with(self.schedule.id)
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.ai_status, self.schedule.ai_task_id), ('QUEUED', 'task-1'))
+        self._run_ai().assert_not_called()
+
+    def test_stale_read_does_not_queue_twice(self):
+        stale = Schedule.objects.get(id=self.schedule.id)
+        Schedule.objects.filter(id=self.schedule.id).update(ai_status='QUEUED', ai_status_updated_at=timezone.now())
+        self._run_ai(schedule=stale).assert_not_called()
+
+    @override_settings(AI_TASK_STALE_AFTER=60)
+    def test_stuck_task_can_be_claimed_again(self):
+        stuck_at = timezone.now() - timedelta(seconds=120)
+        for status in ('QUEUED', 'RUNNING'):
+            Schedule.objects.filter(id=self.schedule.id).update(ai_status=status, ai_status_updated_at=stuck_at)
+            self.assertFalse(Schedule.objects.get(id=self.schedule.id).ai_in_progress)
+            # Halaman konfirmasi tidak lagi mengarahkan kembali ke halaman progres
+            response = self.client.get(reverse('scheduler:schedule_confirmation', args=[self.schedule.id]))
+            self.assertEqual(response.status_code, 200)
+            self._run_ai().assert_called_once_with(self.schedule.id)
+            self.schedule.refresh_from_db()
+            self.assertEqual(self.schedule.ai_status, 'QUEUED')
+            self.assertGreater(self.schedule.ai_status_updated_at, stuck_at)
+
+    def test_enqueue_failure_marks_schedule_failed(self):
+        with mock.patch('scheduler.views.run_ai_for_schedule.delay', side_effect=ConnectionError('broker down')):
+            with self.assertLogs('scheduler.views', 'ERROR'):
+                response = self.client.get(reverse('scheduler:run_ai_and_confirm', args=[self.schedule.id]))
+        self.assertEqual(response.status_code, 200)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.ai_status, 'FAILED')
+        self.assertFalse(self.schedule.ai_in_progress)
+        # Setelah broker pulih, jadwal bisa diantrekan ulang
+        self._run_ai().assert_called_once_with(self.schedule.id)
+
+    def test_task_persists_results_and_status_endpoint_reports_them(self):
+        edited_name = store_blob(self.make_image('blue', 'edited.png'), 'edited.png')
+
+        def fake_ai(schedule, on_edit_result):
+            on_edit_result(self.asset, settings.MEDIA_URL + edited_name, None)
+            return {'ai_generated_caption': 'caption AI', 'edited_media_url': None, 'edited_media_urls': {}}
+
+        with mock.patch('scheduler.tasks.run_ai_tasks_for_schedule', side_effect=fake_ai), \
+                mock.patch('scheduler.tasks.generate_renditions_task.delay'):
+            run_ai_for_schedule(self.schedule.id)
+
+        data = self.client.get(reverse('scheduler:ai_status', args=[self.schedule.id])).json()
+        self.assertEqual(data['status'], 'DONE')
+        self.assertEqual(data['ai_generated_caption'], 'caption AI')
+        self.assertEqual(data['assets'][0]['ai_edit_status'], 'DONE')
+        self.assertEqual(data['edited_media_url'], default_storage.url(edited_name))
+        self.assertEqual((data['edits_done'], data['edits_total']), (1, 1))
+
+    def test_deleted_schedule_releases_edit_result(self):
+        edited_name = store_blob(self.make_image('blue', 'edited.png'), 'edited.png')
+
+        def fake_ai(schedule, on_edit_result):
+            # Jadwal dibatalkan saat gambar masih diedit
+            Schedule.objects.filter(id=schedule.id).delete()
+            on_edit_result(self.asset, settings.MEDIA_URL + edited_name, None)
+            on_edit_result(self.asset, None, RuntimeError('openai 500'))
+            return {'ai_generated_caption': 'caption AI', 'edited_media_url': None, 'edited_media_urls': {}}
+
+        with mock.patch('scheduler.tasks.run_ai_tasks_for_schedule', side_effect=fake_ai), \
+                mock.patch('scheduler.tasks.generate_renditions_task.delay') as renditions, \
+                self.assertLogs('scheduler.tasks', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            run_ai_for_schedule(self.schedule.id)
+        renditions.assert_not_called()
+        self.assertFalse(MediaBlob.objects.filter(name=edited_name).exists())
+        self.assertFalse(default_storage.exists(edited_name))
+
+    def test_task_failure_marks_schedule_failed(self):
+        with mock.patch('scheduler.tasks.run_ai_tasks_for_schedule', side_effect=RuntimeError('openai down')):
+            with self.assertRaises(RuntimeError):
+                run_ai_for_schedule(self.schedule.id)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.ai_status, 'FAILED')
+        # Jadwal yang gagal boleh diantrekan ulang
+        self._run_ai().assert_called_once_with(self.schedule.id)
+
+
+class DispatchUploadTests(SchedulerTestCase):
+    """Task pengiriman ke Upload Post: retry dengan backoff, log per percobaan, dan idempotensi."""
+
+    def setUp(self):
+        super().setUp()
+        self.schedule = self.make_schedule(status='CONFIRMED', caption='halo')
+
+    def _dispatch(self, side_effect):
+        with mock.patch('scheduler.tasks.submit_schedule_upload', side_effect=side_effect) as submit:
+            result = dispatch_schedule_upload.apply(args=[self.schedule.id])
+        self.schedule.refresh_from_db()
+        logs = list(self.schedule.api_logs.order_by('attempt').values_list('attempt', 'status'))
+        return result, submit, logs
+
+    def test_retryable_errors_are_retried_until_success(self):
+        error = upload_post_service.UploadPostError('HTTP 503', status_code=503, retryable=True)
+        result, submit, logs = self._dispatch([error, error, {'job_id': 'job-1'}])
+        self.assertEqual(result.get(), 'job-1')
+        self.assertEqual(submit.call_count, 3)
+        self.assertEqual(logs, [(1, 'RETRYING'), (2, 'RETRYING'), (3, 'SUCCESS')])
+        self.assertEqual((self.schedule.status, self.schedule.upload_job_id), ('SCHEDULED', 'job-1'))
+
+    def test_gives_up_after_max_retries(self):
+        error = upload_post_service.UploadPostError('HTTP 503', status_code=503, retryable=True)
+        result, submit, logs = self._dispatch(error)
+        attempts = dispatch_schedule_upload.max_retries + 1
+        self.assertEqual(submit.call_count, attempts)
+        self.assertEqual(logs[-1], (attempts, 'FAILED'))
+        self.assertEqual(self.schedule.status, 'FAILED')
+
+    def test_non_retryable_error_fails_immediately(self):
+        error = upload_post_service.UploadPostError('HTTP 400', status_code=400)
+        result, submit, logs = self._dispatch(error)
+        self.assertEqual(submit.call_count, 1)
+        self.assertEqual(logs, [(1, 'FAILED')])
+        self.assertEqual(self.schedule.status, 'FAILED')
+
+    def test_unexpected_error_is_logged_and_marks_failed(self):
+        with self.assertLogs('scheduler.tasks', 'ERROR'):
+            result, submit, logs = self._dispatch(FileNotFoundError('media/hilang.jpg'))
+        self.assertTrue(result.failed())
+        self.assertEqual(logs, [(1, 'FAILED')])
+        self.assertIn('FileNotFoundError', self.schedule.api_logs.get().error)
+        self.assertEqual(self.schedule.status, 'FAILED')
+
+    def test_already_submitted_schedule_is_not_sent_again(self):
+        Schedule.objects.filter(id=self.schedule.id).update(upload_job_id='job-1')
+        result, submit, logs = self._dispatch({'job_id': 'job-2'})
+        self.assertEqual(result.get(), 'job-1')
+        submit.assert_not_called()
+        self.assertEqual(logs, [])
+
+    def test_redelivered_task_after_crash_mid_post_is_not_sent_again(self):
+        # Worker mati saat POST: log percobaan masih PENDING ketika broker mengirim ulang task
+        ApiScheduleLog.objects.create(
+            schedule=self.schedule, schedule_time=self.schedule.schedule_time,
+            platform=self.schedule.platform, status='PENDING', attempt=1,
+        )
+        with self.assertLogs('scheduler.tasks', 'ERROR'):
+            result, submit, logs = self._dispatch({'job_id': 'job-2'})
+        self.assertIsNone(result.get())
+        submit.assert_not_called()
+        self.assertEqual(logs, [(1, 'FAILED')])
+        self.assertEqual(self.schedule.status, 'FAILED')
+
+    def test_attempt_is_marked_pending_while_posting(self):
+        def submit(schedule):
+            self.assertEqual(list(schedule.api_logs.values_list('status', flat=True)), ['PENDING'])
+            return {'job_id': 'job-1'}
+
+        result, _, logs = self._dispatch(submit)
+        self.assertEqual(result.get(), 'job-1')
+        self.assertEqual(logs, [(1, 'SUCCESS')])
+
+    @override_settings(UPLOAD_POST_RETRY_BACKOFF=10, UPLOAD_POST_RETRY_BACKOFF_MAX=600)
+    def test_backoff_grows_exponentially_with_jitter_and_cap(self):
+        for retries, delay in [(0, 10), (2, 40), (10, 600)]:
+            self.assertTrue(delay <= _retry_countdown(retries) <= delay * 1.5)
+
+    def test_only_unsent_posts_are_retryable(self):
+        # Koneksi gagal dibuka: aman dicoba ulang. Read timeout: POST mungkin sudah diterima.
+        refused = requests.exceptions.ConnectionError(
+            urllib3.exceptions.MaxRetryError(None, '/', urllib3.exceptions.NewConnectionError(None, 'refused')),
+        )
+        MediaAsset.objects.create(schedule=self.schedule, file=store_blob(self.make_image(), 'photo.jpg'))
+        client = upload_post_service.UploadPostClient(base_url='http://upload-post.test')
+        for error, retryable in [(refused, True), (requests.exceptions.ReadTimeout('read timeout'), False)]:
+            with mock.patch.object(client.session, 'request', side_effect=error):
+                with self.assertRaises(upload_post_service.UploadPostError) as raised:
+                    client.upload_schedule(self.schedule)
+            self.assertEqual(raised.exception.retryable, retryable)
+
+
+class StreamingMultipartEncoderTests(TestCase):
+    """Body multipart yang di-stream harus bisa diparse dan identik setiap kali diiterasi (retry)."""
+
+    def test_body_parses_and_is_repeatable(self):
+        photos = [ContentFile(b'\xff\xd8foto-1' * 10, name='a.jpg'), ContentFile(b'\xff\xd8foto-2', name='b.jpg')]
+        encoder = StreamingMultipartEncoder(
+            [('platform[]', ['instagram', 'tiktok']), ('title', 'Halo \u2728'), ('media_type', None)],
+            [('photos[]', f'media/{photo.name}', photo, 'image/jpeg') for photo in photos],
+            chunk_size=7,
+        )
+        body = b''.join(encoder)
+        self.assertEqual(b''.join(encoder), body)
+        self.assertEqual(len(encoder), len(body))
+
+        parser = MultiPartParser(
+            {'CONTENT_TYPE': encoder.content_type, 'CONTENT_LENGTH': str(len(body))},
+            io.BytesIO(body), [MemoryFileUploadHandler()], 'utf-8',
+        )
+        data, files = parser.parse()
+        self.assertEqual(data.getlist('platform[]'), ['instagram', 'tiktok'])
+        self.assertEqual(data['title'], 'Halo \u2728')
+        self.assertNotIn('media_type', data)
+        uploaded = files.getlist('photos[]')
+        self.assertEqual([f.name for f in uploaded], ['a.jpg', 'b.jpg'])
+        self.assertEqual([f.content_type for f in uploaded], ['image/jpeg'] * 2)
+        self.assertEqual([f.read() for f in uploaded], [b'\xff\xd8foto-1' * 10, b'\xff\xd8foto-2'])
+
+
+@override_settings(
+    UPLOAD_POST_API_KEY='test-key', UPLOAD_POST_BASE_URL='http://upload-post.test/api/',
+    UPLOAD_POST_CONNECT_TIMEOUT=3, UPLOAD_POST_READ_TIMEOUT=45,
+)
+class UploadPostClientTests(TestCase):
+    """Client Upload Post: satu Session bersama, header Apikey, dan timeout di setiap permintaan."""
+
+    def setUp(self):
+        patcher = mock.patch('scheduler.upload_post_service.requests.Session')
+        self.session_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session = self.session_class.return_value
+        self.session.headers = {}
+        self.session.request.return_value = mock.Mock(status_code=200)
+        client_patch = mock.patch.object(upload_post_service, '_client', None)
+        client_patch.start()
+        self.addCleanup(client_patch.stop)
+
+    def test_shared_client_reuses_one_session(self):
+        client = upload_post_service.get_client()
+        client.delete_schedule('job-1')
+        upload_post_service.get_client().list_schedules()
+        self.assertIs(upload_post_service.get_client(), client)
+        self.session_class.assert_called_once_with()
+        self.assertEqual(
+            [c.args for c in self.session.request.call_args_list],
+            [('DELETE', 'http://upload-post.test/api/schedule/job-1'), ('GET', 'http://upload-post.test/api/uploadposts/schedule')],
+        )
+
+    def test_apikey_header_and_timeouts(self):
+        client = upload_post_service.get_client()
+        self.assertEqual(self.session.headers['Authorization'], 'Apikey test-key')
+        client.edit_schedule('job-1', caption='baru')
+        self.assertEqual(self.session.request.call_args.kwargs['timeout'], (3, 45))
+
+        custom = upload_post_service.UploadPostClient(api_key='lain', connect_timeout=1, read_timeout=2)
+        self.assertEqual(self.session.headers['Authorization'], 'Apikey lain')
+        custom.request('GET', 'x', timeout=9)
+        self.assertEqual(custom.timeout, (1, 2))
+        self.assertEqual(self.session.request.call_args.kwargs['timeout'], 9)
+
+
+@override_settings(AI_CACHE_TTL=3600, AI_CACHE_MAX_ENTRIES=2)
+class AICacheTests(SchedulerTestCase):
+    """Cache hasil AI: kedaluwarsa (TTL), eviction LRU, dan penghitung hit/miss di database."""
+
+    def _lookup(self, media_hash):
+        return ai_cache.lookup('CAPTION', media_hash, 'gpt-4.1', 'prompt')
+
+    def _store(self, media_hash):
+        return ai_cache.store('CAPTION', media_hash, 'gpt-4.1', 'prompt', caption=f'caption {media_hash}')
+
+    def test_expired_entries_are_misses_and_evicted(self):
+        self._store('a')
+        self.assertEqual(self._lookup('a').caption, 'caption a')
+        AIResultCache.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(self._lookup('a'))
+        ai_cache.evict()
+        self.assertFalse(AIResultCache.objects.exists())
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self._store('a')
+        self._store('b')
+        AIResultCache.objects.update(last_used_at=timezone.now() - timedelta(minutes=1))
+        self._lookup('a')  # 'a' dipakai lagi sehingga 'b' paling lama tidak dipakai
+        self._store('c')
+        self.assertEqual(set(AIResultCache.objects.values_list('media_hash', flat=True)), {'a', 'c'})
+        self.assertEqual(AIResultCache.objects.get(media_hash='a').hit_count, 1)
+
+    def test_counters_are_shared_through_the_database(self):
+        self._store('a')
+        self._lookup('a')
+        self._lookup('a')
+        self._lookup('b')
+        # Cache Django per proses (locmem) tidak menyimpan penghitung
+        cache.clear()
+        self.assertEqual(ai_cache.stats(), {'hits': 2, 'misses': 1, 'hit_ratio': 0.6667, 'entries': 1})
+
+        staff = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('scheduler:ai_cache_stats')).json()['hits'], 2)
+
+
+class OpenAIFileRegistryTests(SchedulerTestCase):
+    """Registry file_id OpenAI: gambar yang sama tidak diupload ulang sampai mendekati kedaluwarsa."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.path = default_storage.path(store_blob(self.make_image(), 'photo.jpg'))
+        self.media_hash = ai_cache.file_sha256(self.path)
+        self.client_mock = mock.Mock()
+        self.client_mock.files.create.side_effect = [mock.Mock(id='file-1'), mock.Mock(id='file-2')]
+
+    def _upload(self):
+        return ai_service.upload_file_for_vision(self.client_mock, self.path, self.media_hash)
+
+    def test_miss_uploads_then_hit_reuses_file_id(self):
+        self.assertEqual(self._upload(), 'file-1')
+        self.assertEqual(self._upload(), 'file-1')
+        self.assertEqual(self.client_mock.files.create.call_count, 1)
+        kwargs = self.client_mock.files.create.call_args.kwargs
+        self.assertEqual(kwargs['expires_after']['seconds'], ai_service.OPENAI_FILE_EXPIRY_SECONDS)
+
+    def test_entry_expires_before_the_openai_file(self):
+        self._upload()
+        ttl = ai_service.OPENAI_FILE_EXPIRY_SECONDS - ai_service.OPENAI_FILE_EXPIRY_MARGIN_SECONDS
+        clock = mock.Mock()
+        with mock.patch('django.core.cache.backends.locmem.time', clock):
+            clock.time.return_value = time.time() + ttl - 60
+            self.assertEqual(self._upload(), 'file-1')
+            clock.time.return_value = time.time() + ttl + 1
+            self.assertEqual(self._upload(), 'file-2')
+        self.assertEqual(self.client_mock.files.create.call_count, 2)
+
+    def test_file_deleted_on_openai_is_uploaded_again(self):
+        self._upload()
+        gone = openai.NotFoundError(
+            'file not found', response=httpx.Response(404, request=httpx.Request('POST', 'http://openai.test')), body=None,
+        )
+        self.client_mock.responses.create.side_effect = [gone, mock.Mock(output_text='caption baru')]
+        with mock.patch.object(ai_service, 'get_openai_client', return_value=self.client_mock):
+            caption = ai_service.ai_caption(AICaptionPayload(media_file_path=self.path))
+        self.assertEqual(caption.caption, 'caption baru')
+        self.assertEqual(self.client_mock.files.create.call_count, 2)
+        file_ids = [c.kwargs['input'][0]['content'][1]['file_id'] for c in self.client_mock.responses.create.call_args_list]
+        self.assertEqual(file_ids, ['file-1', 'file-2'])
+
+
+class ImageProcessingTests(SchedulerTestCase):
+    """Gambar diperkecil ke resolusi efektif model sebelum dikirim ke OpenAI."""
+
+    def _path(self, size, exif=None):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif or Image.Exif())
+        return default_storage.path(store_blob(ContentFile(buffer.getvalue()), 'photo.jpg'))
+
+    def test_edit_input_is_downscaled_rgba_png(self):
+        with Image.open(prepare_for_edit(self._path((3000, 2000)))) as img:
+            self.assertEqual((img.format, img.mode, img.size), ('PNG', 'RGBA', (1536, 1024)))
+
+    def test_caption_input_respects_short_side_and_is_jpeg(self):
+        with Image.open(prepare_for_caption(self._path((3000, 2000)))) as img:
+            self.assertEqual((img.format, img.mode, img.size), ('JPEG', 'RGB', (1152, 768)))
+        with Image.open(prepare_for_caption(self._path((500, 400)))) as img:
+            self.assertEqual(img.size, (500, 400))
+
+    def test_exif_orientation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Diputar 90 derajat (foto ponsel tegak)
+        with Image.open(prepare_for_edit(self._path((3000, 2000), exif=exif))) as img:
+            self.assertEqual(img.size, (1024, 1536))
+
+    def test_video_schedule_skips_caption(self):
+        schedule = self.make_schedule(media_type='VIDEO', content_type='REELS', needs_ai_caption=True)
+        MediaAsset.objects.create(schedule=schedule, file=ContentFile(b'bukan gambar', name='clip.mp4'))
+        with mock.patch.object(ai_service, 'ai_caption') as caption, self.assertLogs('scheduler.ai_service', 'WARNING'):
+            results = ai_service.run_ai_tasks_for_schedule(schedule)
+        caption.assert_not_called()
+        self.assertIsNone(results['ai_generated_caption'])
+
+
+@override_settings(AI_MAX_CONCURRENCY=3)
+@override_settings(AI_MAX_CONCURRENCY=4)
+class CarouselCaptionTests(SchedulerTestCase):
+    """Caption carousel: semua gambar diupload paralel lalu dianalisis dalam satu permintaan."""
+
+    def test_uploads_overlap_and_one_request_carries_every_file(self):
+        paths = [default_storage.path(store_blob(self.make_image(color), f'{color}.jpg')) for color in ('red', 'green', 'blue')]
+        client = mock.Mock()
+        client.responses.create.return_value = mock.Mock(output_text='caption carousel')
+        # Ketiga upload harus berjalan bersamaan agar barrier terlewati
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_upload(client, path, media_hash):
+            barrier.wait()
+            return f'file-{os.path.basename(path)}'
+
+        def caption(ordered_paths):
+            payload = AICaptionPayload(media_file_path=ordered_paths[0], additional_media_file_paths=ordered_paths[1:])
+            return ai_service.ai_caption(payload).caption
+
+        with mock.patch.object(ai_service, 'get_openai_client', return_value=client), \
+                mock.patch.object(ai_service, 'upload_file_for_vision', side_effect=fake_upload):
+            self.assertEqual(caption(paths), 'caption carousel')
+            self.assertEqual(client.responses.create.call_count, 1)
+            content = client.responses.create.call_args.kwargs['input'][0]['content']
+            self.assertEqual(
+                [part['file_id'] for part in content if part['type'] == 'input_image'],
+                [f'file-{os.path.basename(path)}' for path in paths],
+            )
+
+            # Urutan gambar lain menghasilkan key cache lain (bukan hit)
+            caption(paths[::-1])
+            self.assertEqual(client.responses.create.call_count, 2)
+
+        hashes = [ai_cache.file_sha256(path) for path in paths]
+        self.assertEqual(
+            set(AIResultCache.objects.values_list('media_hash', flat=True)),
+            {ai_cache.combine_hashes(hashes), ai_cache.combine_hashes(hashes[::-1])},
+        )
+
+
+class AIEditPoolTests(SchedulerTestCase):
+    """AI Edit carousel berjalan paralel; satu gambar gagal tidak menghentikan gambar lain."""
+
+    def test_one_failure_does_not_abort_the_others(self):
+        schedule = self.make_schedule()
+        assets = [
+            MediaAsset.objects.create(schedule=schedule, file=ContentFile(b'img', name=f'img{i}.jpg'), order=i)
+            for i in range(3)
+        ]
+        failing_path = assets[1].file.path
+        # Ketiga panggilan harus berjalan bersamaan agar barrier terlewati
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_edit(payload):
+            barrier.wait()
+            if payload.media_file_path == failing_path:
+                raise RuntimeError('openai 500')
+            return AIEditResponse(edited_media_file_path=f"/media/edited/{os.path.basename(payload.media_file_path)}")
+
+        results = []
+        with mock.patch.object(ai_service, 'ai_edit', side_effect=fake_edit):
+            edited = ai_service.run_ai_edit_for_assets(
+                assets, 'lebih cerah', on_result=lambda asset, url, error: results.append((asset.id, url, error)),
+            )
+
+        self.assertEqual(set(edited), {assets[0].id, assets[2].id})
+        self.assertEqual(len(results), 3)
+        failed = [(asset_id, str(error)) for asset_id, _, error in results if error is not None]
+        self.assertEqual(failed, [(assets[1].id, 'openai 500')])
+
+
+class CarouselAIEditStatusTests(SchedulerTestCase):
+    """Status AI edit per aset: direset saat task mulai, lalu DONE (dengan edited_file) atau FAILED (dengan error)."""
+
+    login = True
+
+    def test_per_asset_status_error_and_caption_inputs(self):
+        schedule = self.make_schedule(needs_ai_edit=True, ai_edit_prompt='lebih cerah', needs_ai_caption=True)
+        assets = [
+            MediaAsset.objects.create(schedule=schedule, file=store_blob(self.make_image(color), f'{color}.jpg'), order=i)
+            for i, color in enumerate(['red', 'green'])
+        ]
+        # Sisa percobaan sebelumnya direset ke PENDING saat task dimulai
+        MediaAsset.objects.update(ai_edit_status='FAILED', ai_edit_error='error lama')
+        edited_name = store_blob(self.make_image('blue', 'edited.png'), 'edited.png')
+
+        def fake_edit(payload):
+            if payload.media_file_path == assets[1].file.path:
+                raise RuntimeError('openai 500')
+            return AIEditResponse(edited_media_file_path=settings.MEDIA_URL + edited_name)
+
+        with mock.patch.object(ai_service, 'ai_edit', side_effect=fake_edit), \
+                mock.patch.object(ai_service, 'ai_caption', return_value=mock.Mock(caption='caption AI')) as caption, \
+                mock.patch('scheduler.tasks.generate_renditions_task.delay'):
+            run_ai_for_schedule(schedule.id)
+
+        done, failed = [MediaAsset.objects.get(id=asset.id) for asset in assets]
+        self.assertEqual((done.ai_edit_status, done.ai_edit_error, done.edited_file.name), ('DONE', '', edited_name))
+        self.assertEqual((failed.ai_edit_status, failed.ai_edit_error), ('FAILED', 'openai 500'))
+        self.assertFalse(failed.edited_file)
+        self.assertEqual(failed.file.name, assets[1].file.name)
+        # Caption memakai gambar editan jika ada, selain itu gambar asli
+        payload = caption.call_args.args[0]
+        self.assertEqual(
+            [payload.media_file_path, *payload.additional_media_file_paths],
+            [default_storage.path(edited_name), assets[1].file.path],
+        )
+
+        data = self.client.get(reverse('scheduler:ai_status', args=[schedule.id])).json()
+        self.assertEqual((data['status'], data['edits_done'], data['edits_total']), ('DONE', 2, 2))
+        self.assertEqual([asset['ai_edit_status'] for asset in data['assets']], ['DONE', 'FAILED'])
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """Konfigurasi database dari environment: koneksi persisten, opsi SQLite, dan pool."""
+
+    def _database(self, asgi=False, dotenv='', **env):
+        import internal_scheduler.settings as settings_module
+        self.addCleanup(importlib.reload, settings_module)
+        # Isi .env palsu untuk decouple (environment tetap diprioritaskan)
+        env_file = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), '.env')
+        with open(env_file, 'w') as f:
+            f.write(dotenv)
+        repository = decouple.Config(decouple.RepositoryEnv(env_file))
+        with mock.patch.dict(os.environ), mock.patch.object(decouple.config, 'config', repository):
+            for key in ('DATABASE_URL', 'DB_CONN_MAX_AGE', 'DB_POOL'):
+                os.environ.pop(key, None)
+            os.environ.update(env)
+            if asgi:
+                import internal_scheduler.asgi
+                importlib.reload(internal_scheduler.asgi)
+            return importlib.reload(settings_module).DATABASES['default']
+
+    def test_sqlite_uses_wal_and_immediate_transactions(self):
+        database = self._database(DATABASE_URL='sqlite:////tmp/settings-test.sqlite3')
+        self.assertEqual(database['CONN_MAX_AGE'], 600)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertEqual(database['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('journal_mode=WAL', database['OPTIONS']['init_command'])
+
+    def test_asgi_web_process_disables_persistent_connections(self):
+        self.assertEqual(self._database(asgi=True)['CONN_MAX_AGE'], 0)
+        self.assertEqual(self._database(asgi=True, DB_CONN_MAX_AGE='60')['CONN_MAX_AGE'], 60)
+        self.assertEqual(self._database(asgi=True, dotenv='DB_CONN_MAX_AGE=120\n')['CONN_MAX_AGE'], 120)
+
+    def test_postgres_pool_disables_persistent_connections(self):
+        database = self._database(DATABASE_URL='postgres://u:p@db:5432/app', DB_POOL='True')
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 10)
+        self.assertNotIn('transaction_mode', database['OPTIONS'])
+
+
+class RemoteSnapshotTests(SchedulerTestCase):
+    """Snapshot daftar jadwal Upload Post: cache, permintaan kondisional, dan satu fetch bersama."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        handler = type('SlowHandler', (FakeUploadPostHandler,), {'latency': 0.2})
+        self.server = FakeServer(handler).start()
+        self.addCleanup(self.server.stop)
+        self.server.httpd.schedules = [{'job_id': 'job-1'}, {'job_id': 'job-2'}, {'caption': 'tanpa job'}]
+        client_patch = mock.patch.object(
+            upload_post_service, '_client', upload_post_service.UploadPostClient(base_url=self.server.base_url),
+        )
+        client_patch.start()
+        self.addCleanup(client_patch.stop)
+
+    def test_concurrent_callers_share_one_fetch(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            snapshots = list(executor.map(lambda _: upload_post_service.get_remote_snapshot(), range(8)))
+        self.assertEqual(self.server.httpd.list_requests, 1)
+        self.assertTrue(all(snapshot.job_ids == {'job-1', 'job-2'} for snapshot in snapshots))
+        self.assertIn('job-1', snapshots[0])
+        self.assertEqual(upload_post_service.get_schedule(), [{'job_id': 'job-1'}, {'job_id': 'job-2'}, {'caption': 'tanpa job'}])
+        self.assertEqual(self.server.httpd.list_requests, 1)
+
+    def test_revalidation_uses_etag(self):
+        first = upload_post_service.get_remote_snapshot()
+        second = upload_post_service.get_remote_snapshot(max_age=0)
+        self.assertEqual(self.server.httpd.list_requests, 2)
+        self.assertEqual(second.items, first.items)
+        self.assertEqual(second.etag, first.etag)
+        self.assertGreater(second.fetched_at, first.fetched_at)
+
+    def test_sync_keeps_rows_when_payload_is_unrecognized(self):
+        self.make_schedule(upload_job_id='job-9')
+        self.server.httpd.schedules = {'error': 'unexpected'}
+        with self.assertLogs('scheduler', 'WARNING'):
+            self.assertIsNone(sync_remote_schedules())
+        self.assertTrue(Schedule.objects.filter(upload_job_id='job-9').exists())
+
+        # Daftar terbaca tetapi tanpa job_id (format berubah): tidak ada yang dihapus
+        self.server.httpd.schedules = [{'id': 'job-1'}]
+        with self.assertLogs('scheduler', 'WARNING'):
+            self.assertIsNone(sync_remote_schedules())
+        self.assertTrue(Schedule.objects.filter(upload_job_id='job-9').exists())
+
+    def test_sync_reads_wrapped_payload_and_deletes_only_missing_jobs(self):
+        self.make_schedule(upload_job_id='job-1')
+        self.make_schedule(upload_job_id='job-9')
+        self.server.httpd.schedules = {'success': True, 'scheduled_posts': [{'job_id': 'job-1'}]}
+        state = sync_remote_schedules()
+        self.assertEqual(state.last_remote_count, 1)
+        self.assertEqual(list(Schedule.objects.values_list('upload_job_id', flat=True)), ['job-1'])
+
+
+class SingleFlightTests(TestCase):
+    """Panggilan identik yang bersamaan dijalankan sekali; hasil dan error dibagikan."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _run_concurrently(self, func, callers=8):
+        def call(_):
+            try:
+                return singleflight.do(singleflight.make_key('test.op', 42), func, lock_timeout=5)
+            except Exception as e:
+                return e
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            return list(executor.map(call, range(callers)))
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'job_id': 'job-1'}
+
+        results = self._run_concurrently(slow)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'job_id': 'job-1'}] * 8)
+
+    def test_error_is_shared(self):
+        calls = []
+
+        def failing():
+            calls.append(1)
+            time.sleep(0.2)
+            raise upload_post_service.UploadPostError('HTTP 503', status_code=503, retryable=True)
+
+        results = self._run_concurrently(failing)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(e, upload_post_service.UploadPostError) for e in results))
+        self.assertTrue(all(e.status_code == 503 and e.retryable for e in results))
+
+    def test_sequential_calls_are_not_coalesced(self):
+        key = singleflight.make_key('test.op', 42)
+        self.assertEqual(singleflight.do(key, lambda: 1), 1)
+        self.assertEqual(singleflight.do(key, lambda: 2), 2)
+
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class InstrumentationTests(SchedulerTestCase):
+    """Server-Timing per request dan histogram di /internal/metrics."""
+
+    login = True
+
+    def setUp(self):
+        # Metrik dari test lain yang belum di-flush tidak ikut terhitung
+        instrumentation.flush()
+        cache.clear()
+        super().setUp()
+
+    def test_server_timing_includes_db(self):
+        response = self.client.get(reverse('scheduler:schedule_list'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+    def test_metrics_export_histograms(self):
+        server = FakeServer(FakeUploadPostHandler).start()
+        self.addCleanup(server.stop)
+        upload_post_service.UploadPostClient(base_url=server.base_url).delete_schedule('job-1')
+        self.client.get(reverse('scheduler:schedule_list'))
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('internal:metrics')).status_code, 401)
+        response = self.client.get(reverse('internal:metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        body = response.content.decode()
+        self.assertIn('# TYPE scheduler_upstream_request_duration_seconds histogram', body)
+        self.assertIn(
+            'scheduler_upstream_request_duration_seconds_count{operation="DELETE",outcome="2xx",upstream="upload_post"} 1',
+            body,
+        )
+        self.assertIn('scheduler_http_request_duration_seconds_count{method="GET",status="2xx",view="scheduler:schedule_list"} 1', body)
+        self.assertIn('scheduler_db_query_duration_seconds_bucket{alias="default",le="+Inf"}', body)
+
+
+class FakeServerTests(TestCase):
+    """Server palsu untuk benchmark offline: endpoint OpenAI dan rate limit buatan."""
+
+    def test_openai_endpoints_and_rate_limit(self):
+        handler = type('LimitedHandler', (FakeOpenAIHandler,), {'rate_limit': 2})
+        with FakeServer(handler) as server:
+            edit = requests.post(f"{server.base_url}/v1/images/edits", files={'image': ('a.png', b'x')})
+            upload = requests.post(f"{server.base_url}/v1/files", files={'file': ('a.jpg', b'xyz')})
+            limited = requests.post(f"{server.base_url}/v1/responses", json={'model': 'gpt-4.1'})
+        self.assertEqual(edit.status_code, 200)
+        self.assertTrue(edit.json()['data'][0]['b64_json'])
+        self.assertTrue(upload.json()['id'].startswith('file-'))
+        self.assertEqual(limited.status_code, 429)
+        self.assertEqual(limited.headers['Retry-After'], '1')
+        self.assertEqual(limited.json()['error']['type'], 'rate_limit_exceeded')
+        self.assertEqual(server.httpd.request_counts['POST responses'], 1)
+
+
+@override_settings(CACHE_URL='', RATE_LIMITS={'upload_post:schedule': 60}, RATE_LIMIT_MAX_RETRIES=3)
+class RateLimitTests(TestCase):
+    """Token bucket sisi client dan retry 429 dengan Retry-After."""
+
+    def setUp(self):
+        patcher = mock.patch.object(ratelimit, '_local', ratelimit._LocalBuckets())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_allows_burst_then_spaces_requests(self):
+        # 60/menit: kapasitas BURST_SECONDS token, berikutnya menunggu ~1 detik per token
+        waits = [ratelimit._reserve('upload_post:schedule') for _ in range(ratelimit.BURST_SECONDS + 2)]
+        self.assertEqual(waits[:ratelimit.BURST_SECONDS], [0.0] * ratelimit.BURST_SECONDS)
+        self.assertAlmostEqual(waits[-2], 1, delta=0.1)
+        self.assertAlmostEqual(waits[-1], 2, delta=0.1)
+        self.assertEqual(ratelimit._reserve('budget:tanpa-batas'), 0.0)
+
+    def test_retry_after_is_honoured(self):
+        self.assertEqual(ratelimit.parse_retry_after('2'), 2.0)
+        self.assertIsNone(ratelimit.parse_retry_after('bukan-angka'))
+
+        handler = type('LimitedHandler', (FakeUploadPostHandler,), {'rate_limit': 1})
+        with FakeServer(handler) as server, override_settings(UPLOAD_POST_BASE_URL=f"{server.base_url}/api"):
+            client = upload_post_service.get_client()
+            started = time.monotonic()
+            responses = [client.list_schedules() for _ in range(2)]
+            elapsed = time.monotonic() - started
+            counts = server.httpd.request_counts
+
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        # Permintaan kedua ditolak sekali, lalu menunggu Retry-After (1 detik) sebelum dicoba ulang
+        self.assertEqual(counts['GET schedule'], 3)
+        self.assertGreaterEqual(elapsed, 1)
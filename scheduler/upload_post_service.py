@@ -1,24 +1,120 @@
+import asyncio
+import itertools
 import logging
+import threading
+import weakref
+from dataclasses import dataclass, replace
+from datetime import datetime
+import httpx
 import requests
+import urllib3
+from contextlib import ExitStack
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
 from datetime import timedelta
+from . import ratelimit, singleflight
+from .instrumentation import timed_upstream
+from .multipart import StreamingMultipartEncoder
 from .schemas import edit_schedule_payload, edit_schedule_response
 
 
 
 logger = logging.getLogger(__name__)
 
-def schedule_post_upload(schedule):
+class UploadPostError(Exception):
     """
-    Schedules a post upload by calling an external API.
-    It handles single image, carousel, and video posts.
+    Error saat mengirim jadwal ke Upload Post API.
+    `retryable` menandakan apakah permintaan layak dicoba ulang
+    (error jaringan, 429, atau 5xx).
     """
-    logger.info(f"Memulai permintaan Upload Post dengan API untuk Schedule ID: {schedule.id}")
-    try:
-        BASE_URL = "https://api.upload-post.com/api" # Hapus garis miring di akhir
-        headers = {
-            "Authorization": f"api_key {settings.UPLOAD_POST_API_KEY}"
-        }
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+    def __reduce__(self):
+        # Agar status_code/retryable ikut saat dibagikan lewat cache (single-flight)
+        return (type(self), (str(self), self.status_code, self.retryable))
+
+
+def _rate_limit_budget(method):
+    # Upload media (POST) punya batas sendiri, terpisah dari endpoint jadwal
+    return 'upload_post:upload' if method == 'POST' else 'upload_post:schedule'
+
+
+def _raise_for_rate_limit(response):
+    if response.status_code == 429:
+        raise ratelimit.RateLimited(ratelimit.parse_retry_after(response.headers.get('Retry-After')), result=response)
+
+
+def _request_not_sent(error):
+    """
+    True jika permintaan pasti belum sampai ke server: koneksi gagal dibuka
+    (connect timeout, DNS, connection refused). Read timeout atau koneksi putus
+    setelah body terkirim dianggap tidak pasti.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), urllib3.exceptions.NewConnectionError)
+    return False
+
+
+class UploadPostClient:
+    """
+    Client Upload Post API dengan satu `requests.Session` bersama.
+
+    Session menyimpan koneksi keep-alive di connection pool sehingga
+    permintaan berikutnya (sync, delete, edit) memakai ulang koneksi TCP/TLS
+    yang sudah terbuka. Semua permintaan memakai timeout (connect, read).
+    """
+
+    def __init__(self, api_key=None, base_url=None, connect_timeout=None, read_timeout=None, pool_size=None):
+        self.base_url = (base_url or settings.UPLOAD_POST_BASE_URL).rstrip('/')
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else settings.UPLOAD_POST_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else settings.UPLOAD_POST_READ_TIMEOUT,
+        )
+        pool_size = pool_size or settings.UPLOAD_POST_POOL_SIZE
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Format header otorisasi yang diterima Upload Post: "Apikey <key>"
+        self.session.headers['Authorization'] = f"Apikey {api_key or settings.UPLOAD_POST_API_KEY}"
+
+    def request(self, method, path, **kwargs):
+        """
+        Permintaan lewat rate limiter bersama (lihat ratelimit). 429 dicoba ulang;
+        jika tetap 429, respons terakhir dikembalikan ke pemanggil.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        def attempt():
+            with timed_upstream('upload_post', method) as labels:
+                response = self.session.request(method, url, **kwargs)
+                labels['outcome'] = f"{response.status_code // 100}xx"
+            _raise_for_rate_limit(response)
+            return response
+
+        try:
+            return ratelimit.call(_rate_limit_budget(method), attempt)
+        except ratelimit.RateLimited as e:
+            return e.result
+
+    def upload_schedule(self, schedule):
+        """
+        Mengirim satu jadwal ke Upload Post API dan mengembalikan response JSON.
+        Menangani post single image, carousel, dan video.
+        Melempar UploadPostError jika gagal.
+        """
+        logger.info(f"Memulai permintaan Upload Post dengan API untuk Schedule ID: {schedule.id}")
         # The API seems to expect 'platform[]' for multiple values
         platforms = schedule.platform
         if platforms == 'BOTH':
@@ -38,82 +134,338 @@ def schedule_post_upload(schedule):
             "media_type": schedule.content_type
         }
 
-        files_payload = []
-        url = ""
+        # Kumpulkan file yang akan dikirim sebagai (nama_field, nama_file, FieldFile, content_type).
+        # Isi file tidak dibaca ke memori; file di-stream oleh StreamingMultipartEncoder.
+        files_to_send = []
+        path = ""
 
         if schedule.media_type == 'IMAGE':
             logger.info("Memproses unggahan Jadwal Gambar")
-            url = f"{BASE_URL}/upload_photos"
+            path = "upload_photos"
             assets = schedule.media_assets.all()
             for asset in assets:
                 # Gunakan file yang sudah diedit jika ada, jika tidak, gunakan file asli
                 file_to_upload = asset.edited_file if asset.edited_file else asset.file
                 if file_to_upload:
-                    with file_to_upload.open('rb') as f:
-                        # Gunakan nama file asli untuk API
-                        files_payload.append(('photos[]', (asset.file.name, f.read(), 'image/jpeg')))
+                    # Gunakan nama file asli untuk API
+                    files_to_send.append(('photos[]', asset.file.name, file_to_upload, 'image/jpeg'))
 
         elif schedule.media_type == 'VIDEO':
             logger.info("Memproses unggahan Jadwal Video")
-            url = f"{BASE_URL}/upload"
+            path = "upload"
             asset = schedule.media_assets.first()
             if asset and asset.file:
-                with asset.file.open('rb') as f:
-                    files_payload.append(('video', (asset.file.name, f.read(), 'video/mp4')))
-
-        if not url or not files_payload:
-            logger.error(f"Tidak dapat memproses jadwal {schedule.id}: URL endpoint atau file tidak valid.")
-            return None
-
-        response = requests.post(
-            url,
-            headers=headers,
-            data=data_payload,
-            files=files_payload
-        )
+                files_to_send.append(('video', asset.file.name, asset.file, 'video/mp4'))
+
+        if not path or not files_to_send:
+            # Data jadwal tidak valid, tidak ada gunanya dicoba ulang
+            raise UploadPostError(f"Tidak dapat memproses jadwal {schedule.id}: URL endpoint atau file tidak valid.")
+
+        with ExitStack() as stack:
+            files_payload = [
+                (field_name, filename, stack.enter_context(field_file.open('rb')), content_type)
+                for field_name, filename, field_file, content_type in files_to_send
+            ]
+            body = StreamingMultipartEncoder(list(data_payload.items()), files_payload)
+            try:
+                response = self.request(
+                    'POST',
+                    path,
+                    headers={"Content-Type": body.content_type},
+                    data=body,
+                )
+            except requests.exceptions.RequestException as e:
+                if _request_not_sent(e):
+                    raise UploadPostError(f"Gagal terhubung ke Upload Post API: {e}", retryable=True) from e
+                # POST mungkin sudah diterima (mis. read timeout setelah body terkirim);
+                # mengirim ulang bisa membuat post ganda, jadi tidak dicoba ulang otomatis
+                raise UploadPostError(
+                    f"Status pengiriman ke Upload Post tidak diketahui, cek jadwal di Upload Post sebelum mengirim ulang: {e}",
+                ) from e
 
         if response.status_code in [200, 202]:
             logger.info(f"Berhasil mengirim permintaan ke Upload Post API untuk Jadwal {schedule.id}. Status: {response.status_code}")
-            # Save the job ID from the API response
-            response_data = response.json()
-            schedule.upload_job_id = response_data.get('job_id') # Assuming the key is 'job_id'
-            schedule.save()
-            return response_data
-        else:
-            logger.error(f"Gagal mengirim permintaan ke Upload Post API untuk Jadwal {schedule.id}. Status: {response.status_code}, Response: {response.text}")
-            return None
+            return response.json()
+
+        raise UploadPostError(
+            f"Status: {response.status_code}, Response: {response.text}",
+            status_code=response.status_code,
+            retryable=response.status_code == 429 or response.status_code >= 500,
+        )
+
+    def list_schedules(self, headers=None):
+        return self.request('GET', 'uploadposts/schedule', headers=headers)
+
+    def delete_schedule(self, job_id):
+        return self.request('DELETE', f"schedule/{job_id}")
+
+    def edit_schedule(self, job_id, scheduled_date=None, caption=None):
+        return self.request(
+            'PATCH',
+            f"schedule/{job_id}",
+            json={
+                "scheduled_date": scheduled_date.isoformat() if scheduled_date else None,
+                "caption": caption
+            }
+        )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Mengembalikan UploadPostClient bersama untuk seluruh proses (dibuat sekali, lazy)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UploadPostClient()
+    return _client
+
+
+@receiver(setting_changed)
+def _reset_clients(setting, **kwargs):
+    # override_settings (test/benchmark) mengganti URL atau key: buat client baru
+    global _client
+    if setting.startswith('UPLOAD_POST_'):
+        _client = None
+        _async_clients.clear()
+
+
+class AsyncUploadPostClient:
+    """
+    Versi async UploadPostClient (httpx) untuk view async di bawah ASGI.
+    Satu event loop dapat menahan ratusan permintaan yang sedang berjalan tanpa
+    memblokir thread worker.
+
+    Pool koneksi httpcore menghabiskan CPU O(n^2) terhadap jumlah permintaan
+    yang menunggu di pool yang sama, sehingga koneksi dibagi ke beberapa
+    httpx.AsyncClient kecil (SHARD_CONNECTIONS koneksi) yang dipakai bergiliran.
+    """
+
+    SHARD_CONNECTIONS = 10
+
+    def __init__(self, api_key=None, base_url=None, connect_timeout=None, read_timeout=None, pool_size=None):
+        self.base_url = (base_url or settings.UPLOAD_POST_BASE_URL).rstrip('/')
+        pool_size = pool_size or settings.UPLOAD_POST_ASYNC_POOL_SIZE
+        headers = {'Authorization': f"Apikey {api_key or settings.UPLOAD_POST_API_KEY}"}
+        timeout = httpx.Timeout(
+            read_timeout if read_timeout is not None else settings.UPLOAD_POST_READ_TIMEOUT,
+            connect=connect_timeout if connect_timeout is not None else settings.UPLOAD_POST_CONNECT_TIMEOUT,
+        )
+        shard_size = min(self.SHARD_CONNECTIONS, pool_size)
+        self.clients = [
+            httpx.AsyncClient(
+                headers=headers,
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=shard_size, max_keepalive_connections=shard_size),
+            )
+            for _ in range(max(1, pool_size // shard_size))
+        ]
+        self._next_client = itertools.cycle(self.clients)
+
+    async def request(self, method, path, **kwargs):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        async def attempt():
+            client = next(self._next_client)
+            with timed_upstream('upload_post', method) as labels:
+                response = await client.request(method, url, **kwargs)
+                labels['outcome'] = f"{response.status_code // 100}xx"
+            _raise_for_rate_limit(response)
+            return response
+
+        try:
+            return await ratelimit.acall(_rate_limit_budget(method), attempt)
+        except ratelimit.RateLimited as e:
+            return e.result
+
+    async def delete_schedule(self, job_id):
+        return await self.request('DELETE', f"schedule/{job_id}")
+
+    async def aclose(self):
+        await asyncio.gather(*(client.aclose() for client in self.clients))
+
+
+# httpx.AsyncClient terikat ke event loop tempat ia dipakai, jadi satu client per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Mengembalikan AsyncUploadPostClient bersama untuk event loop yang sedang berjalan."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncUploadPostClient()
+    return client
+
 
+# Upload media besar bisa jauh lebih lama dari read timeout satu respons
+SUBMIT_LOCK_TIMEOUT = 900
+
+
+@singleflight.shared('upload_post.submit', key=lambda schedule: schedule.id, lock_timeout=SUBMIT_LOCK_TIMEOUT)
+def submit_schedule_upload(schedule):
+    """
+    Mengirim satu jadwal ke Upload Post API. Lihat UploadPostClient.upload_schedule.
+
+    Pengiriman bersamaan untuk jadwal yang sama (mis. task terkirim dua kali) digabung
+    menjadi satu post; semua pemanggil menerima response yang sama. Job ID dicek dan
+    disimpan di dalam flight agar pemanggil yang datang tepat setelahnya tidak mengirim ulang.
+    """
+    queryset = type(schedule).objects.filter(pk=schedule.pk)
+    existing = queryset.values_list('upload_job_id', flat=True).first()
+    if existing:
+        logger.info(f"Jadwal ID: {schedule.id} sudah terkirim (Job ID: {existing}).")
+        return {'job_id': existing}
+    response_data = get_client().upload_schedule(schedule)
+    if response_data.get('job_id'):
+        queryset.update(upload_job_id=response_data['job_id'])
+    return response_data
+
+
+def schedule_post_upload(schedule):
+    """
+    Schedules a post upload by calling an external API.
+    Menyimpan job ID ke jadwal dan mengembalikan response JSON, atau None jika gagal.
+    Untuk alur aplikasi gunakan task `dispatch_schedule_upload` (dengan retry).
+    """
+    try:
+        response_data = submit_schedule_upload(schedule)
     except Exception as e:
         logger.error(f"Terjadi error saat melakukan permintaan ke Upload Post API untuk Jadwal {schedule.id}. Error: {e}")
         # It's better not to raise the exception up to the view unless the view can handle it.
         # Returning None is often safer.
         return None
 
-def get_schedule():
+    # Save the job ID from the API response
+    schedule.upload_job_id = response_data.get('job_id') # Assuming the key is 'job_id'
+    schedule.save()
+    return response_data
+
+SNAPSHOT_CACHE_KEY = 'upload_post:schedule_snapshot'
+SNAPSHOT_FLIGHT_KEY = singleflight.make_key('upload_post.list_schedules')
+SNAPSHOT_LOCK_TIMEOUT = 30
+
+
+@dataclass(frozen=True)
+class RemoteSnapshot:
     """
-    Mengambil jadwal upload yang sudah terkirim ke Upload Post
+    Salinan daftar jadwal di Upload Post. `job_ids` berupa frozenset sehingga
+    pengecekan `job_id in snapshot` bernilai O(1).
     """
-    logger.info("Mengambil Seluruh jadwal di Upload Post")
+    items: tuple
+    job_ids: frozenset
+    fetched_at: datetime
+    etag: str = ''
+    last_modified: str = ''
+
+    def __contains__(self, job_id):
+        return job_id in self.job_ids
+
+    def is_fresh(self, max_age):
+        return (timezone.now() - self.fetched_at).total_seconds() < max_age
+
+
+def _normalize_schedule_items(payload):
+    """
+    Mengubah response daftar jadwal menjadi list dict. API mengembalikan list,
+    tetapi bentuk {"schedules": [...]} juga diterima. Bentuk lain dianggap error
+    (None), bukan daftar kosong, agar sinkronisasi tidak menghapus semua jadwal.
+    """
+    if isinstance(payload, dict):
+        payload = next(
+            (payload[key] for key in ('schedules', 'scheduled_posts', 'data', 'results') if isinstance(payload.get(key), list)),
+            None,
+        )
+    if not isinstance(payload, list):
+        return None
+    return [item for item in payload if isinstance(item, dict)]
+
+
+def _fetch_snapshot(previous=None):
+    """
+    Mengambil daftar jadwal dari API. Jika ada snapshot sebelumnya, permintaan dikirim
+    secara kondisional (If-None-Match / If-Modified-Since); 304 memakai ulang isi lama.
+    """
+    headers = {}
+    if previous is not None:
+        if previous.etag:
+            headers['If-None-Match'] = previous.etag
+        if previous.last_modified:
+            headers['If-Modified-Since'] = previous.last_modified
+
     try:
-        url = "https://api.upload-post.com/api/uploadposts/schedule"
-        headers = {
-            "Authorization": f"Apikey {settings.UPLOAD_POST_API_KEY}"
-        }
-        response = requests.get(url=url, headers=headers)
-        schedule_list = []
-        if response.status_code == 200:
-            logger.info(f"Berhasil mengambil daftar jadwal")
-            schedule_list.append(response.json())
-            return schedule_list
-        else:
-            logger.error(f"Terjadi error saat mengambil data jadwal di Upload Post. Error Code: {response.status_code}. Error Message: {response.text}")
-            return None
+        response = get_client().list_schedules(headers=headers)
     except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "error": "Gagal terhubung ke UploadPost API.",
-            "detail": str(e)
-        }
+        logger.error(f"Gagal terhubung ke UploadPost API. Error: {e}")
+        return None
+
+    if response.status_code == 304 and previous is not None:
+        logger.info("Daftar jadwal Upload Post tidak berubah (304)")
+        return replace(previous, fetched_at=timezone.now())
+    if response.status_code != 200:
+        logger.error(f"Terjadi error saat mengambil data jadwal di Upload Post. Error Code: {response.status_code}. Error Message: {response.text}")
+        return None
+
+    try:
+        items = _normalize_schedule_items(response.json())
+    except ValueError:
+        items = None
+    if items is None:
+        logger.error(f"Format daftar jadwal Upload Post tidak dikenali: {response.text[:200]}")
+        return None
+
+    logger.info(f"Berhasil mengambil daftar jadwal ({len(items)} job)")
+    return RemoteSnapshot(
+        items=tuple(items),
+        job_ids=frozenset(str(item['job_id']) for item in items if item.get('job_id')),
+        fetched_at=timezone.now(),
+        etag=response.headers.get('ETag', ''),
+        last_modified=response.headers.get('Last-Modified', ''),
+    )
+
+
+def _refresh_snapshot():
+    previous = cache.get(SNAPSHOT_CACHE_KEY)
+    fresh = _fetch_snapshot(previous=previous)
+    if fresh is not None:
+        # Disimpan lebih lama dari TTL agar masih bisa divalidasi ulang dengan ETag
+        cache.set(SNAPSHOT_CACHE_KEY, fresh, timeout=settings.UPLOAD_POST_SNAPSHOT_TTL * 10)
+    return fresh
+
+
+def get_remote_snapshot(max_age=None):
+    """
+    Mengembalikan RemoteSnapshot dari cache Django (locmem atau Redis), atau None jika gagal.
+
+    Snapshot dianggap segar selama `max_age` detik (default UPLOAD_POST_SNAPSHOT_TTL);
+    `max_age=0` memaksa validasi ulang ke API. Pengambilan ulang lewat single-flight:
+    pemanggil bersamaan memakai snapshot lama jika ada, atau menunggu hasil pengambilan
+    yang sedang berjalan, sehingga banyak permintaan menjadi satu permintaan ke API.
+    """
+    max_age = settings.UPLOAD_POST_SNAPSHOT_TTL if max_age is None else max_age
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is not None and snapshot.is_fresh(max_age):
+        return snapshot
+    if snapshot is not None and max_age and singleflight.in_flight(SNAPSHOT_FLIGHT_KEY):
+        # Proses lain sedang memperbarui; snapshot lama masih bisa dipakai
+        return snapshot
+    try:
+        return singleflight.do(SNAPSHOT_FLIGHT_KEY, _refresh_snapshot, lock_timeout=SNAPSHOT_LOCK_TIMEOUT)
+    except singleflight.SingleFlightTimeout as e:
+        logger.warning(f"Snapshot jadwal Upload Post tidak tersedia. Error: {e}")
+        return None
+
+
+def get_schedule():
+    """
+    Mengambil jadwal upload yang sudah terkirim ke Upload Post (list dict, satu per job),
+    dari snapshot yang di-cache. Mengembalikan None jika gagal.
+    """
+    snapshot = get_remote_snapshot()
+    return list(snapshot.items) if snapshot is not None else None
 
 def delete_upload_schedule(job_id):
     """
@@ -121,42 +473,43 @@ def delete_upload_schedule(job_id):
     """
     logger.info(f"Mengirim permintaan cancel upload schedule.")
     try:
-        BASE_URL = "https://api.upload-post.com/api/schedule/" # Hapus garis miring di akhir
-        headers = {
-            "Authorization": f"api_key {settings.UPLOAD_POST_API_KEY}"
-        }
-        response = requests.delete(f"{BASE_URL}{job_id}", headers=headers)
+        response = get_client().delete_schedule(job_id)
         if response.status_code in [200, 202]:
             logger.info(f"Berhasil mengirim permintaan cancel ke Upload Post API untuk Jadwal {job_id}.")
             return response.json()
         else:
-            logger.error(f"Error Response from upload post API. Error: {response.json}")
+            logger.error(f"Error Response from upload post API. Status: {response.status_code}. Error: {response.text}")
             return 
     except Exception as e:
-        logger.error("Error Requesting delete schedule.")
+        logger.error(f"Error Requesting delete schedule. Error: {e}")
         
+async def adelete_upload_schedule(job_id):
+    """Versi async delete_upload_schedule untuk view async."""
+    logger.info(f"Mengirim permintaan cancel upload schedule.")
+    try:
+        response = await get_async_client().delete_schedule(job_id)
+        if response.status_code in [200, 202]:
+            logger.info(f"Berhasil mengirim permintaan cancel ke Upload Post API untuk Jadwal {job_id}.")
+            return response.json()
+        logger.error(f"Error Response from upload post API. Status: {response.status_code}. Error: {response.text}")
+    except Exception as e:
+        logger.error(f"Error Requesting delete schedule. Error: {e}")
+
 def edit_schedule(payload: edit_schedule_payload) -> edit_schedule_response:
     """
     Mengirim permintaan edit schedule (method patch)
     """
     logger.info(f"Mengirim permintaan edit schedule.")
     try:
-        url = f"https://api.upload-post.com/api/schedule/{payload.job_id}"
-        headers = {
-            "Authorization": f"api_key {settings.UPLOAD_POST_API_KEY}"
-        }
-        response = requests.patch(
-            url,
-            headers=headers,
-            json={
-                "scheduled_date": payload.scheduled_date,
-                "caption": payload.caption
-            }
+        response = get_client().edit_schedule(
+            payload.job_id,
+            scheduled_date=payload.scheduled_date,
+            caption=payload.caption
         )
         if response.status_code == 200 :
             logger.info(f"Berhasil melakukan edit. Job ID: {payload.job_id}. Caption: {payload.caption}. Upload Schedule: {payload.scheduled_date}")
             return response
         else:
-            logger.error(f"Terjadi error saat mengirim permintaan edit ke Upload Post.")
+            logger.error(f"Terjadi error saat mengirim permintaan edit ke Upload Post. Status: {response.status_code}. Error: {response.text}")
     except Exception as e:
-        logger.error("Error Requesting delete schedule.")
\ No newline at end of file
+        logger.error(f"Error Requesting edit schedule. Error: {e}")
@@ -12,9 +12,14 @@ urlpatterns = [
 
     # URL Internal Aplikasi (untuk admin/ops) dengan prefix /app/
     path('app/list/', views.schedule_list, name='schedule_list'),
+    path('app/api/schedules/', views.schedule_list_api, name='schedule_list_api'),
     path('app/create/', views.create_schedule, name='create_schedule'),
+    path('app/uploads/', views.upload_create, name='upload_create'),
+    path('app/uploads/<uuid:upload_id>/', views.upload_detail, name='upload_detail'),
     path('app/confirmation/<int:schedule_id>/', views.schedule_confirmation, name='schedule_confirmation'),
     path('app/run-ai/<int:schedule_id>/', views.run_ai_and_confirm, name='run_ai_and_confirm'),
+    path('app/ai-status/<int:schedule_id>/', views.ai_status_view, name='ai_status'),
+    path('app/ai-cache/stats/', views.ai_cache_stats, name='ai_cache_stats'),
     path('app/process-confirmation/<int:schedule_id>/', views.process_confirmation, name='process_confirmation'),
     path('app/delete/<int:schedule_id>/', views.delete_schedule, name='delete_schedule'),
     path('app/', views.home, name='home'), # Titik masuk setelah login, sekarang di posisi yang benar
@@ -1,12 +1,30 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import logging
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.views.decorators.http import require_POST, require_http_methods
+from django.urls import reverse
 from .forms import ScheduleForm
-from .models import Schedule, MediaAsset
+from .models import Schedule, MediaAsset, UploadSession
 from django.utils import timezone
-from .ai_service import run_ai_tasks_for_schedule
-from .upload_post_service import schedule_post_upload, delete_upload_schedule, get_schedule
+from .tasks import run_ai_for_schedule, dispatch_schedule_upload, generate_renditions_task
+from .upload_post_service import adelete_upload_schedule
+from .sync_service import get_last_sync
+from .pagination import keyset_page, parse_page_size
+from .media_service import (
+    create_schedule_with_media, create_upload_session, append_upload_chunk,
+    discard_upload, UploadOffsetMismatch, UploadSessionUnavailable,
+)
+from . import ai_cache, instrumentation
+
+logger = logging.getLogger(__name__)
 
 # Authentication Views
 def login_view(request):
@@ -38,64 +56,159 @@ def landing_page_view(request):
 @login_required
 def create_schedule(request):
     if request.method == 'POST':
-        form = ScheduleForm(request.POST, request.FILES)
+        form = ScheduleForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             schedule = form.save(commit=False)
             schedule.user = request.user
-            schedule.save()
-
-            files = request.FILES.getlist('media_files')
-            for i, f in enumerate(files):
-                MediaAsset.objects.create(schedule=schedule, file=f, order=i)
-
-            # Jika ada tugas AI, arahkan ke view pemrosesan AI dulu
-            if schedule.needs_ai_edit or schedule.needs_ai_caption:
-                return redirect('scheduler:run_ai_and_confirm', schedule_id=schedule.id)
+            # Jadwal dan semua file media disimpan dalam satu transaksi
+            try:
+                create_schedule_with_media(
+                    schedule, request.FILES.getlist('media_files'), uploads=form.cleaned_data['upload_ids'],
+                )
+            except UploadSessionUnavailable as e:
+                # Form yang sama dikirim dua kali: sesi upload sudah dipakai jadwal lain
+                form.add_error('upload_ids', str(e))
             else:
-                # Jika tidak, langsung ke halaman konfirmasi
-                return redirect('scheduler:schedule_confirmation', schedule_id=schedule.id)
+                asset_ids = list(schedule.media_assets.values_list('id', flat=True))
+                transaction.on_commit(lambda: generate_renditions_task.delay(asset_ids))
+
+                # Jika ada tugas AI, arahkan ke view pemrosesan AI dulu
+                if schedule.needs_ai_edit or schedule.needs_ai_caption:
+                    return redirect('scheduler:run_ai_and_confirm', schedule_id=schedule.id)
+                else:
+                    # Jika tidak, langsung ke halaman konfirmasi
+                    return redirect('scheduler:schedule_confirmation', schedule_id=schedule.id)
     else:
         form = ScheduleForm()
-    return render(request, 'scheduler/schedule_form.html', {'form': form})
+    return render(request, 'scheduler/schedule_form.html', {
+        'form': form,
+        'upload_chunk_size': settings.UPLOAD_CHUNK_MAX_SIZE,
+    })
+
+# Filter yang didukung oleh daftar jadwal (HTML dan API), masing-masing didukung index
+SCHEDULE_LIST_FILTERS = {
+    'platform': {value for value, _ in Schedule.PLATFORM_CHOICES},
+    'status': {value for value, _ in Schedule._meta.get_field('status').choices},
+    'content_type': {value for value, _ in Schedule.CONTENT_TYPE_CHOICES},
+}
+
+def _schedule_list_queryset(user, params):
+    """
+    Queryset jadwal aktif milik user dengan filter opsional dari query string.
+    Satu query untuk jadwal (+ user) dan satu query untuk aset utama semua jadwal,
+    berapa pun jumlah barisnya. Melempar ValueError untuk nilai filter yang tidak dikenal.
+    """
+    primary_asset_prefetch = Prefetch(
+        'media_assets',
+        queryset=MediaAsset.objects.only('id', 'schedule_id', 'file', 'edited_file', 'thumbnail', 'renditions_source', 'order').order_by('order')[:1],
+        to_attr='primary_media_assets',
+    )
+    schedules = (
+        Schedule.objects
+        .filter(user=user, schedule_time__gte=timezone.now())
+        .select_related('user')
+        .prefetch_related(primary_asset_prefetch)
+        .only(
+            'id', 'platform', 'media_type', 'content_type', 'schedule_time', 'upload_job_id',
+            'status', 'is_uploaded', 'user__id', 'user__username',
+        )
+    )
+    for field, allowed_values in SCHEDULE_LIST_FILTERS.items():
+        value = params.get(field)
+        if not value:
+            continue
+        if value not in allowed_values:
+            raise ValueError(f"Nilai filter '{field}' tidak valid: {value}")
+        schedules = schedules.filter(**{field: value})
+    return schedules
+
+@login_required
+async def schedule_list(request):
+    """
+    Menampilkan jadwal aktif milik user langsung dari database lokal, per halaman
+    (keyset pagination). Sinkronisasi dengan Upload Post dan penghapusan jadwal
+    lama dijalankan di background (lihat sync_service.sync_remote_schedules).
+    """
+    # Simpan user yang sudah dimuat agar context processor tidak meng-query ulang
+    request.user = user = await request.auser()
+    try:
+        schedules, next_cursor = await sync_to_async(keyset_page)(
+            _schedule_list_queryset(user, request.GET),
+            cursor=request.GET.get('cursor'),
+            page_size=parse_page_size(request.GET.get('limit')),
+        )
+    except ValueError:
+        return redirect('scheduler:schedule_list')
+
+    next_page_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_page_query = params.urlencode()
+
+    # Template dan context processor masih sinkron (mis. request.user), jadi dirender di thread
+    return await sync_to_async(render)(request, 'scheduler/schedule_list.html', {
+        'schedules': schedules,
+        'next_page_query': next_page_query,
+        'is_first_page': not request.GET.get('cursor'),
+        'last_synced_at': await sync_to_async(get_last_sync)(),
+    })
 
 @login_required
-def schedule_list(request):
-    # Langkah 1: Hapus jadwal lokal yang sudah lewat tanggalnya
-    # now = timezone.now()
-    now = timezone.now() + timezone.timedelta(days=1)
-    past_schedules = Schedule.objects.filter(user=request.user, schedule_time__lt=now)
-    if past_schedules.exists():
-        past_schedules.delete()
-
-    # Langkah 2 (Baru): Sinkronisasi dengan data dari API eksternal
-    # Ambil daftar jadwal dari API upload-post
-    remote_schedules_data = get_schedule() # Memanggil fungsi baru Anda
-    if remote_schedules_data:
-        # Dapatkan daftar semua job_id yang ada di API eksternal
-        remote_job_ids = {item.get('job_id') for item in remote_schedules_data if item.get('job_id')}
-        
-        # Dapatkan semua jadwal lokal yang memiliki job_id
-        local_schedules_with_jobs = Schedule.objects.filter(user=request.user).exclude(upload_job_id__isnull=True).exclude(upload_job_id__exact='')
-        
-        # Hapus jadwal lokal yang job_id-nya tidak lagi ditemukan di API eksternal
-        schedules_to_delete = local_schedules_with_jobs.exclude(upload_job_id__in=remote_job_ids)
-        if schedules_to_delete.exists():
-            schedules_to_delete.delete()
-
-    # Langkah 3: Ambil daftar jadwal final dari database lokal untuk ditampilkan
-    schedules = Schedule.objects.filter(user=request.user).order_by('-schedule_time')
-    return render(request, 'scheduler/schedule_list.html', {'schedules': schedules})
+def schedule_list_api(request):
+    """
+    Endpoint JSON daftar jadwal dengan keyset pagination.
+    Query string: cursor, limit (maks 100), platform, status, content_type.
+    Ikuti `next` sampai bernilai null untuk membaca semua halaman.
+    """
+    try:
+        schedules, next_cursor = keyset_page(
+            _schedule_list_queryset(request.user, request.GET),
+            cursor=request.GET.get('cursor'),
+            page_size=parse_page_size(request.GET.get('limit')),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    results = []
+    for schedule in schedules:
+        primary_asset = schedule.get_primary_media_asset()
+        results.append({
+            'id': schedule.id,
+            'platform': schedule.platform,
+            'media_type': schedule.media_type,
+            'content_type': schedule.content_type,
+            'schedule_time': schedule.schedule_time.isoformat(),
+            'status': schedule.status,
+            'upload_job_id': schedule.upload_job_id,
+            'is_uploaded': schedule.is_uploaded,
+            'primary_media_url': primary_asset.file.url if primary_asset and primary_asset.file else None,
+            'thumbnail_url': primary_asset.thumbnail_url if primary_asset and primary_asset.file else None,
+        })
+
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = f"{request.path}?{params.urlencode()}"
+
+    return JsonResponse({
+        'results': results,
+        'next_cursor': next_cursor,
+        'next': next_url,
+    })
 
 @login_required
-def delete_schedule(request, schedule_id):
-    schedule = get_object_or_404(Schedule, id=schedule_id, user=request.user)
+async def delete_schedule(request, schedule_id):
+    schedule = await aget_object_or_404(Schedule, id=schedule_id, user=await request.auser())
     if request.method == 'POST':
-        # Jika jadwal ini memiliki job_id dari API, panggil service untuk menghapusnya di sana dulu
+        # Jika jadwal ini memiliki job_id dari API, panggil service untuk menghapusnya di sana dulu.
+        # Permintaan HTTP berjalan async sehingga tidak memblokir worker selama menunggu API.
         if schedule.upload_job_id:
-            delete_upload_schedule(schedule.upload_job_id) # Memanggil fungsi baru Anda
-        
+            await adelete_upload_schedule(schedule.upload_job_id)
+
         # Hapus jadwal dari database lokal
-        schedule.delete()
+        await schedule.adelete()
         return redirect('scheduler:schedule_list')
     return redirect('scheduler:schedule_list')
 
@@ -106,36 +219,170 @@ def home(request):
     return redirect('scheduler:login')
 
 @login_required
-def run_ai_and_confirm(request, schedule_id):
+async def run_ai_and_confirm(request, schedule_id):
     """
-    Menjalankan tugas AI yang diperlukan, menyimpan hasilnya ke session,
-    dan kemudian mengarahkan ke halaman konfirmasi.
+    Mengantrekan tugas AI ke Celery dan langsung menampilkan halaman progres.
+    Halaman progres melakukan polling ke ai_status_view sampai hasil AI
+    tersimpan di Schedule/MediaAsset, lalu diarahkan ke halaman konfirmasi.
+    """
+    request.user = await request.auser()
+    schedule = await aget_object_or_404(Schedule, id=schedule_id, user=request.user)
+
+    if schedule.ai_status == 'DONE':
+        return redirect('scheduler:schedule_confirmation', schedule_id=schedule.id)
+
+    # Jangan antrekan ulang jika tugas sebelumnya masih berjalan (mis. refresh halaman).
+    # Status diklaim dengan UPDATE bersyarat: dari beberapa request bersamaan (double-submit)
+    # hanya satu yang mengubah baris, dan hanya request itu yang mengantrekan task.
+    # QUEUED/RUNNING yang macet (worker mati) boleh diklaim ulang setelah AI_TASK_STALE_AFTER.
+    in_progress = Q(ai_status__in=['QUEUED', 'RUNNING'])
+    stale = Q(ai_status_updated_at__isnull=True) | Q(ai_status_updated_at__lt=Schedule.ai_stale_cutoff())
+    claimed = await Schedule.objects.filter(
+        ~Q(ai_status='DONE') & (~in_progress | stale), id=schedule.id,
+    ).aupdate(ai_status='QUEUED', ai_status_updated_at=timezone.now())
+    if claimed == 1:
+        try:
+            async_result = await sync_to_async(run_ai_for_schedule.delay)(schedule.id)
+        except Exception as e:
+            # Broker tidak bisa dihubungi: jangan biarkan baris tertahan di QUEUED
+            logger.error(f"Gagal mengantrekan tugas AI untuk Jadwal ID: {schedule.id}. Error: {e}")
+            await Schedule.objects.filter(id=schedule.id).aupdate(ai_status='FAILED', ai_status_updated_at=timezone.now())
+            schedule.ai_status = 'FAILED'
+        else:
+            schedule.ai_status = 'QUEUED'
+            await Schedule.objects.filter(id=schedule.id).aupdate(ai_task_id=async_result.id)
+
+    return await sync_to_async(render)(request, 'scheduler/ai_processing.html', {'schedule': schedule})
+
+@login_required
+def ai_status_view(request, schedule_id):
+    """
+    Endpoint JSON untuk polling status tugas AI sebuah jadwal.
     """
     schedule = get_object_or_404(Schedule, id=schedule_id, user=request.user)
+    assets = [
+        {
+            'id': asset.id,
+            'order': asset.order,
+            'ai_edit_status': asset.ai_edit_status,
+            'edited_media_url': asset.edited_file.url if asset.edited_file else None,
+        }
+        for asset in schedule.media_assets.all()
+    ]
+    edited_media_url = assets[0]['edited_media_url'] if assets else None
+    return JsonResponse({
+        'schedule_id': schedule.id,
+        'task_id': schedule.ai_task_id,
+        'status': schedule.ai_status,
+        'ai_generated_caption': schedule.ai_generated_caption,
+        'edited_media_url': edited_media_url,
+        'assets': assets,
+        'edits_done': sum(1 for asset in assets if asset['ai_edit_status'] in ('DONE', 'FAILED')),
+        'edits_total': sum(1 for asset in assets if asset['ai_edit_status'] != 'NOT_REQUESTED'),
+        'confirmation_url': reverse('scheduler:schedule_confirmation', args=[schedule.id]),
+    })
 
-    # Jalankan tugas AI
-    ai_results = run_ai_tasks_for_schedule(schedule)
+@staff_member_required
+def ai_cache_stats(request):
+    """
+    Endpoint JSON statistik cache hasil AI (hit, miss, jumlah entri).
+    """
+    return JsonResponse(ai_cache.stats())
 
-    # Simpan hasil AI ke session untuk digunakan di halaman konfirmasi dan saat proses
-    request.session['ai_results'] = ai_results
-    
-    # Arahkan ke halaman konfirmasi untuk ditampilkan ke pengguna
-    return redirect('scheduler:schedule_confirmation', schedule_id=schedule.id)
+def metrics(request):
+    """
+    Endpoint metrik format teks Prometheus (histogram latensi view, database, dan upstream).
+    Scraper memakai header `Authorization: Bearer <METRICS_TOKEN>`; tanpa token hanya staff.
+    """
+    token = settings.METRICS_TOKEN
+    if not (token and request.headers.get('Authorization') == f"Bearer {token}"):
+        if not (request.user.is_authenticated and request.user.is_staff):
+            return HttpResponse(status=401 if token else 403)
+    return HttpResponse(instrumentation.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _upload_response(upload, status=200):
+    response = JsonResponse({
+        'id': str(upload.pk),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.offset,
+        'complete': upload.is_complete,
+    }, status=status)
+    # Header ala protokol tus agar klien bisa melanjutkan upload dari offset terakhir
+    response['Upload-Offset'] = str(upload.offset)
+    response['Upload-Length'] = str(upload.size)
+    response['Location'] = reverse('scheduler:upload_detail', args=[upload.pk])
+    return response
+
+@login_required
+@require_POST
+def upload_create(request):
+    """
+    Membuat sesi upload bertahap. Field POST: filename, size, content_type (opsional).
+    """
+    filename = request.POST.get('filename', '').strip()
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size harus berupa angka.'}, status=400)
+    if not filename or size <= 0:
+        return JsonResponse({'error': 'filename dan size wajib diisi.'}, status=400)
+    if size > settings.UPLOAD_MAX_FILE_SIZE:
+        return JsonResponse({'error': f'Ukuran file melebihi batas {settings.UPLOAD_MAX_FILE_SIZE} byte.'}, status=413)
+
+    upload = create_upload_session(request.user, filename, size, request.POST.get('content_type', ''))
+    return _upload_response(upload, status=201)
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_detail(request, upload_id):
+    """
+    GET/HEAD: status dan offset sesi upload.
+    PATCH: menambahkan satu chunk (body mentah) di posisi header Upload-Offset.
+    DELETE: membatalkan upload.
+    """
+    upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+
+    if request.method == 'DELETE':
+        discard_upload(upload)
+        return HttpResponse(status=204)
+    if request.method != 'PATCH':
+        return _upload_response(upload)
+    if upload.is_complete:
+        return JsonResponse({'error': 'Upload sudah selesai.'}, status=409)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Header Upload-Offset tidak valid.'}, status=400)
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+        return JsonResponse({'error': f'Chunk melebihi batas {settings.UPLOAD_CHUNK_MAX_SIZE} byte.'}, status=413)
+
+    try:
+        # Body dibaca langsung dari stream request, tidak lewat request.body
+        append_upload_chunk(upload, offset, request, length)
+    except UploadOffsetMismatch:
+        return _upload_response(upload, status=409)
+    return _upload_response(upload)
 
 @login_required
 def schedule_confirmation(request, schedule_id):
     """
-    Hanya menampilkan halaman konfirmasi dengan data dari schedule dan session.
+    Menampilkan halaman konfirmasi dengan hasil AI yang sudah tersimpan
+    di Schedule dan MediaAsset.
     """
     schedule = get_object_or_404(Schedule, id=schedule_id, user=request.user)
-    ai_results = request.session.get('ai_results', {})
 
-    # Atur atribut sementara pada objek schedule untuk pratinjau di template
-    schedule.ai_generated_caption = ai_results.get('ai_generated_caption')
-    edited_media_path = ai_results.get('edited_media_url')
-    
-    # Di sini kita tidak perlu lagi mengatur primary_asset.edited_file.name
-    # karena kita akan menggunakan URL langsung dari ai_results di template.
+    # Jika tugas AI masih berjalan, kembali ke halaman progres
+    if schedule.ai_in_progress:
+        return redirect('scheduler:run_ai_and_confirm', schedule_id=schedule.id)
+
+    primary_asset = schedule.get_primary_media_asset()
+    ai_results = {
+        'ai_generated_caption': schedule.ai_generated_caption,
+        'edited_media_url': primary_asset.edited_file.url if primary_asset and primary_asset.edited_file else None,
+    }
 
     return render(request, 'scheduler/schedule_confirmation.html', {
         'schedule': schedule,
@@ -148,38 +395,28 @@ def process_confirmation(request, schedule_id):
     schedule = get_object_or_404(Schedule, id=schedule_id, user=request.user)
     
     if request.method == 'POST':
-        try:
-            if 'confirm' in request.POST:
-                # Ambil hasil AI dari session
-                ai_results = request.session.get('ai_results', {})
-    
-                # Simpan caption final dan ubah status
-                final_caption = request.POST.get('final_caption', schedule.caption)
-                schedule.caption = final_caption
-                
-                # Simpan hasil AI secara permanen
-                if ai_results.get('ai_generated_caption'):
-                    schedule.ai_generated_caption = ai_results['ai_generated_caption']
-                
-                edited_media_path = ai_results.get('edited_media_url')
-                if edited_media_path:
-                    primary_asset = schedule.get_primary_media_asset()
-                    if primary_asset:
-                        primary_asset.edited_file.name = ai_results['edited_media_url'].split('/media/')[-1]
-                        primary_asset.save()
-    
-                schedule.status = 'CONFIRMED'
-                schedule.save()
-                schedule_post_upload(schedule) # Panggil service untuk mengirim ke API eksternal
-                return redirect('scheduler:schedule_list')
-            elif 'cancel' in request.POST:
-                schedule.delete()
-                return redirect('scheduler:schedule_list')
-        finally:
-            # Selalu hapus session setelah POST (baik confirm maupun cancel)
-            # Blok finally ini akan dieksekusi sebelum fungsi me-return redirect.
-            if 'ai_results' in request.session:
-                del request.session['ai_results']
-            
+        if 'confirm' in request.POST:
+            # Hasil AI (caption dan gambar editan) sudah disimpan task AI langsung ke
+            # Schedule/MediaAsset, jadi di sini cukup menyimpan caption final dan status
+            # Status diklaim dengan UPDATE bersyarat: dari beberapa submit bersamaan hanya
+            # satu yang mengubah baris, dan hanya request itu yang mengantrekan pengiriman
+            claimed = Schedule.objects.filter(id=schedule.id, status__in=['PENDING_APPROVAL', 'FAILED']).update(
+                caption=request.POST.get('final_caption', schedule.caption),
+                status='CONFIRMED',
+                updated_at=timezone.now(),
+            )
+            if claimed == 1:
+                # Kirim ke API eksternal lewat queue background (dengan retry & backoff)
+                try:
+                    dispatch_schedule_upload.delay(schedule.id)
+                except Exception as e:
+                    # Broker tidak bisa dihubungi: jangan biarkan jadwal tertahan di CONFIRMED
+                    logger.error(f"Gagal mengantrekan pengiriman Jadwal ID: {schedule.id}. Error: {e}")
+                    Schedule.objects.filter(id=schedule.id).update(status='FAILED', updated_at=timezone.now())
+            return redirect('scheduler:schedule_list')
+        elif 'cancel' in request.POST:
+            schedule.delete()
+            return redirect('scheduler:schedule_list')
+
     # Jika request bukan POST, arahkan kembali ke halaman konfirmasi.
     return redirect('scheduler:schedule_confirmation', schedule_id=schedule.id)